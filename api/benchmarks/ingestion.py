@@ -0,0 +1,77 @@
+"""
+Compare la lecture d'un classeur .xlsx par pandas.read_excel (classeur entier en mémoire)
+à la lecture en flux de services.ingestion : délai avant l'aperçu, durée totale et pic mémoire.
+
+Usage (depuis le dossier api/) : python -m benchmarks.ingestion [--rows N] [--chunk-rows C]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_accident_frame
+from services.encoding import encode_dataframe
+
+
+def write_workbook(df: pd.DataFrame, path: str):
+    # Classeur complet (avec la dimension de la feuille, comme ceux produits par Excel)
+    df.to_excel(path, index=False)
+
+
+def same_encoding(a, b) -> bool:
+    if a.column_names != b.column_names or len(a) != len(b):
+        return False
+    return all(
+        np.array_equal(a[name].codes, b[name].codes)
+        and a[name].categories.tolist() == b[name].categories.tolist()
+        for name in a.column_names
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--variables", type=int, default=10)
+    parser.add_argument("--chunk-rows", type=int, default=10_000)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_ingestion_")
+    os.environ.setdefault("DATASET_STORE_DIR", os.path.join(work_dir, "store"))
+    from services.ingestion import ingestions
+
+    try:
+        path = os.path.join(work_dir, "accidents.xlsx")
+        write_workbook(make_accident_frame(args.rows, args.variables, n_extra=5), path)
+        print(f"classeur : {args.rows} lignes, {os.path.getsize(path) / 1e6:.1f} Mo")
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        reference = encode_dataframe(pd.read_excel(path).replace([np.nan, np.inf, -np.inf], None))
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"read_excel        aperçu {elapsed:7.2f} s   total {elapsed:7.2f} s   pic {peak / 1e6:8.1f} Mo")
+
+        streamed_path = os.path.join(work_dir, "streamed.xlsx")
+        shutil.copy(path, streamed_path)
+        tracemalloc.start()
+        start = time.perf_counter()
+        ingestion = ingestions.start("accidents", "accidents.xlsx", streamed_path, args.chunk_rows)
+        preview_elapsed = time.perf_counter() - start
+        streamed = ingestion.future.result()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"lecture en flux   aperçu {preview_elapsed:7.2f} s   total {elapsed:7.2f} s   pic {peak / 1e6:8.1f} Mo")
+        print(f"encodages identiques : {same_encoding(reference, streamed)}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Benchmark du démarrage à froid : lance le serveur (uvicorn main:app) dans un processus neuf
+et mesure, depuis le lancement, le temps jusqu'à la première réponse de /health, jusqu'à la
+fin du préchauffage (/ready, si la route existe) puis jusqu'à la première réponse d'une route
+du contrôleur (/excel/preview/status). Le pic de mémoire résidente du serveur est relevé à la
+fin de chaque démarrage. Les résultats (JSON, --output) se comparent à ceux d'une exécution
+de référence (--baseline), comme pour benchmarks.suite.
+
+Usage (depuis le dossier api/) :
+    python -m benchmarks.startup --repeat 5 --output demarrage.json
+    python -m benchmarks.startup --repeat 5 --baseline demarrage.json [--fail-on-regression]
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Any, Optional
+
+from benchmarks.suite import compare
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Route du contrôleur interrogée après le démarrage (réponse d'erreur sans jeu de données)
+FIRST_REQUEST_PATH = "/excel/preview/status?filename=__demarrage__"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _get_status(port: int, path: str) -> Optional[int]:
+    # Code HTTP de GET path, ou None si le serveur n'accepte pas encore de connexion
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        connection.request("GET", path)
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    except OSError:
+        return None
+    finally:
+        connection.close()
+
+
+def _wait_for(port: int, path: str, start: float, deadline: float, process: subprocess.Popen,
+              accept=lambda status: status is not None) -> float:
+    while True:
+        status = _get_status(port, path)
+        if accept(status):
+            return time.perf_counter() - start
+        if process.poll() is not None:
+            raise RuntimeError(f"Le serveur s'est arrêté (code {process.returncode})")
+        if time.perf_counter() > deadline:
+            raise RuntimeError(f"Pas de réponse de {path} après le délai imparti")
+        time.sleep(0.002)
+
+
+def _peak_rss_mb(pid: int) -> float:
+    # Pic de mémoire résidente (VmHWM) ; 0 hors Linux
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def cold_start(env: Dict[str, str], timeout: float, skip_ready: bool = False) -> Dict[str, float]:
+    """
+    Un démarrage : durées (secondes depuis le lancement) des étapes et pic mémoire (Mo).
+    skip_ready : pas d'attente du préchauffage (/ready le déclencherait) avant la première requête.
+    """
+    port = _free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=API_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = start + timeout
+        timings = {"first_healthy": _wait_for(port, "/health", start, deadline, process,
+                                              lambda status: status == 200)}
+        if not skip_ready:
+            # /ready : 503 pendant le préchauffage, 404 si le serveur n'a pas de préchauffage
+            ready = _wait_for(port, "/ready", start, deadline, process, lambda status: status in (200, 404))
+            if _get_status(port, "/ready") == 200:
+                timings["ready"] = ready
+        timings["first_request"] = _wait_for(port, FIRST_REQUEST_PATH, start, deadline, process)
+        timings["peak_mb"] = _peak_rss_mb(process.pid)
+        return timings
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def summarize(runs: List[Dict[str, float]]) -> Dict[str, Any]:
+    cases = {}
+    for name in ("first_healthy", "ready", "first_request"):
+        durations = [run[name] for run in runs if name in run]
+        if not durations:
+            continue
+        cases[name] = {
+            "seconds_min": round(min(durations), 6),
+            "seconds_median": round(statistics.median(durations), 6),
+            "seconds": [round(duration, 6) for duration in durations],
+            "peak_mb": round(statistics.median(run["peak_mb"] for run in runs), 3)
+        }
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=120.0, help="délai maximal d'un démarrage (secondes)")
+    parser.add_argument("--no-warmup", action="store_true", help="démarrer avec WARMUP_ON_STARTUP=0")
+    parser.add_argument("--output", help="fichier JSON des résultats")
+    parser.add_argument("--baseline", help="résultats JSON de référence à comparer")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="écart relatif de la médiane toléré avant de signaler une régression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    # Répertoires de travail isolés ; pas de base de données
+    work_dir = tempfile.mkdtemp(prefix="bench_startup_")
+    env = dict(os.environ, DATASET_STORE_DIR=os.path.join(work_dir, "store"),
+               PDF_CACHE_DIR=os.path.join(work_dir, "pdfs"), JOB_STORE_DIR=os.path.join(work_dir, "jobs"),
+               DATABASE_URL="")
+    if args.no_warmup:
+        env["WARMUP_ON_STARTUP"] = "0"
+    try:
+        # Premier lancement non mesuré : fichiers .pyc à jour, comme en production
+        cold_start(env, args.timeout, args.no_warmup)
+        runs = [cold_start(env, args.timeout, args.no_warmup) for _ in range(args.repeat)]
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    cases = summarize(runs)
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "parameters": {"no_warmup": args.no_warmup}
+        },
+        "cases": cases
+    }
+
+    print(f"{'étape':<16} {'médiane (s)':>12} {'min (s)':>10} {'pic RSS (Mo)':>13}")
+    for name, case in cases.items():
+        print(f"{name:<16} {case['seconds_median']:>12.3f} {case['seconds_min']:>10.3f} {case['peak_mb']:>13.1f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("parameters") != results["meta"]["parameters"]:
+            print("attention : paramètres différents de ceux de la référence")
+        comparison = compare(results, baseline, args.tolerance)
+        print(f"\n{'étape':<16} {'temps':>8} {'mémoire':>8}  verdict")
+        for row in comparison:
+            print(f"{row['case']:<16} {row['ratio']:>7.2f}x {row['memory_ratio']:>7.2f}x  {row['verdict']}")
+        if args.fail_on_regression and any(row["verdict"] == "régression" for row in comparison):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
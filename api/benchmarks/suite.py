@@ -0,0 +1,213 @@
+"""
+Suite de micro-benchmarks des chemins critiques du contrôleur sur un jeu synthétique :
+import (preview_excel jusqu'à la fin de la lecture), get_column_unique_values,
+select_columns, build_decision_tree (modes indépendant et ensemble) et generate_tree_pdf.
+Chaque cas est chronométré sur --repeat exécutions à froid (caches vidés), puis mesuré
+une fois sous tracemalloc (pic mémoire). Les résultats sont écrits en JSON (--output) et
+peuvent être comparés à ceux d'une exécution de référence (--baseline).
+
+Usage (depuis le dossier api/) :
+    python -m benchmarks.suite --rows 50000 --output resultats.json
+    python -m benchmarks.suite --rows 50000 --baseline resultats.json [--fail-on-regression]
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List, Any, Callable, Awaitable, Optional
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import DTYPES, make_accident_frame
+
+FILENAME = "benchmark.xlsx"
+
+
+def measure(run: Callable[[], Awaitable[Any]], repeat: int,
+            reset: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+    """
+    Durées de repeat exécutions (reset() avant chacune), puis pic mémoire d'une exécution de plus.
+    """
+    durations = []
+    for _ in range(repeat):
+        if reset is not None:
+            reset()
+        start = time.perf_counter()
+        asyncio.run(run())
+        durations.append(time.perf_counter() - start)
+
+    if reset is not None:
+        reset()
+    tracemalloc.start()
+    asyncio.run(run())
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "seconds_min": round(min(durations), 6),
+        "seconds_median": round(statistics.median(durations), 6),
+        "seconds": [round(duration, 6) for duration in durations],
+        "peak_mb": round(peak / 1e6, 3)
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    """
+    Rapport (médiane actuelle / médiane de référence) de chaque cas présent dans les deux exécutions.
+    """
+    rows = []
+    for name, result in results["cases"].items():
+        reference = baseline.get("cases", {}).get(name)
+        if reference is None:
+            continue
+        ratio = result["seconds_median"] / max(reference["seconds_median"], 1e-9)
+        memory_ratio = result["peak_mb"] / max(reference["peak_mb"], 1e-9)
+        if ratio > 1 + tolerance:
+            verdict = "régression"
+        elif ratio < 1 - tolerance:
+            verdict = "amélioration"
+        else:
+            verdict = "stable"
+        rows.append({"case": name, "ratio": round(ratio, 3), "memory_ratio": round(memory_ratio, 3),
+                     "verdict": verdict})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--variables", type=int, default=6)
+    parser.add_argument("--cardinality", type=int, nargs="+", default=[4],
+                        help="modalités par variable explicative (liste répétée sur les colonnes)")
+    parser.add_argument("--dtypes", nargs="+", default=["str"], choices=DTYPES,
+                        help="types des variables explicatives (liste répétée sur les colonnes)")
+    parser.add_argument("--null-rate", type=float, default=0.05)
+    parser.add_argument("--extra-columns", type=int, default=4)
+    parser.add_argument("--threshold", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-preview", action="store_true",
+                        help="ne pas mesurer l'import du classeur (jeu encodé directement)")
+    parser.add_argument("--output", help="fichier JSON des résultats")
+    parser.add_argument("--baseline", help="résultats JSON de référence à comparer")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="écart relatif de la médiane toléré avant de signaler une régression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    # Répertoires de travail isolés, fixés avant l'import des services
+    work_dir = tempfile.mkdtemp(prefix="bench_suite_")
+    os.environ["DATASET_STORE_DIR"] = os.path.join(work_dir, "store")
+    os.environ["PDF_CACHE_DIR"] = os.path.join(work_dir, "pdfs")
+    from starlette.datastructures import UploadFile
+
+    from controllers import excel_controller
+    from services.dataset_store import dataset_store
+    from services.encoding import encode_dataframe
+    from services.ingestion import ingestions
+    from services.stats_cache import stats_cache
+    from services.tree_cache import tree_cache
+
+    try:
+        frame = make_accident_frame(
+            args.rows, args.variables, null_rate=args.null_rate, n_extra=args.extra_columns,
+            seed=args.seed, cardinalities=args.cardinality, dtypes=args.dtypes
+        )
+        explanatory = [f"var{i}" for i in range(args.variables)]
+        selected_data = {"annee": [2016, 2017, 2018, 2019, 2020], "gravite": ["Tué", "Blessé hospitalisé"]}
+        cases = {}
+
+        if args.skip_preview:
+            dataset_store.put(FILENAME, encode_dataframe(frame))
+        else:
+            buffer = io.BytesIO()
+            frame.to_excel(buffer, index=False)
+            content = buffer.getvalue()
+            state = {}
+
+            def reset_dataset():
+                dataset_id = state.get("dataset_id")
+                if dataset_id is not None:
+                    ingestions.discard(dataset_id)
+                    dataset_store.delete(dataset_id)
+
+            async def preview():
+                result = await excel_controller.preview_excel(UploadFile(io.BytesIO(content), filename=FILENAME))
+                state["dataset_id"] = result["dataset_id"]
+                # Jusqu'à la fin de la lecture en arrière-plan
+                await excel_controller._get_dataset(FILENAME)
+
+            cases["preview_excel"] = measure(preview, args.repeat, reset_dataset)
+
+        def reset_caches():
+            stats_cache.clear()
+            tree_cache.clear()
+
+        cases["get_column_unique_values"] = measure(
+            lambda: excel_controller.get_column_unique_values(FILENAME, "var0"), args.repeat
+        )
+        cases["select_columns"] = measure(
+            lambda: excel_controller.select_columns(FILENAME, explanatory, ["gravite"], None), args.repeat
+        )
+        cases["select_columns[selected_data]"] = measure(
+            lambda: excel_controller.select_columns(FILENAME, explanatory, ["gravite"], selected_data), args.repeat
+        )
+        trees = {}
+        for mode in ("independent", "together"):
+            async def build(mode=mode):
+                trees[mode] = await excel_controller.build_decision_tree(
+                    FILENAME, explanatory, ["gravite"], selected_data, args.threshold, mode
+                )
+            cases[f"build_decision_tree[{mode}]"] = measure(build, args.repeat, reset_caches)
+
+        async def pdf():
+            excel_controller.generate_tree_pdf(trees["independent"]["decision_trees"], FILENAME)
+        cases["generate_tree_pdf"] = measure(pdf, args.repeat)
+
+        results = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "pandas": pd.__version__,
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "parameters": {key: value for key, value in vars(args).items()
+                               if key not in ("output", "baseline", "fail_on_regression")}
+            },
+            "cases": cases
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"{'cas':<32} {'médiane (s)':>12} {'min (s)':>10} {'pic (Mo)':>10}")
+    for name, case in cases.items():
+        print(f"{name:<32} {case['seconds_median']:>12.4f} {case['seconds_min']:>10.4f} {case['peak_mb']:>10.1f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("parameters") != results["meta"]["parameters"]:
+            print("attention : paramètres différents de ceux de la référence")
+        comparison = compare(results, baseline, args.tolerance)
+        print(f"\n{'cas':<32} {'temps':>8} {'mémoire':>8}  verdict")
+        for row in comparison:
+            print(f"{row['case']:<32} {row['ratio']:>7.2f}x {row['memory_ratio']:>7.2f}x  {row['verdict']}")
+        if args.fail_on_regression and any(row["verdict"] == "régression" for row in comparison):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+from typing import Optional, Sequence
+
+# Types de colonnes explicatives proposés par make_accident_frame
+DTYPES = ("str", "int", "float", "bool", "date", "mixed")
+
+
+def _column_values(i: int, dtype: str, cardinality: int) -> np.ndarray:
+    """
+    Modalités de la variable explicative var{i} pour le type dtype.
+    """
+    if dtype == "str":
+        return np.array([f"var{i}_mod{j}" for j in range(cardinality)], dtype=object)
+    if dtype == "int":
+        return np.arange(cardinality, dtype=np.float64)  # flottants : les cellules vides deviennent NaN, comme avec read_excel
+    if dtype == "float":
+        return np.arange(cardinality, dtype=np.float64) + 0.5
+    if dtype == "bool":
+        return np.array([True, False], dtype=object)[:max(1, min(cardinality, 2))]
+    if dtype == "date":
+        return (pd.Timestamp("2015-01-01") + pd.to_timedelta(np.arange(cardinality), unit="D")).to_numpy()
+    if dtype == "mixed":
+        # Nombres et textes dans la même colonne (saisie hétérogène)
+        return np.array([j if j % 2 else f"var{i}_mod{j}" for j in range(cardinality)], dtype=object)
+    raise ValueError(f"Type de colonne inconnu : {dtype} (attendu : {', '.join(DTYPES)})")
+
+
+def make_accident_frame(n_rows: int = 100_000, n_explanatory: int = 10, cardinality: int = 4,
+                        null_rate: float = 0.05, n_extra: int = 0, seed: Optional[int] = 0,
+                        cardinalities: Optional[Sequence[int]] = None,
+                        dtypes: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """
+    Génère un jeu de données synthétique façon "accidents" : des variables explicatives
+    catégorielles (texte), une variable à expliquer ("gravite"), une colonne de filtre ("annee")
+    et n_extra colonnes supplémentaires non utilisées par l'arbre.
+    cardinalities et dtypes (types de DTYPES) précisent, colonne par colonne, le nombre de
+    modalités et le type des variables explicatives (répétés si la liste est plus courte).
+    """
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i in range(n_explanatory):
+        column_cardinality = cardinalities[i % len(cardinalities)] if cardinalities else cardinality
+        dtype = dtypes[i % len(dtypes)] if dtypes else "str"
+        values = _column_values(i, dtype, column_cardinality)
+        column = values[rng.integers(0, len(values), n_rows)]
+        nulls = rng.random(n_rows) < null_rate
+        if column.dtype == object:
+            column[nulls] = None
+            data[f"var{i}"] = pd.Series(column, dtype=object)
+        elif column.dtype.kind == "M":
+            column[nulls] = np.datetime64("NaT")
+            data[f"var{i}"] = pd.Series(column)
+        else:
+            column[nulls] = np.nan
+            data[f"var{i}"] = pd.Series(column)
+    gravite = np.array(["Indemne", "Blessé léger", "Blessé hospitalisé", "Tué"], dtype=object)
+    data["gravite"] = pd.Series(gravite[rng.choice(4, n_rows, p=[0.5, 0.3, 0.15, 0.05])], dtype=object)
+    data["annee"] = rng.integers(2015, 2025, n_rows)
+    for i in range(n_extra):
+        data[f"info{i}"] = rng.integers(0, 100, n_rows)
+    return pd.DataFrame(data)
@@ -0,0 +1,150 @@
+"""
+Compare le pic mémoire de construct_flat_tree_for_value (jeu encodé, partitionnement par indices
+de lignes) à la construction d'origine (529671c) : masques booléens pandas sur le DataFrame
+lu par read_excel, et copie filtrée du DataFrame (toutes colonnes) à chaque nœud.
+
+Chaque côté part de la représentation qu'il garde en mémoire entre deux requêtes (DataFrame
+pandas avant, jeu encodé après) ; seul le coût de la construction est mesuré. Le seuil par
+défaut (100 lignes) laisse l'arbre descendre sur toutes les variables, comme en usage réel
+(1 365 nœuds à 200 000 lignes : mémoire de travail environ 16 fois moindre, construction
+environ 50 fois plus rapide).
+
+Usage (depuis le dossier api/) : python -m benchmarks.tree_memory [--rows N [N ...]] [--variables V]
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_accident_frame
+from controllers import excel_controller
+from services.encoding import encode_dataframe
+
+
+# ----------------------------------------------------------------------------
+# Construction d'origine (529671c), sans les try/except, sur un DataFrame pandas
+# ----------------------------------------------------------------------------
+
+def baseline_percentage_variance(df: pd.DataFrame, explanatory_var: str, target_var: str, target_value: Any) -> float:
+    if not ((df[target_var] == target_value) & df[target_var].notna()).any():
+        return 0.0
+    percentages = []
+    for explanatory_value in df[explanatory_var].dropna().unique():
+        total_explanatory = len(df[df[explanatory_var] == explanatory_value])
+        target_and_explanatory = len(
+            df[(df[explanatory_var] == explanatory_value) & (df[target_var] == target_value) & (df[target_var].notna())]
+        )
+        if total_explanatory > 0:
+            percentages.append((target_and_explanatory / total_explanatory) * 100)
+    return float(np.std(percentages)) if len(percentages) > 1 else 0.0
+
+
+def baseline_branch_percentages(df: pd.DataFrame, explanatory_var: str, target_var: str,
+                                target_value: Any) -> Dict[str, Dict[str, Any]]:
+    branches = {}
+    for explanatory_value in df[explanatory_var].dropna().unique():
+        total_explanatory = len(df[df[explanatory_var] == explanatory_value])
+        target_and_explanatory = len(
+            df[(df[explanatory_var] == explanatory_value) & (df[target_var] == target_value) & (df[target_var].notna())]
+        )
+        if total_explanatory > 0:
+            branches[str(explanatory_value)] = {
+                "count": int(target_and_explanatory),
+                "total": int(total_explanatory),
+                "percentage": round((target_and_explanatory / total_explanatory) * 100, 2),
+                "subtree": None
+            }
+    return branches
+
+
+def baseline_construct_tree(df: pd.DataFrame, target_value: Any, target_var: str, available_vars: List[str],
+                            current_path: List[str], threshold: Optional[int]) -> Dict[str, Any]:
+    if not available_vars:
+        return {"type": "leaf", "message": "Plus de variables explicatives disponibles"}
+    variances = {var: baseline_percentage_variance(df, var, target_var, target_value) for var in available_vars}
+    best_var = max(variances, key=variances.get)
+    branches = baseline_branch_percentages(df, best_var, target_var, target_value)
+    node = {"type": "node", "variable": best_var, "variance": round(variances[best_var], 4),
+            "branches": branches, "path": current_path + [best_var]}
+    remaining_vars = [var for var in available_vars if var != best_var]
+    for branch_value, branch_data in branches.items():
+        # Comparaison à la clé texte, comme l'original (qui ne reconvertissait que True/False)
+        converted = {"False": False, "True": True}.get(branch_value, branch_value)
+        filtered_df = df[(df[best_var] == converted) & (df[best_var].notna())]
+        if len(filtered_df) > 0 and remaining_vars:
+            if threshold and len(filtered_df) < threshold:
+                branch_data["subtree"] = {
+                    "type": "leaf",
+                    "message": f"[ARRET] Branche arrêtée - Effectif insuffisant ({len(filtered_df)} < {threshold})"
+                }
+            else:
+                branch_data["subtree"] = baseline_construct_tree(
+                    filtered_df, target_value, target_var, remaining_vars,
+                    current_path + [best_var, branch_value], threshold
+                )
+    return node
+
+
+def count_nodes(tree: Dict[str, Any]) -> int:
+    if not tree or tree.get("type") != "node":
+        return 0
+    return 1 + sum(count_nodes(branch.get("subtree")) for branch in tree["branches"].values())
+
+
+def measure(label, func):
+    """
+    Mesure le temps, le pic mémoire (tracemalloc) et la mémoire de travail (pic moins
+    l'arbre produit et les caches conservés).
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    tree = func()
+    elapsed = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    working = peak - retained
+    print(f"  {label:<20} {elapsed:8.2f} s   pic {peak / 1e6:8.1f} Mo   mémoire de travail {working / 1e6:8.1f} Mo")
+    return tree, peak, working
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[20_000, 200_000])
+    parser.add_argument("--variables", type=int, default=6)
+    parser.add_argument("--cardinality", type=int, default=4)
+    parser.add_argument("--threshold", type=int, default=100)
+    parser.add_argument("--extra-columns", type=int, default=30)
+    args = parser.parse_args()
+
+    variables = [f"var{i}" for i in range(args.variables)]
+    target_value = "Tué"
+
+    summary = []
+    for n_rows in args.rows:
+        frame = make_accident_frame(n_rows, args.variables, args.cardinality, n_extra=args.extra_columns)
+        df = encode_dataframe(frame)
+        print(f"{n_rows} lignes, {len(df.column_names)} colonnes")
+        baseline_tree, baseline_peak, baseline_working = measure(
+            "masques pandas",
+            lambda: baseline_construct_tree(frame, target_value, "gravite", variables, [], args.threshold)
+        )
+        indexed_tree, indexed_peak, indexed_working = measure(
+            "indices de lignes",
+            lambda: excel_controller.construct_flat_tree_for_value(df, target_value, "gravite", variables, args.threshold)
+        )
+        nested = indexed_tree.to_nested()
+        identical = json.dumps(baseline_tree, sort_keys=True) == json.dumps(nested, sort_keys=True)
+        print(f"  {count_nodes(nested)} nœuds, arbres identiques : {identical}")
+        summary.append((n_rows, baseline_peak, indexed_peak, baseline_working / max(indexed_working, 1)))
+
+    print(f"\n{'lignes':>10} {'pic pandas (Mo)':>16} {'pic indices (Mo)':>17} {'gain (travail)':>15}")
+    for n_rows, baseline_peak, indexed_peak, gain in summary:
+        print(f"{n_rows:>10} {baseline_peak / 1e6:>16.1f} {indexed_peak / 1e6:>17.1f} {gain:>14.1f}x")
+
+
+if __name__ == "__main__":
+    main()
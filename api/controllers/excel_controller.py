@@ -1,102 +1,135 @@
 import os
-import tempfile
-import shutil
 import pandas as pd
 import numpy as np
 import json
-from typing import Dict, List, Any, Optional, Tuple
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from typing import Dict, List, Any, Hashable, Iterator, Optional, Tuple
 import io
 import base64
+import asyncio
+import heapq
+from services import jobs, parallel, scoring
+from services.dataset_store import dataset_store
+from services.metrics import metrics
+from services.pdf_cache import pdf_cache
+from services.ingestion import ingestions, save_upload
+from services.stats_cache import node_key, stats_cache
+from services.tree_budget import TRUNCATION_PREFIX, TreeBudget
+from services.tree_cache import tree_cache
+from services.serialization import dumps, frame_records, to_json_list
+from services.encoding import BLOCK_ROWS, EncodedColumn, EncodedDataset, encode_dataframe
+from services.flat_tree import FLAT_FORMAT, FlatTree, FlatTreeBuilder, nested_trees
 # Imports matplotlib supprimés - les diagrammes sont maintenant générés côté frontend
 
-# Stockage temporaire en mémoire
-uploaded_files = {}
-
-from openpyxl import load_workbook
+# Taille par défaut (et maximale) d'une page de /excel/selected-data
+SELECTED_DATA_PAGE_ROWS = int(os.getenv("SELECTED_DATA_PAGE_ROWS", "10000"))
+SELECTED_DATA_MAX_PAGE_ROWS = int(os.getenv("SELECTED_DATA_MAX_PAGE_ROWS", "100000"))
 
 async def preview_excel(file):
     if not file.filename.endswith((".xls", ".xlsx")):
         return {"error": "Le fichier doit être un Excel (.xls ou .xlsx)"}
     
-    # Sauvegarder l'upload en fichier temporaire pour évaluer la taille et convertir si besoin
+    # Sauvegarder l'upload en fichier temporaire en calculant son empreinte (dataset_id)
+    tmp_path = None
     try:
         suffix = ".xlsx" if file.filename.lower().endswith('.xlsx') else ".xls"
-        tmp_dir = tempfile.gettempdir()
-        tmp_path = os.path.join(tmp_dir, f"preview_{next(tempfile._get_candidate_names())}{suffix}")
         try:
             file.file.seek(0)
         except Exception:
             pass
-        with open(tmp_path, "wb") as out:
-            shutil.copyfileobj(file.file, out)
-
-        path_to_read = tmp_path
-        # Conversion .xls -> .xlsx si taille raisonnable (seuil augmenté à 30 Mo)
-        if file.filename.lower().endswith('.xls'):
-            try:
-                size_mb = max(0.0, os.path.getsize(tmp_path) / 1_000_000.0)
-                if size_mb <= 30.0:
-                    xls_df = pd.read_excel(tmp_path)
-                    converted_path = os.path.join(tempfile.gettempdir(), f"converted_{next(tempfile._get_candidate_names())}.xlsx")
-                    xls_df.to_excel(converted_path, index=False)
-                    path_to_read = converted_path
-            except Exception:
-                path_to_read = tmp_path
+        tmp_path, dataset_id = save_upload(file.file, suffix)
+        dataset_store.alias(file.filename, dataset_id)
 
-        # Lecture du DataFrame
-        df = pd.read_excel(path_to_read)
-        df = df.replace([np.nan, np.inf, -np.inf], None)
+        # Même contenu déjà importé (lecture terminée ou en cours) : réutilisation sans relecture
+        ingestion = ingestions.get(dataset_id)
+        if ingestion is None or ingestion.status == "error":
+            df = dataset_store.get(dataset_id)
+            if df is not None:
+                os.remove(tmp_path)
+                preview = df.to_frame(rows=np.arange(min(5, len(df))))
+                return {
+                    "filename": file.filename,
+                    "dataset_id": dataset_id,
+                    "rows": int(len(df)),
+                    "rows_estimated": False,
+                    "status": "ready",
+                    "columns": df.column_names,
+                    "preview": preview.replace([np.nan, np.inf, -np.inf], None).to_dict(orient="records")
+                }
 
-        uploaded_files[file.filename] = df
+            # Lecture en flux (openpyxl en lecture seule pour .xlsx, xlrd directement pour .xls) :
+            # l'aperçu et les colonnes sont renvoyés tout de suite, le reste du classeur est
+            # encodé par blocs en arrière-plan puis enregistré dans le dataset_store.
+            ingestion = ingestions.start(dataset_id, file.filename, tmp_path)
+        else:
+            os.remove(tmp_path)
 
         return {
             "filename": file.filename,
-            "rows": int(len(df)),
-            "columns": df.columns.tolist(),
-            "preview": df.head(5).to_dict(orient="records")
+            "dataset_id": dataset_id,
+            "rows": ingestion.rows_read if ingestion.status == "ready" else ingestion.estimated_rows,
+            "rows_estimated": ingestion.status != "ready",
+            "status": ingestion.status,
+            "columns": ingestion.columns,
+            "preview": ingestion.preview
         }
     except Exception as e:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
         return {"error": f"Preview failed: {str(e)}"}
 
-async def select_columns(filename: str, variables_explicatives: List[str], variable_a_expliquer: List[str], selected_data: Dict = None):
-    if filename not in uploaded_files:
+async def _get_dataset(filename: str) -> Tuple[Optional[EncodedDataset], Optional[Dict[str, Any]]]:
+    """
+    Jeu encodé désigné par filename (dataset_id, ou nom du dernier fichier importé sous ce nom),
+    en attendant la fin de sa lecture si elle est en cours ; sinon le dictionnaire d'erreur à renvoyer.
+    """
+    dataset_id = dataset_store.resolve(filename)
+    ingestion = ingestions.get(dataset_id)
+    if ingestion is not None:
+        try:
+            await asyncio.wrap_future(ingestion.future)
+        except Exception as e:
+            return None, {"error": f"Preview failed: {str(e)}"}
+    df = dataset_store.get(dataset_id)
+    if df is None:
+        return None, {"error": "Fichier non trouvé. Faites d'abord /excel/preview."}
+    return df, None
+
+async def get_preview_status(filename: str) -> Dict[str, Any]:
+    dataset_id = dataset_store.resolve(filename)
+    ingestion = ingestions.get(dataset_id)
+    if ingestion is None:
+        if dataset_store.get(dataset_id) is not None:
+            return {"dataset_id": dataset_id, "status": "ready"}
         return {"error": "Fichier non trouvé. Faites d'abord /excel/preview."}
-    
-    df = uploaded_files[filename]
+    return ingestion.to_status()
+
+async def select_columns(filename: str, variables_explicatives: List[str], variable_a_expliquer: List[str], selected_data: Dict = None,
+                         top_values: Optional[int] = None):
+    df, error = await _get_dataset(filename)
+    if error:
+        return error
 
     # Vérifier que toutes les colonnes existent
     all_columns = variables_explicatives + variable_a_expliquer
     for col in all_columns:
-        if col not in df.columns:
+        if col not in df:
             return {"error": f"La colonne '{col}' n'existe pas dans {filename}"}
 
     # Identifier les colonnes restantes (celles qui ne sont ni explicatives ni à expliquer)
-    all_df_columns = set(df.columns)
+    all_df_columns = set(df.column_names)
     remaining_columns = list(all_df_columns - set(all_columns))
     
     # Si selected_data n'est pas fourni, retourner les données des colonnes restantes
     if selected_data is None:
+        # Valeurs distinctes et effectifs lus dans l'index construit à l'enregistrement du jeu
+        # (top_values : seulement les valeurs les plus fréquentes de chaque colonne)
+        column_index = dataset_store.column_index(dataset_store.resolve(filename))
         remaining_data = {}
+        remaining_value_counts = {}
         for col in remaining_columns:
-            # Récupérer toutes les valeurs uniques de la colonne
-            unique_values = df[col].dropna().unique()
-            # Convertir en types Python natifs
-            converted_values = []
-            for val in unique_values:
-                if pd.isna(val):
-                    converted_values.append(None)
-                elif isinstance(val, (np.integer, np.floating)):
-                    converted_values.append(float(val) if isinstance(val, np.floating) else int(val))
-                else:
-                    converted_values.append(str(val))
-            
-            remaining_data[str(col)] = converted_values
+            values = column_index[col].lookup(top=top_values)
+            remaining_data[str(col)] = values["values"]
+            remaining_value_counts[str(col)] = values["counts"]
         
         return {
             "filename": str(filename),
@@ -104,23 +137,19 @@ async def select_columns(filename: str, variables_explicatives: List[str], varia
             "variables_a_expliquer": [str(var) for var in variable_a_expliquer],
             "remaining_columns": [str(col) for col in remaining_columns],
             "remaining_data": remaining_data,
+            "remaining_value_counts": remaining_value_counts,
             "message": "Veuillez sélectionner les données des colonnes restantes sur lesquelles vous voulez travailler"
         }
     
     # Si selected_data est fourni, traiter la sélection finale
-    # Préparer les données explicatives
-    X = df[variables_explicatives]
-    
-    # Préparer les variables à expliquer (chacune séparément)
-    y_variables = {}
-    for var in variable_a_expliquer:
-        y_variables[var] = df[var]
+    # Préparer l'aperçu des données explicatives
+    X_preview = frame_records(df.to_frame(variables_explicatives, np.arange(min(5, len(df)))))
 
     # Préparer les résultats pour chaque variable à expliquer
     results = []
     for var in variable_a_expliquer:
         # Convertir les données pandas en types Python natifs
-        y_data = df[var]
+        y_data = df[var].to_series()
         
         # Calculer les statistiques avec conversion en types natifs
         y_stats = {
@@ -143,51 +172,38 @@ async def select_columns(filename: str, variables_explicatives: List[str], varia
                 pass
         
         # Convertir les aperçus en types natifs
-        y_preview = []
-        for val in y_data.head(5):
-            if pd.isna(val):
-                y_preview.append(None)
-            elif isinstance(val, (np.integer, np.floating)):
-                y_preview.append(float(val) if isinstance(val, np.floating) else int(val))
-            else:
-                y_preview.append(str(val))
+        y_preview = to_json_list(y_data.head(5))
         
         result = {
             "variable_a_expliquer": str(var),  # Convertir en string natif
             "variables_explicatives": [str(col) for col in variables_explicatives],  # Convertir en strings natifs
-            "X_preview": X.head(5).to_dict(orient="records"),
+            "X_preview": X_preview,
             "y_preview": y_preview,
             "y_stats": y_stats
         }
         results.append(result)
 
-    # Préparer les données sélectionnées par l'utilisateur
+    # Préparer les données sélectionnées par l'utilisateur : valeurs retenues (présentes dans la
+    # colonne) et effectifs, lus dans l'index des valeurs. Les valeurs ligne par ligne sont servies
+    # par /excel/selected-data (paginé) et /excel/selected-data/stream (NDJSON).
+    column_index = dataset_store.column_index(dataset_store.resolve(filename))
     selected_data_with_columns = {}
+    selected_data_counts = {}
     for col_name, selected_values in selected_data.items():
-        if col_name in df.columns:
-            # Filtrer le DataFrame pour ne garder que les lignes où la colonne contient les valeurs sélectionnées
-            mask = df[col_name].isin(selected_values)
-            filtered_df = df[mask]
-            
-            # Récupérer les données de cette colonne filtrée
-            col_data = filtered_df[col_name].tolist()
-            # Convertir en types Python natifs
-            converted_col_data = []
-            for val in col_data:
-                if pd.isna(val):
-                    converted_col_data.append(None)
-                elif isinstance(val, (np.integer, np.floating)):
-                    converted_col_data.append(float(val) if isinstance(val, np.floating) else int(val))
-                else:
-                    converted_col_data.append(str(val))
-            
-            selected_data_with_columns[str(col_name)] = converted_col_data
+        if col_name in df:
+            column_stats = column_index[col_name]
+            codes = df[col_name].isin_codes(selected_values)
+            codes = codes[column_stats.counts[codes] > 0]
+            counts = column_stats.counts[codes]
+            selected_data_with_columns[str(col_name)] = [column_stats.values[code] for code in codes.tolist()]
+            selected_data_counts[str(col_name)] = {"rows": int(counts.sum()), "value_counts": counts.tolist()}
 
     return {
         "filename": str(filename),  # Convertir en string natif
         "variables_explicatives": [str(col) for col in variables_explicatives],  # Convertir en strings natifs
         "variables_a_expliquer": [str(var) for var in variable_a_expliquer],  # Convertir en strings natifs
-        "selected_data": selected_data_with_columns,  # Données choisies par l'utilisateur avec noms de colonnes
+        "selected_data": selected_data_with_columns,  # Valeurs choisies par l'utilisateur avec noms de colonnes
+        "selected_data_counts": selected_data_counts,  # Lignes retenues par colonne et effectif de chaque valeur
         "results": results,
         "summary": {
             "total_variables_explicatives": int(len(variables_explicatives)),  # Convertir en int natif
@@ -197,40 +213,102 @@ async def select_columns(filename: str, variables_explicatives: List[str], varia
         }
     }
 
-async def get_column_unique_values(filename: str, column_name: str):
-    if filename not in uploaded_files:
-        return {"error": "Fichier non trouvé. Faites d'abord /excel/preview."}
+def _iter_selected_rows(column: EncodedColumn, codes: np.ndarray, start_row: int = 0) -> Iterator[np.ndarray]:
+    """
+    Lignes (à partir de start_row) dont le code appartient à codes, bloc de BLOCK_ROWS lignes par bloc.
+    """
+    if len(codes) == 0:
+        return
+    for start in range(max(start_row, 0), len(column), BLOCK_ROWS):
+        block = column.codes[start:start + BLOCK_ROWS]
+        yield np.flatnonzero(np.isin(block, codes)) + start
+
+async def get_selected_data_page(filename: str, column_name: str, selected_values: List[Any],
+                                 cursor: Optional[int] = None, limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Une page des valeurs (ligne par ligne) de column_name retenues par selected_values.
+    cursor est la ligne où reprendre (next_cursor de la page précédente, None en fin de données).
+    """
+    df, error = await _get_dataset(filename)
+    if error:
+        return error
+    if column_name not in df:
+        return {"error": f"La colonne '{column_name}' n'existe pas dans {filename}"}
     
-    df = uploaded_files[filename]
+    limit = min(max(limit or SELECTED_DATA_PAGE_ROWS, 1), SELECTED_DATA_MAX_PAGE_ROWS)
+    column = df[column_name]
+    pages = []
+    n_rows = 0
+    next_cursor = None
+    for rows in _iter_selected_rows(column, column.isin_codes(selected_values), cursor or 0):
+        if n_rows + len(rows) >= limit:
+            rows = rows[:limit - n_rows]
+            pages.append(rows)
+            if len(rows) and rows[-1] + 1 < len(column):
+                next_cursor = int(rows[-1]) + 1
+            break
+        pages.append(rows)
+        n_rows += len(rows)
+    rows = np.concatenate(pages) if pages else np.empty(0, dtype=np.intp)
     
-    if column_name not in df.columns:
-        return {"error": f"La colonne '{column_name}' n'existe pas dans {filename}"}
+    return {
+        "filename": str(filename),
+        "column_name": str(column_name),
+        "cursor": cursor or 0,
+        "next_cursor": next_cursor,
+        "count": len(rows),
+        "values": to_json_list(column.decode(rows))
+    }
+
+async def stream_selected_data(filename: str, selected_data: Dict[str, List[Any]]) -> Tuple[Optional[Iterator[bytes]], Optional[Dict[str, Any]]]:
+    """
+    Valeurs (ligne par ligne) retenues par selected_data, en NDJSON : une ligne
+    {"column": ..., "values": [...]} par bloc de lignes, colonne après colonne.
+    La mémoire utilisée ne dépend pas de la taille du jeu.
+    """
+    df, error = await _get_dataset(filename)
+    if error:
+        return None, error
     
-    # Récupérer toutes les valeurs uniques de la colonne
-    unique_values = df[column_name].dropna().unique()
+    def lines() -> Iterator[bytes]:
+        for col_name, selected_values in selected_data.items():
+            if col_name not in df:
+                continue
+            column = df[col_name]
+            for rows in _iter_selected_rows(column, column.isin_codes(selected_values)):
+                if len(rows):
+                    yield dumps({"column": str(col_name), "values": to_json_list(column.decode(rows))}) + b"\n"
     
-    # Convertir en types Python natifs
-    converted_values = []
-    for val in unique_values:
-        if pd.isna(val):
-            converted_values.append(None)
-        elif isinstance(val, (np.integer, np.floating)):
-            converted_values.append(float(val) if isinstance(val, np.floating) else int(val))
-        else:
-            converted_values.append(str(val))
+    return lines(), None
+
+async def get_column_unique_values(filename: str, column_name: str, search: Optional[str] = None,
+                                   top: Optional[int] = None):
+    df, error = await _get_dataset(filename)
+    if error:
+        return error
+    
+    if column_name not in df:
+        return {"error": f"La colonne '{column_name}' n'existe pas dans {filename}"}
+    
+    # Valeurs distinctes précalculées à l'enregistrement du jeu (recherche par préfixe, top par effectif)
+    column_stats = dataset_store.column_index(dataset_store.resolve(filename))[column_name]
+    values = column_stats.lookup(search, top)
     
     return {
         "filename": str(filename),
         "column_name": str(column_name),
-        "unique_values": converted_values,
-        "total_unique_values": len(converted_values)
+        "unique_values": values["values"],
+        "value_counts": values["counts"],
+        "null_count": column_stats.null_count,
+        "matching_unique_values": values["matching"],
+        "total_unique_values": len(column_stats)
     }
 
 # ============================================================================
 # NOUVELLES FONCTIONS POUR L'ARBRE DE DÉCISION
 # ============================================================================
 
-def calculate_percentage_variance(df: pd.DataFrame, explanatory_var: str, target_var: str, target_value: Any) -> float:
+def calculate_percentage_variance(df: EncodedDataset, explanatory_var: str, target_var: str, target_value: Any) -> float:
     """
     Calcule l'écart-type des pourcentages des valeurs d'une variable explicative
     pour une valeur cible donnée.
@@ -239,69 +317,59 @@ def calculate_percentage_variance(df: pd.DataFrame, explanatory_var: str, target
     de chaque valeur de la variable explicative, pas par rapport au total filtré.
     """
     try:
-        # Filtrer pour la valeur cible (exclure les NaN)
-        target_mask = (df[target_var] == target_value) & (df[target_var].notna())
-        filtered_df = df[target_mask]
-        
-        if len(filtered_df) == 0:
-            return 0.0
-        
-        # Obtenir toutes les valeurs uniques de la variable explicative dans le dataset filtré
-        all_explanatory_values = df[explanatory_var].dropna().unique()
-        
-        if len(all_explanatory_values) == 0:
-            return 0.0
-        
-        # Pour chaque valeur de la variable explicative, calculer le pourcentage
-        # d'accidents de type "target_value" parmi tous les accidents de cette valeur
-        percentages = []
-        
-        for explanatory_value in all_explanatory_values:
-            # Nombre total d'accidents avec cette valeur explicative
-            total_explanatory = len(df[df[explanatory_var] == explanatory_value])
-            
-            # Nombre d'accidents avec cette valeur explicative ET la valeur cible
-            target_and_explanatory = len(
-                df[(df[explanatory_var] == explanatory_value) & 
-                   (df[target_var] == target_value) & 
-                   (df[target_var].notna())]
-            )
-            
-            # Calculer le pourcentage
-            if total_explanatory > 0:
-                percentage = (target_and_explanatory / total_explanatory) * 100
-                percentages.append(percentage)
-        
-        # Calculer l'écart-type des pourcentages
-        if len(percentages) > 1:
-            return float(np.std(percentages))
-        else:
-            return 0.0
-            
+        hit_mask = scoring.target_hit_mask(df[target_var], target_value)
+        table = scoring.build_contingency_table(df[explanatory_var], hit_mask)
+        return scoring.percentage_std(table)
     except Exception as e:
         return 0.0
 
-def select_best_explanatory_variable(df: pd.DataFrame, available_vars: List[str], 
-                                   target_var: str, target_value: Any) -> Tuple[str, float]:
+def _select_best_split(df: EncodedDataset, rows: Optional[np.ndarray], hit_mask: Optional[np.ndarray],
+                       available_vars: List[str],
+                       cache_key: Optional[Hashable] = None) -> Tuple[Optional[str], float, Optional[scoring.ContingencyTable]]:
     """
-    Sélectionne la variable explicative avec le plus grand écart-type des pourcentages.
+    Évalue toutes les variables explicatives sur les lignes rows (une passe chacune) et renvoie
+    la meilleure, son écart-type et sa table de contingence (réutilisée pour les branches).
+    hit_mask est le masque des cas cibles restreint à ces lignes (calculé à la demande
+    s'il est appelable). Avec cache_key (clé du nœud), les tables passent par le stats_cache.
     """
-    best_var = None
-    best_variance = -1
-    
     var_variances = {}
+    tables = {}
+    metrics.count("variables_scored", len(available_vars))
     for var in available_vars:
-        variance = calculate_percentage_variance(df, var, target_var, target_value)
-        var_variances[var] = variance
+        try:
+            table = stats_cache.get((cache_key, var)) if cache_key is not None else None
+            if table is None:
+                if callable(hit_mask):
+                    hit_mask = hit_mask()
+                metrics.count("rows_scanned", len(df) if rows is None else len(rows))
+                table = scoring.build_contingency_table(df[var], hit_mask, rows)
+                if cache_key is not None:
+                    stats_cache.put((cache_key, var), table)
+            tables[var] = table
+            var_variances[var] = scoring.percentage_std(table)
+        except Exception:
+            var_variances[var] = 0.0
     
-    # Sélectionner la variable avec la plus grande variance
-    if var_variances:
-        best_var = max(var_variances, key=var_variances.get)
-        best_variance = var_variances[best_var]
+    if not var_variances:
+        return None, -1, None
     
+    # Sélectionner la variable avec la plus grande variance
+    best_var = max(var_variances, key=var_variances.get)
+    return best_var, var_variances[best_var], tables.get(best_var)
+
+def select_best_explanatory_variable(df: EncodedDataset, available_vars: List[str], 
+                                   target_var: str, target_value: Any) -> Tuple[str, float]:
+    """
+    Sélectionne la variable explicative avec le plus grand écart-type des pourcentages.
+    """
+    try:
+        hit_mask = scoring.target_hit_mask(df[target_var], target_value)
+    except Exception:
+        hit_mask = None
+    best_var, best_variance, _ = _select_best_split(df, None, hit_mask, available_vars)
     return best_var, best_variance
 
-def calculate_branch_percentages(df: pd.DataFrame, explanatory_var: str, 
+def calculate_branch_percentages(df: EncodedDataset, explanatory_var: str, 
                                target_var: str, target_value: Any) -> Dict[str, Dict[str, Any]]:
     """
     Calcule les pourcentages et comptages pour chaque branche d'une variable explicative.
@@ -310,200 +378,478 @@ def calculate_branch_percentages(df: pd.DataFrame, explanatory_var: str,
     de chaque valeur de la variable explicative, pas par rapport au total filtré.
     """
     try:
-
-        
-        # Obtenir toutes les valeurs uniques de la variable explicative dans le dataset filtré
-        all_explanatory_values = df[explanatory_var].dropna().unique()
-        
-        if len(all_explanatory_values) == 0:
-            return {}
-        
-        branches = {}
-        
-        for explanatory_value in all_explanatory_values:
-            # Nombre total d'accidents avec cette valeur explicative
-            total_explanatory = len(df[df[explanatory_var] == explanatory_value])
-            
-            # Nombre d'accidents avec cette valeur explicative ET la valeur cible
-            target_and_explanatory = len(
-                df[(df[explanatory_var] == explanatory_value) & 
-                   (df[target_var] == target_value) & 
-                   (df[target_var].notna())]
-            )
-            
-            # Calculer le pourcentage
-            if total_explanatory > 0:
-                percentage = (target_and_explanatory / total_explanatory) * 100
-                branches[str(explanatory_value)] = {
-                    "count": int(target_and_explanatory),   # cas cibles
-                    "total": int(total_explanatory),         # effectif total de la branche
-                    "percentage": round(percentage, 2),
-                    "subtree": None  # Sera rempli récursivement
-                }
-        
-        return branches
-        
+        hit_mask = scoring.target_hit_mask(df[target_var], target_value)
+        table = scoring.build_contingency_table(df[explanatory_var], hit_mask)
+        return scoring.branch_statistics(table)
     except Exception as e:
         return {}
 
-def construct_tree_for_value(df: pd.DataFrame, target_value: Any, target_var: str, 
-                           available_explanatory_vars: List[str], current_path: List[str] = None,
-                           min_population_threshold: Optional[int] = None) -> Dict[str, Any]:
+# Au-delà de ce nombre de branches, les lignes sont réparties par un tri unique
+# plutôt que par une comparaison par branche
+PARTITION_SORT_MIN_BRANCHES = 32
+
+def _iter_branch_rows(column: EncodedColumn, rows: Optional[np.ndarray],
+                      table: scoring.ContingencyTable):
     """
-    Construit récursivement l'arbre de décision pour une valeur cible donnée.
+    Génère (code, indices des lignes) pour chaque branche, dans l'ordre de la table.
+    Les indices d'une branche ne sont matérialisés qu'au moment de la traiter, si bien
+    que la mémoire de travail reste proportionnelle à la profondeur de l'arbre.
+    L'ordre des lignes est conservé à l'intérieur de chaque branche.
     """
-    if current_path is None:
-        current_path = []
+    node_codes = column.codes if rows is None else column.codes[rows]
+    index_dtype = np.int32 if len(column.codes) < np.iinfo(np.int32).max else np.intp
     
+    if len(table.codes) < PARTITION_SORT_MIN_BRANCHES:
+        for code in table.codes.tolist():
+            blocks = []
+            for start in range(0, len(node_codes), BLOCK_ROWS):
+                block_mask = node_codes[start:start + BLOCK_ROWS] == code
+                if rows is None:
+                    blocks.append(np.flatnonzero(block_mask).astype(index_dtype) + start)
+                else:
+                    blocks.append(rows[start:start + BLOCK_ROWS][block_mask])
+            yield code, np.concatenate(blocks)
+        return
+    
+    # Forte cardinalité : un seul tri stable, chaque branche est une vue du tableau trié
+    order = np.argsort(node_codes, kind="stable")
+    sorted_rows = (order if rows is None else rows[order]).astype(index_dtype, copy=False)
+    starts = np.searchsorted(node_codes[order], table.codes)
+    del order
+    for code, start, total in zip(table.codes.tolist(), starts.tolist(), table.totals.tolist()):
+        yield code, sorted_rows[start:start + total]
+
+def _threshold_stop_message(n_rows: int, min_population_threshold: int) -> str:
+    return f"[ARRET] Branche arrêtée - Effectif insuffisant ({n_rows} < {min_population_threshold})"
+
+def _is_threshold_stop_leaf(tree: FlatTree, element: int) -> bool:
+    message = tree.leaf_message(element)
+    return message is not None and message.startswith("[ARRET]")
+
+def _rows_for_filter(df: EncodedDataset, rows: Optional[np.ndarray],
+                     row_filter: Tuple[Tuple[str, int], ...]) -> np.ndarray:
+    """
+    Lignes (parmi rows, None = toutes) décrites par la suite de (variable, code) row_filter.
+    """
+    filtered_rows = rows if rows is not None else np.arange(len(df))
+    for var, code in row_filter:
+        filtered_rows = filtered_rows[df[var].codes[filtered_rows] == code]
+    return filtered_rows
+
+def _split_node(builder: FlatTreeBuilder, element: int, df: EncodedDataset,
+                rows: Optional[np.ndarray], hit_mask: np.ndarray,
+                available_explanatory_vars: List[str],
+                min_population_threshold: Optional[int],
+                row_filter: Tuple[Tuple[str, int], ...],
+                cache_scope: Optional[Hashable]) -> Iterator[Tuple[int, np.ndarray, Tuple[Tuple[str, int], ...], List[str]]]:
+    """
+    Traite le nœud porté par element (nœud de découpage et ses branches, ou feuille) et génère
+    les branches encore à développer : (élément, lignes, row_filter, variables restantes).
+    Les lignes d'une branche ne sont matérialisées qu'au moment où elle est demandée.
+    """
     # Critère d'arrêt : plus de variables explicatives disponibles
     if not available_explanatory_vars:
-        return {
-            "type": "leaf",
-            "message": "Plus de variables explicatives disponibles"
-        }
+        builder.set_leaf(element, "Plus de variables explicatives disponibles")
+        return
     
     # Sélectionner la meilleure variable explicative
-    best_var, best_variance = select_best_explanatory_variable(
-        df, available_explanatory_vars, target_var, target_value
+    # (masque des cas cibles du nœud calculé seulement si une table manque au cache)
+    node_hits = hit_mask if rows is None else (lambda: hit_mask[rows])
+    cache_key = node_key(cache_scope, row_filter) if cache_scope is not None else None
+    best_var, best_variance, best_table = _select_best_split(
+        df, rows, node_hits, available_explanatory_vars, cache_key
     )
+    del node_hits
     
     if best_var is None:
-        return {
-            "type": "leaf",
-            "message": "Aucune variable explicative valide trouvée"
-        }
-    
-    # Calculer les branches pour cette variable
-    branches = calculate_branch_percentages(df, best_var, target_var, target_value)
+        builder.set_leaf(element, "Aucune variable explicative valide trouvée")
+        return
     
-    # Créer le nœud de l'arbre
-    tree_node = {
-        "type": "node",
-        "variable": best_var,
-        "variance": round(best_variance, 4),
-        "branches": branches,
-        "path": current_path + [best_var]
+    # Créer le nœud de l'arbre et ses branches (à partir de la même table de contingence)
+    builder.set_node(element, best_var, round(best_variance, 4))
+    metrics.count("nodes_built")
+    if best_table is None:
+        return
+    branch_elements = {
+        code: builder.add_branch(element, value, hit, total, percentage, code)
+        for code, value, hit, total, percentage in scoring.branch_rows(best_table)
     }
     
     # Variables explicatives restantes pour les sous-arbres
     remaining_vars = [var for var in available_explanatory_vars if var != best_var]
+    if not remaining_vars:
+        return
     
-    # Construire récursivement les sous-arbres pour chaque branche
-    for branch_value, branch_data in branches.items():
-        # Filtrer le DataFrame pour cette branche
-        # Convertir branch_value en type approprié pour la comparaison
-        if branch_value == 'False':
-            branch_value_converted = False
-        elif branch_value == 'True':
-            branch_value_converted = True
-        else:
-            branch_value_converted = branch_value
-        
-        branch_mask = (df[best_var] == branch_value_converted) & (df[best_var].notna())
-        filtered_df = df[branch_mask]
-        
-        if len(filtered_df) > 0 and remaining_vars:
+    for code, branch_rows in _iter_branch_rows(df[best_var], rows, best_table):
+        if len(branch_rows) > 0:
+            branch_element = branch_elements[code]
             # Vérifier le seuil d'effectif minimum (0 = pas de limite)
-            if min_population_threshold and min_population_threshold > 0 and len(filtered_df) < min_population_threshold:
+            if min_population_threshold and min_population_threshold > 0 and len(branch_rows) < min_population_threshold:
                 # Arrêter la construction si l'effectif est trop faible
-                branch_data["subtree"] = {
-                    "type": "leaf",
-                    "message": f"[ARRET] Branche arrêtée - Effectif insuffisant ({len(filtered_df)} < {min_population_threshold})"
-                }
+                builder.set_leaf(branch_element, _threshold_stop_message(len(branch_rows), min_population_threshold))
             else:
-                # Construire le sous-arbre récursivement
-                subtree = construct_tree_for_value(
-                    filtered_df, target_value, target_var, 
-                    remaining_vars, current_path + [best_var, branch_value],
-                    min_population_threshold
-                )
-                branch_data["subtree"] = subtree
+                yield branch_element, branch_rows, row_filter + ((best_var, code),), remaining_vars
+
+def _construct_subtree(builder: FlatTreeBuilder, element: int, df: EncodedDataset,
+                       rows: Optional[np.ndarray], hit_mask: np.ndarray,
+                       available_explanatory_vars: List[str],
+                       min_population_threshold: Optional[int],
+                       row_filter: Tuple[Tuple[str, int], ...] = (),
+                       scheduler: Optional["parallel.SubtreeScheduler"] = None,
+                       cache_scope: Optional[Hashable] = None):
+    """
+    Construction récursive, dans builder, du sous-arbre porté par element, sur un jeu encodé
+    partagé : chaque nœud ne reçoit que les indices de ses lignes (rows, None = toutes les
+    lignes), jamais une copie des données.
+    row_filter décrit ces lignes comme la suite des (variable, code) choisis depuis la racine.
+    Si un scheduler est fourni, les sous-arbres assez grands lui sont confiés.
+    cache_scope identifie le jeu, l'échantillon et la cible (voir tree_cache_scope).
+    """
+    branches = _split_node(
+        builder, element, df, rows, hit_mask, available_explanatory_vars,
+        min_population_threshold, row_filter, cache_scope
+    )
+    # Construire récursivement les sous-arbres pour chaque branche
+    for branch_element, branch_rows, branch_filter, remaining_vars in branches:
+        if scheduler is not None and scheduler.accepts(len(branch_rows)):
+            # Sous-arbre volumineux : construit par le pool de processus
+            scheduler.submit(builder, branch_element, branch_filter, remaining_vars)
+        else:
+            _construct_subtree(
+                builder, branch_element, df, branch_rows, hit_mask,
+                remaining_vars, min_population_threshold, branch_filter, scheduler, cache_scope
+            )
+
+def _construct_subtree_best_first(builder: FlatTreeBuilder, element: int, df: EncodedDataset,
+                                  rows: Optional[np.ndarray], hit_mask: np.ndarray,
+                                  available_explanatory_vars: List[str],
+                                  min_population_threshold: Optional[int], budget: TreeBudget,
+                                  cache_scope: Optional[Hashable] = None):
+    """
+    Construction sous budget (profondeur, nombre de nœuds, échéance) : les branches en attente
+    sont développées par effectif décroissant, si bien qu'un arbre interrompu contient
+    d'abord les nœuds qui portent le plus de lignes. Chaque branche restée en attente
+    reçoit une feuille de troncature (TRUNCATION_PREFIX). Sans interruption, l'arbre est
+    identique à celui de _construct_subtree.
+    """
+    n_rows = len(df) if rows is None else len(rows)
+    # Files des branches en attente : (-effectif, ordre d'arrivée, élément, lignes, row_filter, variables, profondeur)
+    pending = [(-n_rows, 0, element, rows, (), available_explanatory_vars, 0)]
+    order = 1
+    n_nodes = 0
+    while pending:
+        _, _, branch_element, branch_rows, row_filter, branch_vars, depth = heapq.heappop(pending)
+        stop_message = budget.stop_message(depth, n_nodes) if branch_vars else None
+        if stop_message is not None:
+            builder.set_leaf(branch_element, stop_message)
+            continue
+        # Les lignes des branches en attente forment une partition de l'échantillon : mémoire bornée par rows
+        children = list(_split_node(
+            builder, branch_element, df, branch_rows, hit_mask, branch_vars,
+            min_population_threshold, row_filter, cache_scope
+        ))
+        n_nodes += builder.is_node(branch_element)
+        for child_element, child_rows, child_filter, child_vars in children:
+            heapq.heappush(pending, (-len(child_rows), order, child_element, child_rows,
+                                     child_filter, child_vars, depth + 1))
+            order += 1
+
+def construct_tree_for_value(df: EncodedDataset, target_value: Any, target_var: str, 
+                           available_explanatory_vars: List[str], current_path: List[str] = None,
+                           min_population_threshold: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Construit récursivement l'arbre de décision pour une valeur cible donnée.
+    Arbre imbriqué historique (chemins préfixés par current_path) ; df peut encore être un
+    DataFrame pandas. Les constructions internes utilisent construct_flat_tree_for_value.
+    """
+    if isinstance(df, pd.DataFrame):
+        df = encode_dataframe(df)
+    tree = construct_flat_tree_for_value(df, target_value, target_var, available_explanatory_vars,
+                                         min_population_threshold)
+    return tree.to_nested(current_path)
+
+def construct_flat_tree_for_value(df: EncodedDataset, target_value: Any, target_var: str, 
+                                  available_explanatory_vars: List[str],
+                                  min_population_threshold: Optional[int] = None,
+                                  rows: Optional[np.ndarray] = None,
+                                  cache_scope: Optional[Hashable] = None,
+                                  budget: Optional[TreeBudget] = None) -> FlatTree:
+    """
+    Construit l'arbre de décision (à plat, voir services.flat_tree) pour une valeur cible donnée.
+    rows restreint la construction à un sous-ensemble de lignes (indices dans df).
+    Avec cache_scope, les tables de contingence sont mémorisées entre les requêtes.
+    Avec un budget limité, la construction se fait par effectif décroissant et peut être tronquée.
+    """
+    # Masque des cas cibles calculé une seule fois pour tout le jeu de données
+    hit_mask = scoring.target_hit_mask(df[target_var], target_value)
     
-    return tree_node
+    builder = FlatTreeBuilder()
+    if budget is not None and budget.limited:
+        _construct_subtree_best_first(
+            builder, builder.ROOT, df, rows, hit_mask, available_explanatory_vars,
+            min_population_threshold, budget, cache_scope
+        )
+    else:
+        _construct_subtree(
+            builder, builder.ROOT, df, rows, hit_mask, available_explanatory_vars,
+            min_population_threshold, cache_scope=cache_scope
+        )
+    return builder.finish()
+
+def _retarget_subtree(builder: FlatTreeBuilder, element: int, df: EncodedDataset,
+                      tree: FlatTree, source: int, hit_mask_factory,
+                      rows: Optional[np.ndarray], available_explanatory_vars: List[str],
+                      min_population_threshold: Optional[int], row_filter: Tuple[Tuple[str, int], ...],
+                      cache_scope: Optional[Hashable]):
+    # Recopie dans builder (en element) le sous-arbre source de tree, adapté au nouveau seuil
+    if not tree.is_node(source):
+        message = tree.leaf_message(source)
+        if message is not None:
+            builder.set_leaf(element, message)
+        return
+    best_var = tree.variables[tree.variable[source]]
+    builder.set_node(element, best_var, float(tree.variance[source]))
+    branches = [
+        (child, builder.add_branch(element, tree.values[tree.value[child]], int(tree.count[child]),
+                                   int(tree.total[child]), float(tree.percentage[child]), int(tree.code[child])))
+        for child in tree.children(source).tolist()
+    ]
+    remaining_vars = [var for var in available_explanatory_vars if var != best_var]
+    if not remaining_vars:
+        return
+    
+    for child, branch_element in branches:
+        n_rows = int(tree.total[child])
+        # Code de la valeur gardé dans l'arbre : deux valeurs de même texte (1 et "1") restent distinctes
+        branch_filter = row_filter + ((best_var, int(tree.code[child])),)
+        if min_population_threshold and min_population_threshold > 0 and n_rows < min_population_threshold:
+            # Élagage : branche désormais sous le seuil
+            builder.set_leaf(branch_element, _threshold_stop_message(n_rows, min_population_threshold))
+        elif (tree.is_node(child) or tree.leaf_message(child) is not None) and not _is_threshold_stop_leaf(tree, child):
+            _retarget_subtree(
+                builder, branch_element, df, tree, child, hit_mask_factory, rows, remaining_vars,
+                min_population_threshold, branch_filter, cache_scope
+            )
+        else:
+            # Branche arrêtée par l'ancien seuil : seule partie à construire
+            _construct_subtree(
+                builder, branch_element, df, _rows_for_filter(df, rows, branch_filter), hit_mask_factory(),
+                remaining_vars, min_population_threshold, branch_filter, cache_scope=cache_scope
+            )
+
+def retarget_tree(df: EncodedDataset, tree: FlatTree, target_value: Any, target_var: str,
+                  available_explanatory_vars: List[str], min_population_threshold: Optional[int],
+                  rows: Optional[np.ndarray] = None,
+                  cache_scope: Optional[Hashable] = None) -> FlatTree:
+    """
+    Adapte à un nouveau seuil d'effectif un arbre complet construit avec un autre seuil
+    (mêmes données, cible et variables) : le choix des variables ne dépend pas du seuil,
+    seules changent les branches arrêtées. Les branches passées sous le seuil sont
+    élaguées, celles qui l'avaient été à tort sont développées ; le reste est recopié.
+    Le résultat est identique à construct_flat_tree_for_value avec le nouveau seuil.
+    tree doit venir d'une construction (codes des branches connus, voir FlatTree.code).
+    """
+    if len(tree) > 1 and (tree.code[1:] < 0).any():
+        raise ValueError("Arbre sans codes de branches : il ne peut pas être réadapté")
+    hit_mask = []
+    
+    def hit_mask_factory() -> np.ndarray:
+        # Masque des cas cibles calculé seulement si une branche doit être développée
+        if not hit_mask:
+            hit_mask.append(scoring.target_hit_mask(df[target_var], target_value))
+        return hit_mask[0]
+    
+    builder = FlatTreeBuilder()
+    _retarget_subtree(
+        builder, builder.ROOT, df, tree, FlatTreeBuilder.ROOT, hit_mask_factory, rows,
+        available_explanatory_vars, min_population_threshold, (), cache_scope
+    )
+    return builder.finish()
+
+def _tree_truncations(tree: FlatTree) -> List[str]:
+    # Messages des feuilles posées par un budget (vide si l'arbre est complet)
+    return [message for message in tree.messages if message.startswith(TRUNCATION_PREFIX)]
+
+def tree_cache_scope(dataset_id: str, sample_filter: Hashable, target: Hashable) -> Hashable:
+    """
+    Périmètre des tables mémorisées d'un arbre : le jeu (dataset_id), le filtre de
+    l'échantillon initial et la cible, tous deux exprimés en codes.
+    """
+    return dataset_id, sample_filter, target
+
+def _convert_selected_values(selected_values: List[Any]) -> List[Any]:
+    """
+    Conversion automatique des types pour la correspondance ('true'/'false' -> booléens).
+    """
+    converted_values = []
+    for val in selected_values:
+        if isinstance(val, str):
+            if val.lower() == 'true':
+                converted_values.append(True)
+            elif val.lower() == 'false':
+                converted_values.append(False)
+            else:
+                converted_values.append(val)
+        else:
+            converted_values.append(val)
+    return converted_values
 
 async def build_decision_tree(filename: str, variables_explicatives: List[str], 
                             variables_a_expliquer: List[str], selected_data: Dict[str, Any], 
                             min_population_threshold: Optional[int] = None,
-                            treatment_mode: str = 'independent') -> Dict[str, Any]:
+                            treatment_mode: str = 'independent',
+                            parallel_workers: Optional[int] = None,
+                            subtree_min_rows: Optional[int] = None,
+                            tree_format: Optional[str] = None,
+                            max_depth: Optional[int] = None,
+                            max_nodes: Optional[int] = None,
+                            max_seconds: Optional[float] = None) -> Dict[str, Any]:
     """
     Construit l'arbre de décision complet pour toutes les variables à expliquer.
+    Avec parallel_workers > 1 (défaut : variable d'environnement TREE_PARALLEL_WORKERS),
+    les arbres indépendants (un par valeur cible) sont répartis sur un pool de processus ;
+    s'il n'y a qu'un arbre (mode "together"), ce sont ses sous-arbres d'au moins
+    subtree_min_rows lignes qui le sont.
+    Les arbres sont renvoyés imbriqués, ou à plat (tableaux parallèles, voir
+    services.flat_tree) avec tree_format="flat".
+    max_depth, max_nodes (par arbre) et max_seconds (pour la requête) bornent la construction
+    (défauts : TREE_MAX_DEPTH, TREE_MAX_NODES, TREE_MAX_SECONDS) ; un arbre interrompu est
+    renvoyé partiel, ses branches non développées marquées par une feuille [LIMITE].
+    max_nodes s'applique à chaque arbre séparément : en mode "independent", une requête à K
+    valeurs cibles peut construire jusqu'à K * max_nodes nœuds ; seul max_seconds borne la
+    requête entière.
     """
-    if filename not in uploaded_files:
-        return {"error": "Fichier non trouvé. Faites d'abord /excel/preview."}
-    
-    df = uploaded_files[filename]
+    # L'échéance court dès le début de la requête
+    budget = TreeBudget.from_request(max_depth, max_nodes, max_seconds)
+    phases = metrics.phase_timer()
+    df, error = await _get_dataset(filename)
+    if error:
+        return error
+    dataset_id = dataset_store.resolve(filename)
+    phases.lap("dataset_load")
     
     # Étape 1: Filtrer l'échantillon initial basé sur les variables restantes sélectionnées
     
     # Identifier les colonnes restantes (ni explicatives ni à expliquer)
     all_columns = variables_explicatives + variables_a_expliquer
-    remaining_columns = [col for col in df.columns if col not in all_columns]
+    remaining_columns = [col for col in df.column_names if col not in all_columns]
     
-    # Filtrer pour les variables restantes sélectionnées
-    initial_mask = pd.Series([True] * len(df), index=df.index)
+    # Filtrer pour les variables restantes sélectionnées : OU des bitsets des valeurs retenues
+    # d'une colonne, ET entre colonnes (index bitmap) ; comparaison des codes pour les colonnes
+    # non indexées (trop de valeurs distinctes)
+    bitmap_index = dataset_store.bitmap_index(dataset_id)
+    bitmap_filters = []
+    code_filters = []
+    sample_filter = []
     
     for col_name, selected_values in selected_data.items():
         if col_name in remaining_columns and selected_values:
-            # Conversion automatique des types pour la correspondance
-            converted_values = []
-            for val in selected_values:
-                if isinstance(val, str):
-                    if val.lower() == 'true':
-                        converted_values.append(True)
-                    elif val.lower() == 'false':
-                        converted_values.append(False)
-                    else:
-                        converted_values.append(val)
-                else:
-                    converted_values.append(val)
-            
-            col_mask = df[col_name].isin(converted_values)
-            initial_mask = initial_mask & col_mask
+            column = df[col_name]
+            col_codes = column.isin_codes(_convert_selected_values(selected_values))
+            if col_name in bitmap_index:
+                bitmap_filters.append((col_name, col_codes))
+            else:
+                code_filters.append((column, col_codes))
+            sample_filter.append((col_name, tuple(col_codes.tolist())))
+    sample_filter = frozenset(sample_filter)
+    
+    # L'échantillon filtré est représenté par les indices de ses lignes (pas de copie des données)
+    selected_bits = bitmap_index.select(bitmap_filters)
+    if code_filters:
+        initial_mask = np.ones(len(df), dtype=bool) if selected_bits is None else bitmap_index.to_mask(selected_bits)
+        for column, col_codes in code_filters:
+            initial_mask &= column.mask_for_codes(col_codes)
+        sample_rows = np.flatnonzero(initial_mask)
+    elif selected_bits is not None:
+        sample_rows = bitmap_index.to_rows(selected_bits)
+    else:
+        sample_rows = np.arange(len(df))
     
-    filtered_df = df[initial_mask].copy()
+    phases.lap("sample_filter")
     
     # Analyser l'impact du filtrage sur les variables explicatives
-    filtering_analysis = analyze_sample_filtering_impact(df, filtered_df, variables_explicatives)
+    filtering_analysis = analyze_sample_filtering_impact(df, sample_rows, variables_explicatives)
+    phases.lap("filtering_analysis")
     
     # Étape 2: Construire l'arbre selon le mode de traitement
     
     decision_trees = {}
+    truncations = []
+    
+    def tree_output(tree: FlatTree) -> Dict[str, Any]:
+        # Les arbres restent à plat en interne (et dans tree_cache) jusqu'à la conversion finale
+        truncations.extend(_tree_truncations(tree))
+        return tree.to_compact() if tree_format == FLAT_FORMAT else tree.to_nested()
+    
+    def cached_tree(tree_key: Hashable) -> Optional[Tuple[FlatTree, int]]:
+        # Sous budget, l'arbre est reconstruit par effectif décroissant (tables de contingence en cache)
+        return None if budget.limited else tree_cache.get(tree_key)
+    
+    def cache_tree(tree_key: Hashable, tree: FlatTree):
+        # Seuls les arbres complets peuvent servir de base à un changement de seuil
+        if not _tree_truncations(tree):
+            tree_cache.put(tree_key, tree, min_population_threshold)
+    
+    def selected_target_codes(target_var: str) -> Optional[np.ndarray]:
+        column = df[target_var]
+        if target_var in selected_data and selected_data[target_var]:
+            return column.isin_codes(selected_data[target_var])
+        return None
+    
+    def selected_target_mask(target_var: str) -> np.ndarray:
+        column = df[target_var]
+        codes = selected_target_codes(target_var)
+        if codes is not None:
+            return column.mask_for_codes(codes)
+        return column.codes >= 0
     
     if treatment_mode == 'together':
         # Mode ensemble : traiter toutes les variables ensemble
         # Créer une variable combinée qui prend la valeur True si l'une des variables cibles est présente
         
         # Créer un masque pour les lignes qui ont l'une des valeurs cibles
-        combined_mask = pd.Series([False] * len(filtered_df), index=filtered_df.index)
+        combined_mask = np.zeros(len(df), dtype=bool)
         
-        # Si toutes les modalités sont dans la même variable
-        if len(variables_a_expliquer) == 1:
-            target_var = variables_a_expliquer[0]
-            if target_var in selected_data and selected_data[target_var]:
-                # Utiliser toutes les modalités sélectionnées de cette variable
-                combined_mask = filtered_df[target_var].isin(selected_data[target_var])
-            else:
-                combined_mask = filtered_df[target_var].notna()
-        else:
-            # Si les modalités sont dans plusieurs variables différentes
-            for target_var in variables_a_expliquer:
-                if target_var in selected_data and selected_data[target_var]:
-                    var_mask = filtered_df[target_var].isin(selected_data[target_var])
-                else:
-                    var_mask = filtered_df[target_var].notna()
-                combined_mask = combined_mask | var_mask
+        # Si les modalités sont dans une ou plusieurs variables différentes
+        for target_var in variables_a_expliquer:
+            combined_mask |= selected_target_mask(target_var)
         
-        # Créer un DataFrame avec une variable combinée
-        combined_df = filtered_df.copy()
-        combined_df['_combined_target'] = combined_mask
+        # Ajouter la variable combinée au jeu encodé
+        combined_df = df.with_column(
+            EncodedColumn.from_series(pd.Series(combined_mask), '_combined_target')
+        )
+        
+        # Cible combinée identifiée par les codes retenus de chaque variable (None = toutes)
+        combined_target = ("combined", tuple(
+            (target_var, None if codes is None else tuple(codes.tolist()))
+            for target_var, codes in ((var, selected_target_codes(var)) for var in variables_a_expliquer)
+        ))
+        cache_scope = tree_cache_scope(dataset_id, sample_filter, combined_target)
+        tree_key = tree_cache.key(cache_scope, variables_explicatives)
+        cached = cached_tree(tree_key)
         
         # Construire l'arbre pour la variable combinée
         target_trees = {}
-        tree = construct_tree_for_value(
-            combined_df, True, '_combined_target', 
-            variables_explicatives.copy(), [],
-            min_population_threshold
-        )
+        n_workers = parallel.resolve_worker_count(parallel_workers)
+        if cached is not None:
+            # Même configuration déjà construite : seul le seuil change
+            tree = retarget_tree(
+                combined_df, cached[0], True, '_combined_target',
+                variables_explicatives, min_population_threshold, sample_rows, cache_scope
+            )
+        elif n_workers > 1 and not budget.limited:
+            tree = await parallel.build_tree_with_subtree_pool(
+                combined_df, sample_rows, '_combined_target', True,
+                variables_explicatives, min_population_threshold,
+                n_workers, subtree_min_rows, cache_scope
+            )
+        else:
+            tree = construct_flat_tree_for_value(
+                combined_df, True, '_combined_target', 
+                variables_explicatives.copy(),
+                min_population_threshold, sample_rows, cache_scope=cache_scope, budget=budget
+            )
+        cache_tree(tree_key, tree)
         target_trees['Combined'] = tree
         
         # Créer un nom descriptif avec les noms des variables
@@ -518,6 +864,7 @@ async def build_decision_tree(filename: str, variables_explicatives: List[str],
         
     else:
         # Mode indépendant : traiter chaque variable séparément (comportement original)
+        tasks = []
         for target_var in variables_a_expliquer:
             # IMPORTANT: Utiliser seulement les valeurs SÉLECTIONNÉES, pas toutes les valeurs uniques
             if target_var in selected_data and selected_data[target_var]:
@@ -525,30 +872,82 @@ async def build_decision_tree(filename: str, variables_explicatives: List[str],
                 target_values = selected_data[target_var]
             else:
                 # Fallback: utiliser toutes les valeurs uniques si aucune sélection
-                target_values = filtered_df[target_var].dropna().unique()
+                target_column = df[target_var]
+                target_values = target_column.categories[target_column.present_codes(sample_rows)]
             
-            target_trees = {}
-            
-            for target_value in target_values:
-                # Construire l'arbre pour cette valeur
-                tree = construct_tree_for_value(
-                    filtered_df, target_value, target_var, 
-                    variables_explicatives.copy(), [],
-                    min_population_threshold
+            tasks.extend((target_var, target_value) for target_value in target_values)
+        
+        # Cible identifiée par les codes égaux à la valeur cible
+        cache_scopes = [
+            tree_cache_scope(dataset_id, sample_filter,
+                             (target_var, tuple(df[target_var].equal_codes(target_value).tolist())))
+            for target_var, target_value in tasks
+        ]
+        
+        # Arbres déjà construits pour la même configuration : seul le seuil change
+        tree_keys = [tree_cache.key(cache_scope, variables_explicatives) for cache_scope in cache_scopes]
+        trees = [None] * len(tasks)
+        for i, tree_key in enumerate(tree_keys):
+            cached = cached_tree(tree_key)
+            if cached is not None:
+                target_var, target_value = tasks[i]
+                trees[i] = retarget_tree(
+                    df, cached[0], target_value, target_var,
+                    variables_explicatives, min_population_threshold, sample_rows, cache_scopes[i]
                 )
-                
-                target_trees[str(target_value)] = tree
-            
-            decision_trees[target_var] = target_trees
+        missing = [i for i, tree in enumerate(trees) if tree is None]
+        
+        # Les arbres sont indépendants : les répartir sur un pool de processus si demandé
+        n_workers = parallel.resolve_worker_count(parallel_workers)
+        if n_workers > 1 and len(missing) > 1:
+            built = await parallel.build_trees_in_pool(
+                df, sample_rows, [tasks[i] for i in missing], variables_explicatives,
+                min_population_threshold, n_workers, [cache_scopes[i] for i in missing], budget
+            )
+        elif n_workers > 1 and missing and not budget.limited:
+            # Un seul arbre : paralléliser ses sous-arbres
+            target_var, target_value = tasks[missing[0]]
+            built = [await parallel.build_tree_with_subtree_pool(
+                df, sample_rows, target_var, target_value,
+                variables_explicatives, min_population_threshold,
+                n_workers, subtree_min_rows, cache_scopes[missing[0]]
+            )]
+        else:
+            built = [
+                construct_flat_tree_for_value(
+                    df, tasks[i][1], tasks[i][0],
+                    variables_explicatives.copy(),
+                    min_population_threshold, sample_rows, cache_scope=cache_scopes[i], budget=budget
+                )
+                for i in missing
+            ]
+        for i, tree in zip(missing, built):
+            trees[i] = tree
+        for tree_key, tree in zip(tree_keys, trees):
+            cache_tree(tree_key, tree)
+        
+        for target_var in variables_a_expliquer:
+            decision_trees[target_var] = {}
+        for (target_var, target_value), tree in zip(tasks, trees):
+            decision_trees[target_var][str(target_value)] = tree
+    phases.lap("tree_construction")
+    
+    # Conversion des arbres pour la réponse (imbriqués, ou à plat avec tree_format="flat")
+    decision_trees = {
+        target_var: {target_value: tree_output(tree) for target_value, tree in target_trees.items()}
+        for target_var, target_trees in decision_trees.items()
+    }
+    phases.lap("tree_serialization")
     
     return {
         "filename": filename,
         "variables_explicatives": variables_explicatives,
         "variables_a_expliquer": variables_a_expliquer,
-        "filtered_sample_size": len(filtered_df),
+        "filtered_sample_size": len(sample_rows),
         "original_sample_size": len(df),
         "decision_trees": decision_trees,
-        "treatment_mode": treatment_mode
+        "treatment_mode": treatment_mode,
+        "budget": budget.to_dict(truncations)
     }
 
 def create_tree_diagram(decision_trees: Dict[str, Any]) -> str:
@@ -691,186 +1090,77 @@ def create_tree_diagram(decision_trees: Dict[str, Any]) -> str:
 
         return ""
 
+def render_tree_pdf(decision_trees: Dict[str, Any], filename: str) -> bytes:
+    """
+    Génère le PDF des arbres de décision (tableaux compacts écrits page par page, voir services.pdf_report).
+    """
+    with metrics.span("pdf_rendering"):
+        from services import pdf_report  # reportlab chargé au premier rendu
+
+        return pdf_report.render_tree_report(nested_trees(decision_trees), filename)
+
 def generate_tree_pdf(decision_trees: Dict[str, Any], filename: str) -> str:
     """
-    Génère un PDF de l'arbre de décision avec structure arborescente claire et branches gauche/droite.
+    PDF de l'arbre encodé en base64 ("" en cas d'échec du rendu).
     """
     try:
-        # Créer un buffer en mémoire pour le PDF
-        buffer = io.BytesIO()
-        
-        # Créer le document PDF
-        doc = SimpleDocTemplate(buffer, pagesize=A4)
-        story = []
-        
-        # Styles
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=20,
-            spaceAfter=25,
-            alignment=TA_CENTER,
-            textColor=colors.darkblue
-        )
-        
-        subtitle_style = ParagraphStyle(
-            'CustomSubtitle',
-            parent=styles['Heading2'],
-            fontSize=16,
-            spaceAfter=20,
-            textColor=colors.darkgreen
-        )
-        
-        node_style = ParagraphStyle(
-            'NodeStyle',
-            parent=styles['Normal'],
-            fontSize=12,
-            spaceAfter=8,
-            textColor=colors.darkblue,
-            leftIndent=20
-        )
-        
-        branch_style = ParagraphStyle(
-            'BranchStyle',
-            parent=styles['Normal'],
-            fontSize=11,
-            spaceAfter=6,
-            textColor=colors.purple,
-            leftIndent=40
-        )
-        
-        leaf_style = ParagraphStyle(
-            'LeafStyle',
-            parent=styles['Normal'],
-            fontSize=10,
-            spaceAfter=4,
-            textColor=colors.darkgreen,
-            leftIndent=60
-        )
-        
-        # Titre principal
-        story.append(Paragraph("🌳 ARBRE DE DÉCISION - ANALYSE STATISTIQUE", title_style))
-        story.append(Spacer(1, 25))
-        
-        # Informations du fichier
-        story.append(Paragraph(f"📁 <b>Fichier:</b> {filename}", styles['Normal']))
-        story.append(Spacer(1, 15))
-        
-        # Note: Les diagrammes sont maintenant générés côté frontend avec Chart.js
-        story.append(Paragraph("<b>📊 Note:</b> Les diagrammes visuels sont générés côté client avec Chart.js", styles['Normal']))
-        story.append(Spacer(1, 10))
-        
-        # Fonction récursive pour afficher l'arbre avec structure claire
-        def add_tree_to_story(node, level=0, path=""):
-            try:
-                if node.get("type") == "leaf":
-                    # Feuille de l'arbre
-                    story.append(Paragraph(f"🍃 {node.get('message', 'Fin de branche')}", leaf_style))
-                else:
-                    # Nœud principal avec variable explicative
-                    indent = "&nbsp;" * (level * 8)
-                    story.append(Paragraph(
-                        f"{indent}🌿 <b>{node['variable']}</b> (Écart-type: {node['variance']})", 
-                        node_style
-                    ))
-                    
-                    # Branches avec structure gauche/droite
-                    branches = list(node['branches'].items())
-                    mid_point = len(branches) // 2
-                    
-                    # Branches gauches
-                    if mid_point > 0:
-                        story.append(Paragraph(f"{indent}&nbsp;&nbsp;├─ <b>BRANCHES GAUCHES:</b>", branch_style))
-                        for i, (branch_value, branch_data) in enumerate(branches[:mid_point]):
-                            story.append(Paragraph(
-                                f"{indent}&nbsp;&nbsp;&nbsp;&nbsp;├─ <b>{branch_value}</b>: {branch_data['count']} ({branch_data['percentage']}%)", 
-                                branch_style
-                            ))
-                            
-                            # Sous-arbre récursif
-                            if branch_data.get('subtree'):
-                                add_tree_to_story(branch_data['subtree'], level + 1, f"{path} → {branch_value}")
-                    
-                    # Branches droites
-                    if len(branches) > mid_point:
-                        story.append(Paragraph(f"{indent}&nbsp;&nbsp;├─ <b>BRANCHES DROITES:</b>", branch_style))
-                        for i, (branch_value, branch_data) in enumerate(branches[mid_point:]):
-                            story.append(Paragraph(
-                                f"{indent}&nbsp;&nbsp;&nbsp;&nbsp;├─ <b>{branch_value}</b>: {branch_data['count']} ({branch_data['percentage']}%)", 
-                                branch_style
-                            ))
-                            
-                            # Sous-arbre récursif
-                            if branch_data.get('subtree'):
-                                add_tree_to_story(branch_data['subtree'], level + 1, f"{path} → {branch_value}")
-                    
-                    story.append(Spacer(1, 10))
-            except Exception as e:
-                story.append(Paragraph(f"❌ Erreur lors de l'affichage du nœud", styles['Normal']))
-        
-        # Pour chaque variable à expliquer
-        for target_var, target_trees in decision_trees.items():
-            try:
-                story.append(Paragraph(f"🎯 <b>VARIABLE À EXPLIQUER: {target_var}</b>", subtitle_style))
-                story.append(Spacer(1, 15))
-                
-                # Pour chaque valeur de cette variable
-                for target_value, tree in target_trees.items():
-                    try:
-                        story.append(Paragraph(f"📊 <b>VALEUR CIBLE: {target_value}</b>", styles['Heading3']))
-                        story.append(Spacer(1, 10))
-                        
-                        # Construire l'arbre récursivement
-                        add_tree_to_story(tree, 0, target_value)
-                        story.append(Spacer(1, 20))
-                    except Exception as e:
-                        story.append(Paragraph(f"❌ Erreur lors du traitement de la valeur {target_value}", styles['Normal']))
-                
-                story.append(Spacer(1, 25))
-            except Exception as e:
-                story.append(Paragraph(f"❌ Erreur lors du traitement de la variable {target_var}", styles['Normal']))
-        
-        # Construire le PDF
-        doc.build(story)
-        
-        # Obtenir le contenu du buffer
-        pdf_content = buffer.getvalue()
-        buffer.close()
-        
-        # Encoder en base64
-        pdf_base64 = base64.b64encode(pdf_content).decode('utf-8')
-        
-        return pdf_base64
-        
+        return base64.b64encode(render_tree_pdf(decision_trees, filename)).decode('utf-8')
     except Exception as e:
         return ""
 
 async def build_decision_tree_with_pdf(filename: str, variables_explicatives: List[str], 
                                      variables_a_expliquer: List[str], selected_data: Dict[str, Any], 
                                      min_population_threshold: Optional[int] = None,
-                                     treatment_mode: str = 'independent') -> Dict[str, Any]:
+                                     treatment_mode: str = 'independent',
+                                     parallel_workers: Optional[int] = None,
+                                     subtree_min_rows: Optional[int] = None,
+                                     include_pdf: bool = False,
+                                     tree_format: Optional[str] = None,
+                                     max_depth: Optional[int] = None,
+                                     max_nodes: Optional[int] = None,
+                                     max_seconds: Optional[float] = None) -> Dict[str, Any]:
     """
-    Construit l'arbre de décision et génère le PDF correspondant.
+    Construit l'arbre de décision et enregistre l'arbre pour son PDF, rendu à la demande
+    par GET /excel/pdf/{pdf_id}. include_pdf rend aussi le PDF tout de suite et
+    l'ajoute en base64 à la réponse (ancien comportement).
     """
     # Construire l'arbre
-    tree_result = await build_decision_tree(filename, variables_explicatives, variables_a_expliquer, selected_data, min_population_threshold, treatment_mode)
+    tree_result = await build_decision_tree(filename, variables_explicatives, variables_a_expliquer, selected_data, min_population_threshold, treatment_mode, parallel_workers, subtree_min_rows, tree_format, max_depth, max_nodes, max_seconds)
     
     if "error" in tree_result:
         return tree_result
     
-    # Générer le PDF
-    pdf_base64 = generate_tree_pdf(tree_result["decision_trees"], filename)
+    # Le PDF n'est rendu qu'au premier téléchargement, puis gardé en cache sous l'empreinte de l'arbre
+    with metrics.span("pdf_register"):
+        pdf_id = pdf_cache.register(tree_result["decision_trees"], filename)
+    tree_result["pdf_id"] = pdf_id
+    tree_result["pdf_url"] = f"/excel/pdf/{pdf_id}"
+    tree_result["pdf_generated"] = False
     
-    if pdf_base64:
-        tree_result["pdf_base64"] = pdf_base64
-        tree_result["pdf_generated"] = True
-    else:
-        tree_result["pdf_generated"] = False
+    if include_pdf:
+        try:
+            pdf_path = pdf_cache.render_path(pdf_id, render_tree_pdf)
+            with open(pdf_path, "rb") as f:
+                tree_result["pdf_base64"] = base64.b64encode(f.read()).decode('utf-8')
+            tree_result["pdf_generated"] = True
+        except Exception as e:
+            pass
     
     return tree_result
 
-def analyze_sample_filtering_impact(df: pd.DataFrame, filtered_df: pd.DataFrame, 
+async def get_tree_pdf_path(pdf_id: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """
+    Chemin du PDF de l'arbre pdf_id, rendu s'il n'est pas encore en cache ; sinon le dictionnaire d'erreur.
+    """
+    try:
+        pdf_path = pdf_cache.render_path(pdf_id, render_tree_pdf)
+    except Exception as e:
+        return None, {"error": f"Erreur lors de la génération du PDF: {str(e)}"}
+    if pdf_path is None:
+        return None, {"error": "Arbre introuvable. Reconstruisez l'arbre de décision."}
+    return pdf_path, None
+
+def analyze_sample_filtering_impact(df: EncodedDataset, filtered_rows: np.ndarray, 
                                    variables_explicatives: List[str]) -> Dict[str, Any]:
     """
     Analyse l'impact du filtrage de l'échantillon sur les variables explicatives.
@@ -881,7 +1171,7 @@ def analyze_sample_filtering_impact(df: pd.DataFrame, filtered_df: pd.DataFrame,
     
     for var in variables_explicatives:
         original_unique = df[var].nunique()
-        filtered_unique = filtered_df[var].nunique()
+        filtered_unique = df[var].nunique(filtered_rows)
         
         if filtered_unique == 1:
             warnings.append(f"⚠️ Variable '{var}' n'a plus qu'une seule valeur unique dans l'échantillon filtré")
@@ -897,6 +1187,58 @@ def analyze_sample_filtering_impact(df: pd.DataFrame, filtered_df: pd.DataFrame,
         "warnings": warnings,
         "suggestions": suggestions,
         "original_sample_size": len(df),
-        "filtered_sample_size": len(filtered_df),
-        "reduction_percentage": round(((len(df) - len(filtered_df)) / len(df) * 100), 1)
+        "filtered_sample_size": len(filtered_rows),
+        "reduction_percentage": round(((len(df) - len(filtered_rows)) / len(df) * 100), 1)
     }
+
+# ============================================================================
+# TÂCHES DE FOND (construction d'arbre hors de la boucle d'événements)
+# ============================================================================
+
+async def submit_decision_tree_job(filename: str, variables_explicatives: List[str], 
+                                   variables_a_expliquer: List[str], selected_data: Dict[str, Any], 
+                                   min_population_threshold: Optional[int] = None,
+                                   treatment_mode: str = 'independent',
+                                   parallel_workers: Optional[int] = None,
+                                   subtree_min_rows: Optional[int] = None,
+                                   include_pdf: bool = False,
+                                   tree_format: Optional[str] = None,
+                                   max_depth: Optional[int] = None,
+                                   max_nodes: Optional[int] = None,
+                                   max_seconds: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Lance la construction de l'arbre en tâche de fond et renvoie immédiatement son identifiant.
+    """
+    dataset_id = dataset_store.resolve(filename)
+    if ingestions.get(dataset_id) is None and dataset_store.get(dataset_id) is None:
+        return {"error": "Fichier non trouvé. Faites d'abord /excel/preview."}
+    
+    job = jobs.job_manager.submit("decision-tree", lambda: build_decision_tree_with_pdf(
+        filename, variables_explicatives, variables_a_expliquer, selected_data,
+        min_population_threshold, treatment_mode, parallel_workers, subtree_min_rows, include_pdf,
+        tree_format, max_depth, max_nodes, max_seconds
+    ))
+    return job.to_status()
+
+async def get_stats_cache_stats() -> Dict[str, Any]:
+    # Compteurs du cache des tables de contingence (processus courant)
+    return stats_cache.stats()
+
+async def get_job_status(job_id: str) -> Dict[str, Any]:
+    job = jobs.job_manager.get(job_id)
+    if job is None:
+        return {"error": "Tâche introuvable ou expirée."}
+    return job.to_status()
+
+async def get_job_result(job_id: str) -> Dict[str, Any]:
+    job = jobs.job_manager.get(job_id)
+    if job is None:
+        return {"error": "Tâche introuvable ou expirée."}
+    if job.status == "error":
+        if isinstance(job.result, dict):
+            return job.result
+        return {"error": f"Erreur lors de la construction de l'arbre: {job.error}"}
+    if job.status != "done":
+        # Résultat pas encore disponible : renvoyer l'état de la tâche
+        return job.to_status()
+    return job.result
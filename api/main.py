@@ -1,12 +1,36 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from routers import excel_router
+from services.metrics import MetricsMiddleware, metrics
+from services.warmup import WARMUP_ON_STARTUP, warmup
 import os
+import sys
+
+# Démarrage léger : pandas, numpy, le contrôleur, reportlab et SQLAlchemy ne sont pas importés
+# ici. /health répond dès le lancement ; le préchauffage (services.warmup) charge le reste.
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Démarrage : imports lourds et premiers appels en arrière-plan, pendant que /health répond déjà
+    if WARMUP_ON_STARTUP:
+        warmup.start()
+    yield
+    # Arrêt : pools de processus de construction des arbres (s'ils ont été chargés)
+    if "services.parallel" in sys.modules:
+        sys.modules["services.parallel"].shutdown_pools()
+    # puis connexions du pool de la base
+    if "database" in sys.modules:
+        sys.modules["database"].dispose_engine()
+
 
 app = FastAPI(
     title="API Analyse Statistique",
     description="API pour l'analyse de fichiers Excel",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configuration CORS (pilotée par variable d'environnement)
@@ -23,8 +47,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+# Durée des requêtes par route et en-tête Server-Timing (phases et compteurs de la requête)
+app.add_middleware(MetricsMiddleware)
+
+def _loaded_stats(module_name: str, attribute: str):
+    # Statistiques d'un service déjà importé (jauge absente de l'export avant son import)
+    return getattr(sys.modules[module_name], attribute).stats()
+
+
+# Jauges lues à chaque export de /metrics
+metrics.gauge("dataset_store_loaded_bytes", "Octets des jeux encodés chargés en mémoire",
+              lambda: _loaded_stats("services.dataset_store", "dataset_store")["loaded_bytes"])
+metrics.gauge("dataset_store_budget_bytes", "Budget mémoire des jeux encodés",
+              lambda: _loaded_stats("services.dataset_store", "dataset_store")["budget_bytes"])
+metrics.gauge("dataset_store_loaded_datasets", "Jeux encodés chargés en mémoire",
+              lambda: _loaded_stats("services.dataset_store", "dataset_store")["loaded_datasets"])
+metrics.gauge("stats_cache_bytes", "Octets du cache des tables de contingence",
+              lambda: _loaded_stats("services.stats_cache", "stats_cache")["bytes"])
+
 
 @app.get("/")
 async def root():
@@ -34,5 +77,16 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    # Fin du préchauffage (503 tant qu'il est en cours) ; le lance s'il n'a pas démarré
+    warmup.start()
+    return JSONResponse(warmup.status(), status_code=200 if warmup.ready else 503)
+
+@app.get("/metrics")
+async def get_metrics():
+    # Format texte de Prometheus
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Inclusion du routeur Excel
 app.include_router(excel_router.router)
@@ -1,11 +1,43 @@
-from sqlalchemy import Column, Integer, String, TIMESTAMP, func
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import Column, ForeignKey, Integer, LargeBinary, String, Text, TIMESTAMP, func
 from database import Base
 
+
 class File(Base):
-    __tablename__ = "files"
+    """
+    Jeu de données importé, adressé par dataset_id (empreinte SHA-256 du classeur).
+    Les colonnes sont dans dataset_columns.
+    """
+    __tablename__ = "dataset_files"
 
     id = Column(Integer, primary_key=True, index=True)
-    filename = Column(String(255), nullable=False)
+    dataset_id = Column(String(64), nullable=False, unique=True, index=True)
+    filename = Column(String(255), nullable=False, index=True)
     uploaded_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
-    data = Column(JSONB)
+    n_rows = Column(Integer, nullable=False)
+
+
+class FileColumn(Base):
+    """
+    Colonne encodée d'un jeu : codes entiers et valeurs distinctes, chacun en un bloc .npy compressé.
+    """
+    __tablename__ = "dataset_columns"
+
+    id = Column(Integer, primary_key=True)
+    file_id = Column(Integer, ForeignKey("dataset_files.id", ondelete="CASCADE"), nullable=False, index=True)
+    position = Column(Integer, nullable=False)
+    name = Column(Text, nullable=False)  # nom JSON (les en-têtes numériques restent des nombres)
+    dtype = Column(String(64), nullable=False)
+    codes = Column(LargeBinary, nullable=False)
+    categories = Column(LargeBinary, nullable=False)
+
+
+class DecisionTree(Base):
+    """
+    Arbres enregistrés pour le rendu PDF (contenu JSON compressé), adressés par pdf_id.
+    """
+    __tablename__ = "decision_trees"
+
+    tree_id = Column(String(64), primary_key=True)
+    filename = Column(String(255), nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    content = Column(LargeBinary, nullable=False)
@@ -1,32 +1,52 @@
-from fastapi import APIRouter, UploadFile, Form
-from typing import Optional, Dict, Any
-from controllers import excel_controller
+from fastapi import APIRouter, HTTPException, UploadFile, Form
+from fastapi.responses import FileResponse, StreamingResponse
+from typing import Optional, List
+from services.jobs import run_blocking, run_build
+from services.warmup import LazyModule
+
+# Contrôleur et sérialisation (pandas, numpy...) importés à la première requête, ou par le préchauffage
+excel_controller = LazyModule("controllers.excel_controller")
+serialization = LazyModule("services.serialization")
 
 router = APIRouter(prefix="/excel", tags=["Excel"])
 
+def _split_columns(value: str) -> List[str]:
+    # Les listes de colonnes arrivent comme "col1,col2,col3"
+    if value:
+        return [col.strip() for col in value.split(',')]
+    return []
+
 @router.post("/preview")
 async def preview_excel(file: UploadFile):
-    return await excel_controller.preview_excel(file)
+    """
+    Importe un classeur et renvoie son aperçu et son dataset_id (empreinte du contenu).
+    Les autres routes acceptent dans le champ filename soit ce dataset_id, soit le nom du
+    fichier. Le nom ne suffit que tant qu'un seul contenu a été importé sous ce nom : si deux
+    classeurs différents portent le même nom (deux clients par exemple), une requête adressée
+    par ce nom est refusée (409) et seul le dataset_id désigne chacun d'eux.
+    """
+    # Lecture du classeur hors de la boucle d'événements
+    return await run_blocking(lambda: excel_controller.preview_excel(file))
+
+@router.get("/preview/status")
+async def preview_status(filename: str):
+    # Avancement de la lecture en arrière-plan d'un classeur .xlsx (jeu éventuellement relu du disque ou de la base)
+    return await run_blocking(lambda: excel_controller.get_preview_status(filename))
 
 @router.post("/select-columns")
 async def select_columns(
     filename: str = Form(...),
     variables_explicatives: str = Form(...),  # Changé en str pour gérer la séparation
     variable_a_expliquer: str = Form(...),  # Peut contenir plusieurs variables séparées par des virgules
-    selected_data: Optional[str] = Form(None)  # Données sélectionnées par l'utilisateur (JSON string)
+    selected_data: Optional[str] = Form(None),  # Données sélectionnées par l'utilisateur (JSON string)
+    top_values: Optional[int] = Form(None)  # Limite les valeurs renvoyées par colonne aux plus fréquentes
 ):
     # Séparer les variables explicatives (elles arrivent comme "col1,col2,col3")
-    if variables_explicatives:
-        variables_explicatives_list = [col.strip() for col in variables_explicatives.split(',')]
-    else:
-        variables_explicatives_list = []
-    
+    variables_explicatives_list = _split_columns(variables_explicatives)
+
     # Séparer les variables à expliquer (elles peuvent aussi être multiples)
-    if variable_a_expliquer:
-        variables_a_expliquer_list = [col.strip() for col in variable_a_expliquer.split(',')]
-    else:
-        variables_a_expliquer_list = []
-    
+    variables_a_expliquer_list = _split_columns(variable_a_expliquer)
+
     # Traiter selected_data si fourni
     selected_data_dict = None
     if selected_data:
@@ -35,20 +55,67 @@ async def select_columns(
             selected_data_dict = json.loads(selected_data)
         except json.JSONDecodeError:
             return {"error": "Format invalide pour selected_data"}
-    
-    return await excel_controller.select_columns(
+
+    # Résultat déjà en types natifs : sérialisé directement, sans jsonable_encoder.
+    # Calcul (et rechargement éventuel du jeu) hors de la boucle d'événements
+    return serialization.FastJSONResponse(await run_blocking(lambda: excel_controller.select_columns(
         filename,
         variables_explicatives_list,  # Passer la liste séparée
         variables_a_expliquer_list,   # Passer la liste des variables à expliquer
-        selected_data_dict  # Passer les données sélectionnées ou None
-    )
+        selected_data_dict,  # Passer les données sélectionnées ou None
+        top_values
+    )))
 
 @router.post("/get-column-values")
 async def get_column_values(
     filename: str = Form(...),
-    column_name: str = Form(...)
+    column_name: str = Form(...),
+    search: Optional[str] = Form(None),  # Préfixe des valeurs recherchées (sans tenir compte de la casse)
+    top: Optional[int] = Form(None)  # Nombre de valeurs les plus fréquentes à renvoyer
+):
+    return serialization.FastJSONResponse(await run_blocking(
+        lambda: excel_controller.get_column_unique_values(filename, column_name, search, top)
+    ))
+
+@router.post("/selected-data")
+async def get_selected_data(
+    filename: str = Form(...),
+    column_name: str = Form(...),
+    selected_values: str = Form(...),  # Valeurs retenues pour la colonne (JSON list)
+    cursor: Optional[int] = Form(None),  # next_cursor de la page précédente
+    limit: Optional[int] = Form(None)
 ):
-    return await excel_controller.get_column_unique_values(filename, column_name)
+    """
+    Valeurs ligne par ligne d'une colonne sélectionnée, page par page.
+    """
+    import json
+    try:
+        selected_values_list = json.loads(selected_values)
+    except json.JSONDecodeError:
+        return {"error": "Format invalide pour selected_values"}
+
+    return serialization.FastJSONResponse(await run_blocking(lambda: excel_controller.get_selected_data_page(
+        filename, column_name, selected_values_list, cursor, limit
+    )))
+
+@router.post("/selected-data/stream")
+async def stream_selected_data(
+    filename: str = Form(...),
+    selected_data: str = Form(...)  # Données sélectionnées (JSON string), comme pour /select-columns
+):
+    """
+    Valeurs ligne par ligne de toutes les colonnes sélectionnées, en NDJSON.
+    """
+    import json
+    try:
+        selected_data_dict = json.loads(selected_data)
+    except json.JSONDecodeError:
+        return {"error": "Format invalide pour selected_data"}
+
+    lines, error = await run_blocking(lambda: excel_controller.stream_selected_data(filename, selected_data_dict))
+    if error:
+        return error
+    return StreamingResponse(lines, media_type="application/x-ndjson")
 
 @router.post("/build-decision-tree")
 async def build_decision_tree_endpoint(
@@ -57,42 +124,115 @@ async def build_decision_tree_endpoint(
     variable_a_expliquer: str = Form(...),
     selected_data: str = Form(...),
     min_population_threshold: Optional[int] = Form(None),
-    treatment_mode: Optional[str] = Form('independent')
+    treatment_mode: Optional[str] = Form('independent'),
+    parallel_workers: Optional[int] = Form(None),  # Nombre de processus de construction
+    parallel_subtree_min_rows: Optional[int] = Form(None),  # Effectif minimal d'un sous-arbre parallélisé
+    include_pdf: bool = Form(False),  # Ajouter aussi le PDF en base64 à la réponse
+    tree_format: Optional[str] = Form(None),  # "flat" : arbres à plat (tableaux parallèles) au lieu d'imbriqués
+    max_depth: Optional[int] = Form(None),  # Budgets de construction (0 = pas de limite, défauts : TREE_MAX_*)
+    max_nodes: Optional[int] = Form(None),  # Nœuds de découpage par arbre (K valeurs cibles : jusqu'à K * max_nodes)
+    max_seconds: Optional[float] = Form(None)  # Temps de calcul ; au-delà, arbres partiels marqués [LIMITE]
 ):
     """
-    Construit l'arbre de décision et génère le PDF correspondant.
+    Construit l'arbre de décision ; son PDF est servi à part par GET /excel/pdf/{pdf_id}.
+    Le calcul s'exécute hors de la boucle d'événements (les autres requêtes restent servies).
+    max_depth et max_nodes bornent chaque arbre (une valeur cible) séparément ; max_seconds
+    borne la requête entière.
     """
     try:
-        # Séparer les variables explicatives
-        if variables_explicatives:
-            variables_explicatives_list = [col.strip() for col in variables_explicatives.split(',')]
-        else:
-            variables_explicatives_list = []
-        
-        # Séparer les variables à expliquer
-        if variable_a_expliquer:
-            variables_a_expliquer_list = [col.strip() for col in variable_a_expliquer.split(',')]
-        else:
-            variables_a_expliquer_list = []
-        
         # Parser selected_data
         import json
         try:
             selected_data_dict = json.loads(selected_data)
         except json.JSONDecodeError:
             return {"error": "Format invalide pour selected_data"}
-        
+
         # Construire l'arbre de décision avec PDF
-        result = await excel_controller.build_decision_tree_with_pdf(
+        result = await run_build(lambda: excel_controller.build_decision_tree_with_pdf(
             filename,
-            variables_explicatives_list,
-            variables_a_expliquer_list,
+            _split_columns(variables_explicatives),
+            _split_columns(variable_a_expliquer),
             selected_data_dict,
             min_population_threshold,
-            treatment_mode
-        )
-        
-        return result
-        
+            treatment_mode,
+            parallel_workers,
+            parallel_subtree_min_rows,
+            include_pdf,
+            tree_format,
+            max_depth,
+            max_nodes,
+            max_seconds
+        ))
+
+        return serialization.FastJSONResponse(result)
+
+    except HTTPException:
+        # Nom de fichier ambigu (409) : renvoyé tel quel
+        raise
     except Exception as e:
         return {"error": f"Erreur lors de la construction de l'arbre: {str(e)}"}
+
+@router.post("/build-decision-tree/jobs")
+async def submit_decision_tree_job(
+    filename: str = Form(...),
+    variables_explicatives: str = Form(...),
+    variable_a_expliquer: str = Form(...),
+    selected_data: str = Form(...),
+    min_population_threshold: Optional[int] = Form(None),
+    treatment_mode: Optional[str] = Form('independent'),
+    parallel_workers: Optional[int] = Form(None),
+    parallel_subtree_min_rows: Optional[int] = Form(None),
+    include_pdf: bool = Form(False),
+    tree_format: Optional[str] = Form(None),
+    max_depth: Optional[int] = Form(None),
+    max_nodes: Optional[int] = Form(None),
+    max_seconds: Optional[float] = Form(None)
+):
+    """
+    Lance la construction de l'arbre en tâche de fond et renvoie immédiatement un job_id.
+    Suivi : GET /excel/jobs/{job_id}, résultat : GET /excel/jobs/{job_id}/result.
+    """
+    import json
+    try:
+        selected_data_dict = json.loads(selected_data)
+    except json.JSONDecodeError:
+        return {"error": "Format invalide pour selected_data"}
+
+    return await run_blocking(lambda: excel_controller.submit_decision_tree_job(
+        filename,
+        _split_columns(variables_explicatives),
+        _split_columns(variable_a_expliquer),
+        selected_data_dict,
+        min_population_threshold,
+        treatment_mode,
+        parallel_workers,
+        parallel_subtree_min_rows,
+        include_pdf,
+        tree_format,
+        max_depth,
+        max_nodes,
+        max_seconds
+    ))
+
+@router.get("/pdf/{pdf_id}")
+async def get_tree_pdf(pdf_id: str):
+    """
+    PDF de l'arbre pdf_id (renvoyé par /build-decision-tree), rendu au premier appel puis servi depuis le cache.
+    """
+    pdf_path, error = await run_blocking(lambda: excel_controller.get_tree_pdf_path(pdf_id))
+    if error:
+        return error
+    return FileResponse(pdf_path, media_type="application/pdf", filename=f"arbre_decision_{pdf_id[:12]}.pdf")
+
+@router.get("/stats-cache")
+async def get_stats_cache_stats():
+    return await excel_controller.get_stats_cache_stats()
+
+@router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    # État partagé entre workers, lu sur disque
+    return await run_blocking(lambda: excel_controller.get_job_status(job_id))
+
+@router.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    return serialization.FastJSONResponse(await run_blocking(lambda: excel_controller.get_job_result(job_id)))
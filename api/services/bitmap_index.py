@@ -0,0 +1,102 @@
+import os
+import pickle
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from services.encoding import BLOCK_ROWS, EncodedColumn, EncodedDataset
+
+# Colonnes indexées : au plus ce nombre de valeurs distinctes (un bitset de n_rows / 8 octets par valeur)
+BITMAP_INDEX_MAX_VALUES = int(os.getenv("BITMAP_INDEX_MAX_VALUES", "128"))
+
+_COLUMNS_FILE = "columns.pkl"
+
+
+def _column_bitmaps(column: EncodedColumn) -> np.ndarray:
+    """
+    Un bitset compacté (np.packbits) par code de la colonne : tableau (n_codes, ceil(n_rows / 8)).
+    Construit par blocs de lignes (BLOCK_ROWS est multiple de 8).
+    """
+    n_codes = len(column.categories)
+    bitmaps = np.zeros((n_codes, (len(column) + 7) // 8), dtype=np.uint8)
+    for start in range(0, len(column), BLOCK_ROWS):
+        codes = column.codes[start:start + BLOCK_ROWS]
+        block = np.zeros((n_codes, len(codes)), dtype=bool)
+        present = codes >= 0
+        block[codes[present], np.flatnonzero(present)] = True
+        bitmaps[:, start // 8:start // 8 + (len(codes) + 7) // 8] = np.packbits(block, axis=1)
+    return bitmaps
+
+
+class BitmapIndex:
+    """
+    Index bitmap d'un jeu : pour chaque colonne d'au plus max_values valeurs distinctes,
+    un bitset compacté par valeur. Une sélection de valeurs se résout par OU entre les
+    bitsets d'une colonne et ET entre colonnes, sur n_rows / 8 octets par opération.
+    """
+
+    def __init__(self, bitmaps: Dict[str, np.ndarray], n_rows: int):
+        self.bitmaps = bitmaps
+        self.n_rows = n_rows
+
+    @classmethod
+    def build(cls, df: EncodedDataset, max_values: int = BITMAP_INDEX_MAX_VALUES) -> "BitmapIndex":
+        return cls(
+            {name: _column_bitmaps(df[name]) for name in df.column_names
+             if len(df[name].categories) <= max_values},
+            len(df)
+        )
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        files = []
+        for i, (column_name, bitmaps) in enumerate(self.bitmaps.items()):
+            np.save(os.path.join(path, f"{i}.npy"), bitmaps)
+            files.append((column_name, f"{i}.npy"))
+        with open(os.path.join(path, _COLUMNS_FILE), "wb") as f:
+            pickle.dump({"n_rows": self.n_rows, "columns": files}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BitmapIndex"]:
+        columns_path = os.path.join(path, _COLUMNS_FILE)
+        if not os.path.isfile(columns_path):
+            return None
+        with open(columns_path, "rb") as f:
+            meta = pickle.load(f)
+        # Bitsets projetés en lecture seule, comme les codes du jeu
+        bitmaps = {
+            column_name: np.load(os.path.join(path, bitmaps_file), mmap_mode="r")
+            for column_name, bitmaps_file in meta["columns"]
+        }
+        return cls(bitmaps, meta["n_rows"])
+
+    def __contains__(self, column_name: str) -> bool:
+        return column_name in self.bitmaps
+
+    @property
+    def nbytes(self) -> int:
+        return sum(bitmaps.nbytes for bitmaps in self.bitmaps.values())
+
+    def select(self, filters: Iterable[Tuple[str, np.ndarray]]) -> Optional[np.ndarray]:
+        """
+        Bitset compacté des lignes dont, pour chaque (colonne, codes) de filters, le code
+        appartient à codes ; None si filters est vide (toutes les lignes).
+        """
+        selected = None
+        for column_name, codes in filters:
+            bitmaps = self.bitmaps[column_name]
+            if len(codes) == 0:
+                column_bits = np.zeros(bitmaps.shape[1], dtype=np.uint8)
+            else:
+                column_bits = np.bitwise_or.reduce(bitmaps[np.asarray(codes, dtype=np.intp)], axis=0)
+            if selected is None:
+                selected = np.array(column_bits, dtype=np.uint8)
+            else:
+                selected &= column_bits
+        return selected
+
+    def to_mask(self, bits: np.ndarray) -> np.ndarray:
+        return np.unpackbits(bits, count=self.n_rows).view(bool)
+
+    def to_rows(self, bits: np.ndarray) -> np.ndarray:
+        return np.flatnonzero(self.to_mask(bits))
@@ -0,0 +1,97 @@
+import bisect
+from typing import Dict, List, Any, Optional
+
+import numpy as np
+
+from services.encoding import BLOCK_ROWS, EncodedColumn, EncodedDataset
+from services.serialization import to_json_list
+
+
+def _code_frequencies(column: EncodedColumn) -> np.ndarray:
+    """
+    Effectif de chaque code (comptage par blocs, la mémoire temporaire ne dépend pas du nombre de lignes).
+    """
+    counts = np.zeros(len(column.categories), dtype=np.int64)
+    for start in range(0, len(column), BLOCK_ROWS):
+        block = column.codes[start:start + BLOCK_ROWS]
+        block = block[block >= 0].astype(np.intp)
+        if len(block):
+            counts += np.bincount(block, minlength=len(counts))
+    return counts
+
+
+class ColumnStats:
+    """
+    Valeurs distinctes d'une colonne (converties en types JSON natifs, dans l'ordre du
+    dictionnaire de la colonne), leurs effectifs et le nombre de valeurs manquantes,
+    avec deux ordres précalculés : alphabétique (recherche par préfixe) et par effectif décroissant.
+    """
+    __slots__ = ("values", "counts", "null_count", "sort_keys", "sorted_order", "frequency_order")
+
+    def __init__(self, column: EncodedColumn):
+        self.values: List[Any] = to_json_list(column.categories)
+        self.counts = _code_frequencies(column)
+        self.null_count = int(len(column) - self.counts.sum())
+        keys = [str(value).casefold() for value in self.values]
+        self.sorted_order = np.array(sorted(range(len(keys)), key=keys.__getitem__), dtype=np.intp)
+        self.sort_keys: List[str] = [keys[i] for i in self.sorted_order.tolist()]
+        # Tri stable : à effectif égal, l'ordre du dictionnaire est conservé
+        self.frequency_order = np.argsort(-self.counts, kind="stable")
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def prefix_codes(self, prefix: str) -> np.ndarray:
+        """
+        Codes des valeurs commençant par prefix (sans tenir compte de la casse), par ordre alphabétique.
+        """
+        prefix = prefix.casefold()
+        start = bisect.bisect_left(self.sort_keys, prefix)
+        end = start
+        while end < len(self.sort_keys) and self.sort_keys[end].startswith(prefix):
+            end += 1
+        return self.sorted_order[start:end]
+
+    def lookup(self, search: Optional[str] = None, top: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Valeurs distinctes et effectifs, éventuellement restreints aux valeurs commençant par
+        search et/ou aux top valeurs les plus fréquentes.
+        """
+        if search:
+            codes = self.prefix_codes(search)
+        elif top is not None:
+            codes = self.frequency_order
+        else:
+            codes = None
+        matching = len(self) if codes is None else len(codes)
+
+        if top is not None and top >= 0:
+            if search:
+                codes = codes[np.argsort(-self.counts[codes], kind="stable")]
+            codes = codes[:top]
+
+        if codes is None:
+            values, counts = self.values, self.counts.tolist()
+        else:
+            values = [self.values[code] for code in codes.tolist()]
+            counts = self.counts[codes].tolist()
+        return {"values": values, "counts": counts, "matching": matching}
+
+
+class ColumnIndex:
+    """
+    Index des valeurs de toutes les colonnes d'un jeu, construit une fois à l'enregistrement du jeu.
+    """
+
+    def __init__(self, columns: Dict[str, ColumnStats]):
+        self.columns = columns
+
+    @classmethod
+    def build(cls, df: EncodedDataset) -> "ColumnIndex":
+        return cls({name: ColumnStats(df[name]) for name in df.column_names})
+
+    def __contains__(self, column_name: str) -> bool:
+        return column_name in self.columns
+
+    def __getitem__(self, column_name: str) -> ColumnStats:
+        return self.columns[column_name]
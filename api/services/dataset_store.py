@@ -0,0 +1,350 @@
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+from fastapi import HTTPException
+
+from services.bitmap_index import BitmapIndex
+from services.column_index import ColumnIndex
+from services.encoding import EncodedColumn, EncodedDataset
+from services.persistence import persistence
+from services.shared_state import read_record, write_record
+
+# Répertoire de stockage des jeux de données encodés (un sous-répertoire par jeu)
+DATASET_STORE_DIR = os.getenv(
+    "DATASET_STORE_DIR", os.path.join(tempfile.gettempdir(), "analyseur_datasets")
+)
+
+# Budget mémoire (Mo) des jeux gardés en mémoire ; au-delà, les moins récemment utilisés sont déchargés
+DATASET_MEMORY_BUDGET_MB = int(os.getenv("DATASET_MEMORY_BUDGET_MB", "512"))
+
+_META_FILE = "meta.pkl"
+_INDEX_FILE = "index.pkl"
+_BITMAPS_DIR = "bitmaps"
+_ALIASES_DIR = "aliases"
+_INGESTIONS_DIR = "ingestions"
+
+
+class AmbiguousFilename(HTTPException):
+    """
+    Nom de fichier sous lequel plusieurs classeurs différents ont été importés : aucun n'est
+    choisi à la place du client (réponse 409), seul le dataset_id désigne l'un d'eux.
+    """
+
+    def __init__(self, filename: str):
+        super().__init__(status_code=409, detail=(
+            f"Plusieurs classeurs différents ont été importés sous le nom '{filename}'. "
+            "Utilisez le dataset_id renvoyé par /excel/preview."
+        ))
+
+
+def _dataset_dir_name(dataset_id: str) -> str:
+    # Par précaution, l'identifiant fourni par le client n'est jamais utilisé tel quel comme chemin
+    return hashlib.sha1(dataset_id.encode("utf-8")).hexdigest()
+
+
+class DatasetStore:
+    """
+    Stockage des jeux encodés, adressés par dataset_id (empreinte du fichier importé ;
+    le nom du fichier sert d'alias tant qu'un seul contenu a été importé sous ce nom).
+    Chaque jeu est écrit une seule fois sur disque
+    (un fichier .npy de codes par colonne + dictionnaires de valeurs picklés),
+    puis relu à la demande en mémoire projetée (mmap). Les jeux chargés sont
+    gardés dans un cache LRU borné à budget_bytes ; un jeu déchargé est
+    rechargé de façon transparente au prochain accès. L'index des valeurs
+    (services.column_index) et l'index bitmap du filtre d'échantillon
+    (services.bitmap_index) sont construits une seule fois, à l'écriture du jeu.
+    Tout l'état est sur disque (jeux, alias, états des lectures en cours) : les workers
+    qui partagent root_dir servent les jeux importés par n'importe lequel d'entre eux,
+    les pages projetées étant partagées par le cache du système.
+    Avec une base configurée (services.persistence), un jeu absent du disque (après un
+    redémarrage) y est recherché puis réécrit sur disque au premier accès.
+    """
+
+    def __init__(self, root_dir: str = DATASET_STORE_DIR,
+                 budget_bytes: int = DATASET_MEMORY_BUDGET_MB * 1024 * 1024):
+        self.root_dir = root_dir
+        self.budget_bytes = budget_bytes
+        self._loaded: "OrderedDict[str, EncodedDataset]" = OrderedDict()
+        self._indexes: Dict[str, ColumnIndex] = {}
+        self._bitmap_indexes: Dict[str, BitmapIndex] = {}
+        self._loaded_bytes = 0
+        self._lock = threading.RLock()
+
+    def _path(self, dataset_id: str) -> str:
+        return os.path.join(self.root_dir, _dataset_dir_name(dataset_id))
+
+    # ------------------------------------------------------------------
+    # Alias (nom de fichier -> dataset_id)
+    # ------------------------------------------------------------------
+
+    def _alias_path(self, filename: str) -> str:
+        return os.path.join(self.root_dir, _ALIASES_DIR, _dataset_dir_name(filename))
+
+    def _aliased_ids(self, filename: str) -> List[str]:
+        try:
+            with open(self._alias_path(filename), "rb") as f:
+                return list(dict.fromkeys(f.read().decode("utf-8").split()))
+        except OSError:
+            return []
+
+    def alias(self, filename: str, dataset_id: str):
+        # Sur disque : l'alias posé par un worker est vu par tous les autres. Chaque contenu
+        # importé sous ce nom y est ajouté (une ligne, écrite en une fois en mode ajout)
+        if dataset_id in self._aliased_ids(filename):
+            return
+        path = self._alias_path(filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "ab") as f:
+            f.write(f"{dataset_id}\n".encode("utf-8"))
+
+    def resolve(self, key: str) -> str:
+        """
+        dataset_id désigné par key : key lui-même, ou le seul contenu importé sous le nom key.
+        Lève AmbiguousFilename si plusieurs classeurs différents portent ce nom.
+        """
+        if key in self:
+            return key
+        dataset_ids = self._aliased_ids(key)
+        if not dataset_ids:
+            try:
+                dataset_ids = persistence.dataset_ids(key)
+            except Exception:
+                dataset_ids = []
+            for dataset_id in dataset_ids:
+                self.alias(key, dataset_id)
+        if not dataset_ids:
+            return key
+        if len(dataset_ids) > 1:
+            raise AmbiguousFilename(key)
+        return dataset_ids[0]
+
+    # ------------------------------------------------------------------
+    # États des lectures en cours (services.ingestion), partagés entre processus
+    # ------------------------------------------------------------------
+
+    def _ingestion_path(self, dataset_id: str) -> str:
+        return os.path.join(self.root_dir, _INGESTIONS_DIR, f"{_dataset_dir_name(dataset_id)}.json")
+
+    def publish_ingestion(self, dataset_id: str, status: Dict[str, Any]):
+        write_record(self._ingestion_path(dataset_id), status)
+
+    def ingestion_status(self, dataset_id: str) -> Optional[Dict[str, Any]]:
+        return read_record(self._ingestion_path(dataset_id))
+
+    def discard_ingestion(self, dataset_id: str):
+        try:
+            os.remove(self._ingestion_path(dataset_id))
+        except OSError:
+            pass
+
+    # ------------------------------------------------------------------
+    # Écriture
+    # ------------------------------------------------------------------
+
+    def put(self, dataset_id: str, df: EncodedDataset, filename: Optional[str] = None) -> EncodedDataset:
+        """
+        Persiste le jeu sous dataset_id (remplace une version précédente) et
+        renvoie sa version projetée depuis le disque.
+        """
+        os.makedirs(self.root_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=".tmp_", dir=self.root_dir)
+        try:
+            columns = []
+            for i, column_name in enumerate(df.column_names):
+                column = df[column_name]
+                codes_file = f"{i}.npy"
+                np.save(os.path.join(tmp_dir, codes_file), np.ascontiguousarray(column.codes))
+                columns.append((column_name, codes_file, column.categories, column.dtype))
+            with open(os.path.join(tmp_dir, _META_FILE), "wb") as f:
+                pickle.dump({"dataset_id": dataset_id, "filename": filename, "n_rows": len(df), "columns": columns}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            index = ColumnIndex.build(df)
+            with open(os.path.join(tmp_dir, _INDEX_FILE), "wb") as f:
+                pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+            BitmapIndex.build(df).save(os.path.join(tmp_dir, _BITMAPS_DIR))
+
+            with self._lock:
+                self._unload(dataset_id)
+                path = self._path(dataset_id)
+                if os.path.isdir(path):
+                    # Les mmaps déjà ouverts sur l'ancienne version restent valides (fichiers supprimés, pas écrasés)
+                    shutil.rmtree(path, ignore_errors=True)
+                try:
+                    os.replace(tmp_dir, path)
+                except OSError:
+                    # Même jeu écrit entre-temps par un autre worker : sa version est gardée
+                    if not os.path.isfile(os.path.join(path, _META_FILE)):
+                        raise
+                self._indexes[dataset_id] = index
+                return self._load(dataset_id)
+        finally:
+            if os.path.isdir(tmp_dir):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def delete(self, dataset_id: str):
+        with self._lock:
+            self._unload(dataset_id)
+            shutil.rmtree(self._path(dataset_id), ignore_errors=True)
+            persistence.delete_dataset(dataset_id)
+
+    def persist(self, dataset_id: str, df: EncodedDataset, filename: Optional[str] = None):
+        """
+        Enregistre le jeu en base s'il y en a une. Facultatif : une base indisponible
+        n'empêche pas l'import (le jeu reste servi depuis le disque).
+        """
+        try:
+            persistence.save_dataset(dataset_id, df, filename)
+        except Exception:
+            pass
+
+    def _rehydrate(self, dataset_id: str) -> Optional[EncodedDataset]:
+        # Jeu absent du disque : rechargé depuis la base (index reconstruits) s'il y est enregistré.
+        # Appelé hors du verrou : la lecture en base ne bloque pas les autres jeux
+        try:
+            stored = persistence.load_dataset(dataset_id)
+        except Exception:
+            return None
+        if stored is None:
+            return None
+        with self._lock:
+            if dataset_id in self._loaded or os.path.isfile(os.path.join(self._path(dataset_id), _META_FILE)):
+                # Rechargé entre-temps par une autre requête
+                return self._loaded.get(dataset_id) or self._load(dataset_id)
+        df, filename = stored
+        return self.put(dataset_id, df, filename)
+
+    # ------------------------------------------------------------------
+    # Lecture
+    # ------------------------------------------------------------------
+
+    def get(self, dataset_id: str) -> Optional[EncodedDataset]:
+        """
+        Jeu encodé enregistré sous dataset_id (rechargé depuis le disque si besoin), ou None.
+        """
+        with self._lock:
+            df = self._loaded.get(dataset_id)
+            if df is not None:
+                self._loaded.move_to_end(dataset_id)
+                return df
+            if os.path.isfile(os.path.join(self._path(dataset_id), _META_FILE)):
+                return self._load(dataset_id)
+        return self._rehydrate(dataset_id)
+
+    def column_index(self, dataset_id: str) -> Optional[ColumnIndex]:
+        """
+        Index des valeurs du jeu dataset_id (reconstruit puis enregistré s'il manque), ou None.
+        """
+        with self._lock:
+            index = self._indexes.get(dataset_id)
+            if index is not None:
+                return index
+            index_path = os.path.join(self._path(dataset_id), _INDEX_FILE)
+            if os.path.isfile(index_path):
+                with open(index_path, "rb") as f:
+                    index = pickle.load(f)
+                self._indexes[dataset_id] = index
+                return index
+        # Hors du verrou : le jeu peut devoir être rechargé depuis la base (index compris)
+        df = self.get(dataset_id)
+        if df is None:
+            return None
+        with self._lock:
+            index = self._indexes.get(dataset_id)
+            if index is None:
+                # Jeu enregistré avant l'index
+                index = ColumnIndex.build(df)
+                with open(index_path, "wb") as f:
+                    pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+                self._indexes[dataset_id] = index
+            return index
+
+    def bitmap_index(self, dataset_id: str) -> Optional[BitmapIndex]:
+        """
+        Index bitmap du jeu dataset_id (reconstruit puis enregistré s'il manque), ou None.
+        """
+        with self._lock:
+            index = self._bitmap_indexes.get(dataset_id)
+            if index is not None:
+                return index
+            bitmaps_path = os.path.join(self._path(dataset_id), _BITMAPS_DIR)
+            index = BitmapIndex.load(bitmaps_path)
+            if index is not None:
+                self._bitmap_indexes[dataset_id] = index
+                return index
+        # Hors du verrou : le jeu peut devoir être rechargé depuis la base
+        df = self.get(dataset_id)
+        if df is None:
+            return None
+        with self._lock:
+            index = self._bitmap_indexes.get(dataset_id)
+            if index is None:
+                index = BitmapIndex.load(bitmaps_path)
+            if index is None:
+                # Jeu enregistré avant l'index bitmap
+                index = BitmapIndex.build(df)
+                index.save(bitmaps_path)
+            self._bitmap_indexes[dataset_id] = index
+            return index
+
+    def __contains__(self, dataset_id: str) -> bool:
+        with self._lock:
+            return dataset_id in self._loaded or os.path.isfile(os.path.join(self._path(dataset_id), _META_FILE))
+
+    def _load(self, dataset_id: str) -> EncodedDataset:
+        path = self._path(dataset_id)
+        with open(os.path.join(path, _META_FILE), "rb") as f:
+            meta = pickle.load(f)
+        columns = {}
+        for column_name, codes_file, categories, dtype in meta["columns"]:
+            # Codes projetés en lecture seule : seules les pages lues occupent la mémoire
+            codes = np.asarray(np.load(os.path.join(path, codes_file), mmap_mode="r"))
+            columns[column_name] = EncodedColumn(column_name, codes, categories, dtype)
+        df = EncodedDataset(columns, meta["n_rows"])
+
+        self._loaded[dataset_id] = df
+        self._loaded_bytes += df.nbytes
+        self._evict(keep=dataset_id)
+        return df
+
+    # ------------------------------------------------------------------
+    # Budget mémoire
+    # ------------------------------------------------------------------
+
+    def _unload(self, dataset_id: str):
+        self._indexes.pop(dataset_id, None)
+        self._bitmap_indexes.pop(dataset_id, None)
+        df = self._loaded.pop(dataset_id, None)
+        if df is not None:
+            self._loaded_bytes -= df.nbytes
+
+    def _evict(self, keep: str):
+        # Décharger les jeux les moins récemment utilisés (jamais celui qu'on vient de charger)
+        while self._loaded_bytes > self.budget_bytes and len(self._loaded) > 1:
+            oldest = next(iter(self._loaded))
+            if oldest == keep:
+                self._loaded.move_to_end(oldest)
+                continue
+            self._unload(oldest)
+
+    @property
+    def loaded_bytes(self) -> int:
+        return self._loaded_bytes
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "root_dir": self.root_dir,
+                "budget_bytes": self.budget_bytes,
+                "loaded_bytes": self._loaded_bytes,
+                "loaded_datasets": len(self._loaded)
+            }
+
+
+dataset_store = DatasetStore()
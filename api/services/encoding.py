@@ -0,0 +1,188 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Any, Iterable, Optional
+
+
+def _smallest_code_dtype(n_categories: int):
+    """
+    Plus petit type entier signé capable de stocker les codes (-1 = valeur manquante).
+    """
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+# Taille des blocs de lignes traités d'un coup : borne les tableaux temporaires
+BLOCK_ROWS = 1 << 16
+
+
+def first_appearance(codes: np.ndarray) -> np.ndarray:
+    """
+    Codes non nuls distincts dans l'ordre de première apparition (traitement par blocs,
+    la mémoire temporaire ne dépend pas du nombre de lignes).
+    """
+    seen = []
+    known = set()
+    for start in range(0, len(codes), BLOCK_ROWS):
+        for code in pd.unique(codes[start:start + BLOCK_ROWS]).tolist():
+            if code >= 0 and code not in known:
+                known.add(code)
+                seen.append(code)
+    return np.array(seen, dtype=np.intp)
+
+
+class EncodedColumn:
+    """
+    Colonne encodée par dictionnaire : un tableau de codes entiers compacts
+    (-1 pour les valeurs manquantes) et le tableau des valeurs distinctes,
+    dans l'ordre de première apparition.
+    """
+    __slots__ = ("name", "codes", "categories", "dtype")
+
+    def __init__(self, name: str, codes: np.ndarray, categories: np.ndarray, dtype: str):
+        self.name = name
+        self.codes = codes
+        self.categories = categories
+        self.dtype = dtype
+
+    @classmethod
+    def from_series(cls, series: pd.Series, name: Optional[str] = None) -> "EncodedColumn":
+        codes, uniques = pd.factorize(series, sort=False)
+        categories = np.asarray(uniques)
+        if categories.dtype.kind not in "biufcmM":
+            categories = np.asarray(uniques, dtype=object)
+        codes = codes.astype(_smallest_code_dtype(len(categories)), copy=False)
+        return cls(series.name if name is None else name, codes, categories, str(series.dtype))
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.codes.nbytes + self.categories.nbytes)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def _category_series(self) -> pd.Series:
+        return pd.Series(self.categories, dtype=self.categories.dtype)
+
+    def equal_codes(self, value: Any) -> np.ndarray:
+        """
+        Codes des valeurs distinctes égales à value (même sémantique que series == value).
+        """
+        try:
+            mask = (self._category_series() == value).to_numpy(dtype=bool)
+        except Exception:
+            return np.empty(0, dtype=self.codes.dtype)
+        return np.flatnonzero(mask).astype(self.codes.dtype)
+
+    def isin_codes(self, values: Iterable[Any]) -> np.ndarray:
+        """
+        Codes des valeurs distinctes présentes dans values (même sémantique que series.isin).
+        """
+        try:
+            mask = self._category_series().isin(list(values)).to_numpy(dtype=bool)
+        except Exception:
+            return np.empty(0, dtype=self.codes.dtype)
+        return np.flatnonzero(mask).astype(self.codes.dtype)
+
+    def mask_for_codes(self, codes: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Masque booléen des lignes dont le code appartient à codes (comparaison entière).
+        """
+        column_codes = self.codes if rows is None else self.codes[rows]
+        if len(codes) == 0:
+            return np.zeros(len(column_codes), dtype=bool)
+        if len(codes) == 1:
+            return column_codes == codes[0]
+        return np.isin(column_codes, codes)
+
+    def present_codes(self, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Codes non nuls présents dans les lignes, dans l'ordre de première apparition.
+        """
+        return first_appearance(self.codes if rows is None else self.codes[rows])
+
+    def nunique(self, rows: Optional[np.ndarray] = None) -> int:
+        column_codes = self.codes if rows is None else self.codes[rows]
+        counts = np.bincount(column_codes[column_codes >= 0].astype(np.intp), minlength=len(self.categories))
+        return int(np.count_nonzero(counts))
+
+    def decode(self, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Reconstitue les valeurs d'origine (None, ou NaN pour une colonne flottante, si manquante).
+        """
+        column_codes = self.codes if rows is None else self.codes[rows]
+        missing = column_codes < 0
+        if len(self.categories) == 0:
+            values = np.empty(len(column_codes), dtype=object)
+        else:
+            values = self.categories[np.where(missing, 0, column_codes)]
+        if missing.any():
+            if values.dtype.kind == "f":
+                values = values.copy()
+                values[missing] = np.nan
+            else:
+                values = values.astype(object)
+                values[missing] = None
+        return values
+
+    def to_series(self, rows: Optional[np.ndarray] = None) -> pd.Series:
+        values = self.decode(rows)
+        return pd.Series(values, dtype=values.dtype, name=self.name)
+
+
+class EncodedDataset:
+    """
+    Jeu de données encodé colonne par colonne (voir EncodedColumn).
+    """
+
+    def __init__(self, columns: Dict[str, EncodedColumn], n_rows: int):
+        self.columns = columns
+        self.n_rows = n_rows
+
+    def __contains__(self, column_name: str) -> bool:
+        return column_name in self.columns
+
+    def __getitem__(self, column_name: str) -> EncodedColumn:
+        return self.columns[column_name]
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    @property
+    def column_names(self) -> List[str]:
+        return list(self.columns.keys())
+
+    @property
+    def nbytes(self) -> int:
+        return sum(col.nbytes for col in self.columns.values())
+
+    def take(self, rows: np.ndarray) -> "EncodedDataset":
+        """
+        Sous-ensemble de lignes (seuls les codes sont recopiés, les dictionnaires sont partagés).
+        """
+        return EncodedDataset(
+            {name: EncodedColumn(name, col.codes[rows], col.categories, col.dtype)
+             for name, col in self.columns.items()},
+            len(rows)
+        )
+
+    def with_column(self, column: EncodedColumn) -> "EncodedDataset":
+        columns = dict(self.columns)
+        columns[column.name] = column
+        return EncodedDataset(columns, self.n_rows)
+
+    def to_frame(self, column_names: Optional[List[str]] = None,
+                 rows: Optional[np.ndarray] = None) -> pd.DataFrame:
+        names = self.column_names if column_names is None else column_names
+        return pd.DataFrame({name: self.columns[name].to_series(rows) for name in names}, columns=names)
+
+
+def encode_dataframe(df: pd.DataFrame) -> EncodedDataset:
+    """
+    Encode chaque colonne d'un DataFrame en codes entiers + dictionnaire de valeurs.
+    """
+    columns = {}
+    for name in df.columns:
+        columns[name] = EncodedColumn.from_series(df[name], name)
+    return EncodedDataset(columns, len(df))
@@ -0,0 +1,313 @@
+from typing import Dict, List, Any, Optional
+
+import numpy as np
+
+from services.serialization import to_json_list
+
+# Format « à plat » des arbres, renvoyé au frontend qui le demande (tree_format=flat)
+FLAT_FORMAT = "flat"
+
+_ARRAYS = ("parent", "variable", "value", "code", "count", "total", "percentage", "variance", "message")
+
+
+class FlatTree:
+    """
+    Arbre de décision à plat : un élément par nœud, rangé dans des tableaux parallèles.
+    L'élément 0 est la racine ; chaque autre élément est une branche de son parent
+    (valeur, cas cibles, effectif, pourcentage) et porte le sous-arbre de cette branche :
+    un nœud de découpage (variable >= 0, avec son écart-type), une feuille (message >= 0)
+    ou rien. Variables, valeurs et messages sont stockés une seule fois (identifiants
+    dans les tableaux) ; le chemin d'un nœud est reconstruit à la demande depuis ses parents.
+    code garde le code de la valeur de chaque branche dans la colonne de la variable de son
+    parent (deux valeurs de même texte restent distinctes, voir retarget_tree) ; -1 pour la
+    racine et pour un arbre relu depuis sa forme JSON.
+    """
+    __slots__ = _ARRAYS + ("variables", "values", "messages", "_children")
+
+    def __init__(self, parent: np.ndarray, variable: np.ndarray, value: np.ndarray,
+                 count: np.ndarray, total: np.ndarray, percentage: np.ndarray,
+                 variance: np.ndarray, message: np.ndarray,
+                 variables: List[str], values: List[str], messages: List[str],
+                 code: Optional[np.ndarray] = None):
+        self.parent = parent
+        self.variable = variable
+        self.value = value
+        self.code = np.full(len(parent), -1, dtype=np.int32) if code is None else code
+        self.count = count
+        self.total = total
+        self.percentage = percentage
+        self.variance = variance
+        self.message = message
+        self.variables = variables
+        self.values = values
+        self.messages = messages
+        self._children = None
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__ if name != "_children"}
+
+    def __setstate__(self, state: Dict[str, Any]):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._children = None
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(getattr(self, name).nbytes for name in _ARRAYS))
+
+    # ------------------------------------------------------------------
+    # Parcours
+    # ------------------------------------------------------------------
+
+    def is_node(self, element: int) -> bool:
+        return bool(self.variable[element] >= 0)
+
+    def leaf_message(self, element: int) -> Optional[str]:
+        """
+        Message de la feuille portée par element (None si ce n'est pas une feuille).
+        """
+        if self.variable[element] >= 0 or self.message[element] < 0:
+            return None
+        return self.messages[self.message[element]]
+
+    def children(self, element: int) -> np.ndarray:
+        """
+        Branches du nœud element, dans l'ordre de construction.
+        """
+        if self._children is None:
+            # Regroupement des éléments par parent (tri stable : l'ordre des branches est conservé)
+            order = np.argsort(self.parent, kind="stable")
+            starts = np.searchsorted(self.parent[order], np.arange(len(self) + 1))
+            self._children = (order, starts)
+        order, starts = self._children
+        return order[starts[element]:starts[element + 1]]
+
+    def path(self, element: int) -> List[str]:
+        """
+        Chemin du nœud element depuis la racine : [variable, valeur, variable, ..., variable].
+        """
+        path = [self.variables[self.variable[element]]]
+        while self.parent[element] >= 0:
+            parent = int(self.parent[element])
+            path.append(self.values[self.value[element]])
+            path.append(self.variables[self.variable[parent]])
+            element = parent
+        path.reverse()
+        return path
+
+    # ------------------------------------------------------------------
+    # Conversions
+    # ------------------------------------------------------------------
+
+    def to_nested(self, root_path: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Arbre imbriqué historique (dictionnaires « node » / « leaf », branches indexées
+        par valeur, chemin complet dans chaque nœud, préfixé par root_path).
+        """
+        variable = self.variable.tolist()
+        value = self.value.tolist()
+        count = self.count.tolist()
+        total = self.total.tolist()
+        percentage = self.percentage.tolist()
+        variance = self.variance.tolist()
+        message = self.message.tolist()
+
+        def subtree(element: int, parent_path: List[str]) -> Optional[Dict[str, Any]]:
+            if variable[element] >= 0:
+                variable_name = self.variables[variable[element]]
+                return {
+                    "type": "node",
+                    "variable": variable_name,
+                    "variance": variance[element],
+                    "branches": {},
+                    "path": parent_path + [variable_name]
+                }
+            if message[element] >= 0:
+                return {"type": "leaf", "message": self.messages[message[element]]}
+            return None
+
+        root = subtree(0, list(root_path or []))
+        stack = [(0, root)]
+        while stack:
+            element, node = stack.pop()
+            if node is None or node["type"] != "node":
+                continue
+            for child in self.children(element).tolist():
+                branch_value = self.values[value[child]]
+                child_node = subtree(child, node["path"] + [branch_value])
+                # Même clé textuelle pour deux valeurs distinctes : la dernière l'emporte, comme avant
+                node["branches"][branch_value] = {
+                    "count": count[child],
+                    "total": total[child],
+                    "percentage": percentage[child],
+                    "subtree": child_node
+                }
+                stack.append((child, child_node))
+        return root
+
+    def to_compact(self) -> Dict[str, Any]:
+        """
+        Forme JSON à plat (tableaux parallèles, -1 = absent) proposée au frontend.
+        """
+        return {
+            "format": FLAT_FORMAT,
+            "variables": list(self.variables),
+            "values": list(self.values),
+            "messages": list(self.messages),
+            "parent": self.parent.tolist(),
+            "variable": self.variable.tolist(),
+            "value": self.value.tolist(),
+            "count": self.count.tolist(),
+            "total": self.total.tolist(),
+            "percentage": to_json_list(self.percentage),
+            "variance": to_json_list(self.variance),
+            "message": self.message.tolist()
+        }
+
+    @classmethod
+    def from_compact(cls, compact: Dict[str, Any]) -> "FlatTree":
+        def floats(values: List[Any]) -> np.ndarray:
+            return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+        return cls(
+            np.array(compact["parent"], dtype=np.int32), np.array(compact["variable"], dtype=np.int32),
+            np.array(compact["value"], dtype=np.int32), np.array(compact["count"], dtype=np.int64),
+            np.array(compact["total"], dtype=np.int64), floats(compact["percentage"]),
+            floats(compact["variance"]), np.array(compact["message"], dtype=np.int32),
+            list(compact["variables"]), list(compact["values"]), list(compact["messages"])
+        )
+
+    @classmethod
+    def from_nested(cls, tree: Optional[Dict[str, Any]]) -> "FlatTree":
+        builder = FlatTreeBuilder()
+        stack = [(FlatTreeBuilder.ROOT, tree)]
+        while stack:
+            element, node = stack.pop()
+            if node is None:
+                continue
+            if node.get("type") != "node":
+                builder.set_leaf(element, node.get("message", ""))
+                continue
+            builder.set_node(element, node["variable"], node["variance"])
+            for branch_value, branch in node["branches"].items():
+                child = builder.add_branch(element, branch_value, branch["count"], branch["total"],
+                                           branch["percentage"])
+                stack.append((child, branch.get("subtree")))
+        return builder.finish()
+
+
+def nested_trees(decision_trees: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    decision_trees ({variable: {valeur: arbre}}) avec chaque arbre sous forme imbriquée,
+    qu'il ait été renvoyé à plat ou non.
+    """
+    return {
+        target_var: {
+            target_value: FlatTree.from_compact(tree).to_nested()
+            if isinstance(tree, dict) and tree.get("format") == FLAT_FORMAT else tree
+            for target_value, tree in target_trees.items()
+        }
+        for target_var, target_trees in decision_trees.items()
+    }
+
+
+class FlatTreeBuilder:
+    """
+    Construction incrémentale d'un FlatTree : la racine existe d'emblée (ROOT), les
+    branches sont ajoutées à leur nœud, puis chaque élément reçoit son sous-arbre
+    (set_node / set_leaf, ou graft d'un arbre construit ailleurs).
+    """
+    ROOT = 0
+
+    def __init__(self):
+        self.parent = [-1]
+        self.variable = [-1]
+        self.value = [-1]
+        self.code = [-1]
+        self.count = [0]
+        self.total = [0]
+        self.percentage = [np.nan]
+        self.variance = [np.nan]
+        self.message = [-1]
+        self.variables: List[str] = []
+        self.values: List[str] = []
+        self.messages: List[str] = []
+        self._variable_ids: Dict[str, int] = {}
+        self._value_ids: Dict[str, int] = {}
+        self._message_ids: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    @staticmethod
+    def _intern(ids: Dict[str, int], items: List[str], item: str) -> int:
+        item_id = ids.get(item)
+        if item_id is None:
+            item_id = ids[item] = len(items)
+            items.append(item)
+        return item_id
+
+    def is_node(self, element: int) -> bool:
+        return self.variable[element] >= 0
+
+    def set_node(self, element: int, variable: str, variance: float):
+        self.variable[element] = self._intern(self._variable_ids, self.variables, variable)
+        self.variance[element] = variance
+
+    def set_leaf(self, element: int, message: str):
+        self.message[element] = self._intern(self._message_ids, self.messages, message)
+
+    def add_branch(self, parent: int, value: str, count: int, total: int, percentage: float,
+                   code: int = -1) -> int:
+        # code : code de la valeur dans la colonne de la variable du nœud parent
+        self.parent.append(parent)
+        self.variable.append(-1)
+        self.value.append(self._intern(self._value_ids, self.values, value))
+        self.code.append(code)
+        self.count.append(count)
+        self.total.append(total)
+        self.percentage.append(percentage)
+        self.variance.append(np.nan)
+        self.message.append(-1)
+        return len(self.parent) - 1
+
+    def graft(self, element: int, tree: FlatTree):
+        """
+        Place tree (construit à part, par exemple dans un autre processus) comme sous-arbre de element.
+        """
+        def remap(ids: np.ndarray, names: List[str], table: Dict[str, int], items: List[str]) -> List[int]:
+            mapping = np.array([self._intern(table, items, name) for name in names] + [-1], dtype=np.int64)
+            return mapping[ids].tolist()  # -1 indexe le -1 ajouté en fin de mapping
+
+        variable = remap(tree.variable, tree.variables, self._variable_ids, self.variables)
+        value = remap(tree.value, tree.values, self._value_ids, self.values)
+        message = remap(tree.message, tree.messages, self._message_ids, self.messages)
+        self.variable[element] = variable[0]
+        self.variance[element] = float(tree.variance[0])
+        self.message[element] = message[0]
+
+        # Élément i de tree (i >= 1) -> base + i - 1 ; sa racine -> element
+        base = len(self.parent)
+        new_index = np.arange(base - 1, base - 1 + len(tree), dtype=np.int64)
+        new_index[0] = element
+        self.parent.extend(new_index[tree.parent[1:]].tolist())
+        self.variable.extend(variable[1:])
+        self.value.extend(value[1:])
+        self.code.extend(tree.code[1:].tolist())
+        self.count.extend(tree.count[1:].tolist())
+        self.total.extend(tree.total[1:].tolist())
+        self.percentage.extend(tree.percentage[1:].tolist())
+        self.variance.extend(tree.variance[1:].tolist())
+        self.message.extend(message[1:])
+
+    def finish(self) -> FlatTree:
+        return FlatTree(
+            np.array(self.parent, dtype=np.int32), np.array(self.variable, dtype=np.int32),
+            np.array(self.value, dtype=np.int32), np.array(self.count, dtype=np.int64),
+            np.array(self.total, dtype=np.int64), np.array(self.percentage, dtype=np.float64),
+            np.array(self.variance, dtype=np.float64), np.array(self.message, dtype=np.int32),
+            list(self.variables), list(self.values), list(self.messages), np.array(self.code, dtype=np.int32)
+        )
@@ -0,0 +1,489 @@
+import datetime
+import hashlib
+import itertools
+import math
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Any, BinaryIO, Callable, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from pandas.errors import EmptyDataError
+from pandas.io.parsers import TextParser
+
+from services.dataset_store import dataset_store
+from services.encoding import EncodedColumn, EncodedDataset, _smallest_code_dtype
+from services.shared_state import owner_alive
+
+# Nombre de lignes du classeur converties et encodées d'un coup
+INGESTION_CHUNK_ROWS = int(os.getenv("INGESTION_CHUNK_ROWS", "10000"))
+
+# Nombre de lectures de classeurs menées en parallèle en arrière-plan
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))
+
+# Intervalle (secondes) entre deux relectures de l'état d'une lecture menée par un autre worker
+INGESTION_POLL_SECONDS = float(os.getenv("INGESTION_POLL_SECONDS", "0.25"))
+
+# Lecture d'un autre worker tenue pour abandonnée sans nouvelles depuis ce délai (secondes)
+INGESTION_STALE_SECONDS = float(os.getenv("INGESTION_STALE_SECONDS", "600"))
+
+PREVIEW_ROWS = 5
+
+_COPY_BLOCK_BYTES = 1 << 20
+
+_executor = ThreadPoolExecutor(max_workers=max(1, INGESTION_WORKERS), thread_name_prefix="ingestion")
+
+
+def save_upload(fileobj: BinaryIO, suffix: str) -> Tuple[str, str]:
+    """
+    Copie l'upload dans un fichier temporaire en calculant au passage son empreinte
+    SHA-256, qui sert d'identifiant (dataset_id) au jeu de données.
+    Renvoie (chemin du fichier temporaire, dataset_id).
+    """
+    digest = hashlib.sha256()
+    fd, path = tempfile.mkstemp(prefix="preview_", suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                block = fileobj.read(_COPY_BLOCK_BYTES)
+                if not block:
+                    break
+                digest.update(block)
+                out.write(block)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, digest.hexdigest()
+
+
+def _convert_openpyxl_cell(cell) -> Any:
+    # Mêmes conversions que le lecteur openpyxl de pandas.read_excel
+    from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+
+    value = cell.value
+    if value is None:
+        return ""
+    if cell.data_type == TYPE_ERROR:
+        return np.nan
+    if cell.data_type == TYPE_NUMERIC:
+        as_int = int(value)
+        if as_int == value:
+            return as_int
+        return float(value)
+    return value
+
+
+def _convert_xlrd_cell(value: Any, cell_type: int, datemode: int) -> Any:
+    # Mêmes conversions que le lecteur xlrd de pandas.read_excel
+    from xlrd import XL_CELL_BOOLEAN, XL_CELL_DATE, XL_CELL_ERROR, XL_CELL_NUMBER, xldate
+
+    if cell_type == XL_CELL_DATE:
+        try:
+            value = xldate.xldate_as_datetime(value, datemode)
+        except OverflowError:
+            return value
+        # Date sur l'époque Excel : il s'agit d'une heure seule
+        if (not datemode and value.timetuple()[0:3] == (1899, 12, 31)) or (
+            datemode and value.timetuple()[0:3] == (1904, 1, 1)
+        ):
+            value = datetime.time(value.hour, value.minute, value.second, value.microsecond)
+    elif cell_type == XL_CELL_ERROR:
+        return np.nan
+    elif cell_type == XL_CELL_BOOLEAN:
+        return bool(value)
+    elif cell_type == XL_CELL_NUMBER:
+        if math.isfinite(value):
+            as_int = int(value)
+            if as_int == value:
+                return as_int
+    return value
+
+
+def _parse_like_read_excel(rows: List[List[Any]]) -> pd.DataFrame:
+    """
+    Typage des cellules brutes (valeurs manquantes, nombres, booléens) par le
+    même TextParser que pandas.read_excel ; la première ligne est l'en-tête.
+    """
+    try:
+        return TextParser(rows, header=0, skip_blank_lines=False).read()
+    except EmptyDataError:
+        return pd.DataFrame()
+
+
+class _ColumnAccumulator:
+    """
+    Encodage incrémental d'une colonne : dictionnaire des valeurs brutes (avant typage)
+    et codes bruts de chaque bloc de lignes.
+    """
+
+    def __init__(self, n_previous_rows: int = 0):
+        self.raw_codes: Dict[Any, int] = {}
+        self.raw_values: List[Any] = []
+        self.has_error_cells = False
+        self.chunks: List[np.ndarray] = []
+        if n_previous_rows:
+            # Colonne apparue en cours de lecture : les lignes précédentes sont vides
+            self.chunks.append(np.full(n_previous_rows, self._code_for(""), dtype=np.int32))
+
+    def _code_for(self, value: Any) -> int:
+        code = self.raw_codes.get(value)
+        if code is None:
+            code = len(self.raw_values)
+            self.raw_codes[value] = code
+            self.raw_values.append(value)
+        return code
+
+    def add(self, values: np.ndarray):
+        local_codes, uniques = pd.factorize(values, use_na_sentinel=True)
+        mapping = np.fromiter((self._code_for(value) for value in uniques), dtype=np.int32, count=len(uniques))
+        chunk = np.full(len(local_codes), -1, dtype=np.int32)
+        present = local_codes >= 0
+        if not present.all():
+            # Cellules en erreur (NaN) : manquantes, mais elles comptent pour le typage
+            self.has_error_cells = True
+        chunk[present] = mapping[local_codes[present]]
+        self.chunks.append(chunk)
+
+    def finish(self, name: Any) -> EncodedColumn:
+        """
+        Type les valeurs distinctes comme read_excel typerait la colonne entière (la
+        conversion ne dépend que de l'ensemble des valeurs), puis ré-encode les codes bruts.
+        """
+        rows = [[name]] + [[value] for value in self.raw_values]
+        if self.has_error_cells:
+            rows.append([np.nan])
+        typed = _parse_like_read_excel(rows).iloc[:, 0]
+        typed = typed.replace([np.nan, np.inf, -np.inf], None)
+        column = EncodedColumn.from_series(typed.rename(name), name)
+
+        remap = np.append(column.codes[:len(self.raw_values)].astype(np.int64), -1)  # code brut -1 -> -1
+        dtype = _smallest_code_dtype(len(column.categories))
+        n_rows = sum(len(chunk) for chunk in self.chunks)
+        codes = np.empty(n_rows, dtype=dtype)
+        start = 0
+        for chunk in self.chunks:
+            codes[start:start + len(chunk)] = remap[chunk]
+            start += len(chunk)
+        self.chunks = []
+        return EncodedColumn(name, codes, column.categories, column.dtype)
+
+
+class StreamingEncoder:
+    """
+    Construit un EncodedDataset à partir de lignes de cellules brutes reçues par blocs.
+    La mémoire utilisée ne dépend que de la taille d'un bloc (plus les codes entiers).
+    Comme read_excel avec openpyxl (trim_blank=True) : les cellules vides en fin de ligne
+    et les lignes vides finales sont ignorées, les lignes courtes complétées par des
+    cellules vides. Avec xlrd (trim_blank=False), les lignes sont prises telles quelles.
+    """
+
+    def __init__(self, header: List[Any], trim_blank: bool = True):
+        self.header = list(header)
+        self.trim_blank = trim_blank
+        while trim_blank and self.header and self.header[-1] == "":
+            self.header.pop()
+        self.n_rows = 0
+        self._columns: List[_ColumnAccumulator] = [_ColumnAccumulator() for _ in self.header]
+        self._pending_blank_rows = 0
+
+    def add_rows(self, rows: Iterable[List[Any]]):
+        if self.trim_blank:
+            block = self._trim_blank(rows)
+        else:
+            block = list(rows)
+        if not block:
+            return
+
+        width = max(len(row) for row in block)
+        while len(self._columns) < width:
+            self._columns.append(_ColumnAccumulator(self.n_rows))
+        for j, accumulator in enumerate(self._columns):
+            values = np.empty(len(block), dtype=object)
+            values[:] = [row[j] if j < len(row) else "" for row in block]
+            accumulator.add(values)
+        self.n_rows += len(block)
+
+    def _trim_blank(self, rows: Iterable[List[Any]]) -> List[List[Any]]:
+        block = []
+        for row in rows:
+            while row and row[-1] == "":
+                row.pop()
+            if not row:
+                # Ligne vide : conservée seulement si d'autres lignes suivent
+                self._pending_blank_rows += 1
+                continue
+            if self._pending_blank_rows:
+                block.extend([] for _ in range(self._pending_blank_rows))
+                self._pending_blank_rows = 0
+            block.append(row)
+        return block
+
+    def column_names(self) -> List[Any]:
+        # Noms dédoublonnés comme read_excel ("a", "a.1", "Unnamed: 2", ...)
+        header = self.header + [""] * (len(self._columns) - len(self.header))
+        return list(_parse_like_read_excel([header]).columns)
+
+    def finish(self) -> EncodedDataset:
+        columns = {}
+        for name, accumulator in zip(self.column_names(), self._columns):
+            columns[name] = accumulator.finish(name)
+        return EncodedDataset(columns, self.n_rows)
+
+
+def _preview_frame(header: List[Any], rows: List[List[Any]]) -> pd.DataFrame:
+    width = max([len(header)] + [len(row) for row in rows])
+    padded = [list(row) + [""] * (width - len(row)) for row in [header] + rows]
+    return _parse_like_read_excel(padded).replace([np.nan, np.inf, -np.inf], None)
+
+
+def _iter_xlsx_rows(sheet) -> Iterator[List[Any]]:
+    for row in sheet.rows:
+        yield [_convert_openpyxl_cell(cell) for cell in row]
+
+
+def _iter_xls_rows(sheet, datemode: int) -> Iterator[List[Any]]:
+    for i in range(sheet.nrows):
+        yield [
+            _convert_xlrd_cell(value, cell_type, datemode)
+            for value, cell_type in zip(sheet.row_values(i), sheet.row_types(i))
+        ]
+
+
+class _SheetSource(NamedTuple):
+    estimated_rows: Optional[int]  # nombre de lignes de données annoncé par le classeur
+    rows: Iterator[List[Any]]      # lignes de cellules converties, en-tête compris
+    close: Callable[[], None]
+    trim_blank: bool
+
+
+def _open_xlsx(path: str) -> _SheetSource:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        # Dimension déclarée par le classeur (peut être absente ou fausse) : estimation seulement
+        estimated_rows = max(0, sheet.max_row - 1) if sheet.max_row else None
+        sheet.reset_dimensions()
+    except Exception:
+        workbook.close()
+        raise
+    return _SheetSource(estimated_rows, _iter_xlsx_rows(sheet), workbook.close, True)
+
+
+def _open_xls(path: str) -> _SheetSource:
+    # Ancien format binaire : lu directement par xlrd (sans conversion intermédiaire en .xlsx) ;
+    # on_demand : seule la première feuille est chargée
+    from xlrd import open_workbook
+
+    workbook = open_workbook(path, on_demand=True)
+    try:
+        sheet = workbook.sheet_by_index(0)
+    except Exception:
+        workbook.release_resources()
+        raise
+    return _SheetSource(
+        max(0, sheet.nrows - 1), _iter_xls_rows(sheet, workbook.datemode), workbook.release_resources, False
+    )
+
+
+def _iter_chunks(rows: Iterator[List[Any]], chunk_rows: int) -> Iterator[List[List[Any]]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_rows:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Ingestion:
+    """
+    Lecture d'un classeur en cours : en-tête et premières lignes disponibles tout
+    de suite, le reste est encodé par blocs en arrière-plan puis enregistré dans
+    le dataset_store. future se résout avec le jeu encodé (ou l'erreur de lecture).
+    """
+
+    def __init__(self, dataset_id: str, filename: str, estimated_rows: int):
+        self.dataset_id = dataset_id
+        self.filename = filename
+        self.estimated_rows = estimated_rows
+        self.columns: List[Any] = []
+        self.preview: List[Dict[str, Any]] = []
+        self.rows_read = 0
+        self.future: Future = Future()
+
+    @property
+    def status(self) -> str:
+        if not self.future.done():
+            return "parsing"
+        return "error" if self.future.exception() is not None else "ready"
+
+    def to_status(self) -> Dict[str, Any]:
+        status = {
+            "dataset_id": self.dataset_id,
+            "filename": self.filename,
+            "status": self.status,
+            "rows_read": self.rows_read,
+            "estimated_rows": self.estimated_rows
+        }
+        if self.status == "error":
+            status["error"] = str(self.future.exception())
+        return status
+
+    def publish(self):
+        # État partagé avec les autres workers (aperçu et colonnes compris)
+        dataset_store.publish_ingestion(self.dataset_id, {
+            **self.to_status(),
+            "columns": jsonable_encoder(self.columns),
+            "preview": jsonable_encoder(self.preview)
+        })
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> "Ingestion":
+        """
+        Lecture menée par un autre worker, reconstituée depuis son état partagé.
+        """
+        ingestion = cls(record["dataset_id"], record["filename"], record["estimated_rows"])
+        ingestion.columns = record["columns"]
+        ingestion.preview = record["preview"]
+        ingestion.rows_read = record["rows_read"]
+        if record["status"] == "error":
+            ingestion.future.set_exception(RuntimeError(record.get("error")))
+        return ingestion
+
+
+class IngestionRegistry:
+    """
+    Lectures de classeurs en cours ou récentes, par dataset_id. Une lecture menée par un
+    autre worker est suivie à travers son état partagé (dataset_store) : son future se
+    résout quand ce worker a enregistré le jeu.
+    """
+
+    def __init__(self):
+        self._ingestions: Dict[str, Ingestion] = {}
+        self._lock = threading.Lock()
+
+    def get(self, dataset_id: str) -> Optional[Ingestion]:
+        with self._lock:
+            ingestion = self._ingestions.get(dataset_id)
+            if ingestion is not None:
+                return ingestion
+            record = dataset_store.ingestion_status(dataset_id)
+            if record is None or record["status"] == "ready":
+                return None
+            ingestion = Ingestion.from_record(record)
+            if record["status"] == "error":
+                return ingestion
+            if not owner_alive(record, INGESTION_STALE_SECONDS):
+                # Worker arrêté en pleine lecture : le prochain import relira le classeur
+                return None
+            self._ingestions[dataset_id] = ingestion
+        threading.Thread(target=self._follow, args=(ingestion,), daemon=True,
+                         name=f"ingestion-follow-{dataset_id[:8]}").start()
+        return ingestion
+
+    def _follow(self, ingestion: Ingestion):
+        try:
+            while True:
+                time.sleep(INGESTION_POLL_SECONDS)
+                record = dataset_store.ingestion_status(ingestion.dataset_id)
+                if record is None:
+                    raise RuntimeError("Lecture du classeur interrompue")
+                ingestion.rows_read = record["rows_read"]
+                ingestion.columns = record["columns"]
+                if record["status"] == "ready":
+                    df = dataset_store.get(ingestion.dataset_id)
+                    if df is None:
+                        raise RuntimeError("Jeu de données introuvable après la lecture")
+                    ingestion.future.set_result(df)
+                    return
+                if record["status"] == "error":
+                    raise RuntimeError(record.get("error"))
+                if not owner_alive(record, INGESTION_STALE_SECONDS):
+                    raise RuntimeError("Lecture du classeur abandonnée par le worker qui la menait")
+        except Exception as e:
+            ingestion.future.set_exception(e)
+        finally:
+            # Lecture terminée : l'état partagé (ou le dataset_store) fait foi
+            with self._lock:
+                if self._ingestions.get(ingestion.dataset_id) is ingestion:
+                    del self._ingestions[ingestion.dataset_id]
+
+    def discard(self, dataset_id: str):
+        # Oublie la lecture de dataset_id : le prochain import du même contenu relira le classeur
+        with self._lock:
+            self._ingestions.pop(dataset_id, None)
+            dataset_store.discard_ingestion(dataset_id)
+
+    def start(self, dataset_id: str, filename: str, path: str,
+              chunk_rows: int = INGESTION_CHUNK_ROWS) -> Ingestion:
+        """
+        Ouvre le classeur (.xlsx en lecture seule, .xls avec xlrd), lit l'en-tête et les
+        premières lignes (pour l'aperçu), puis confie la suite de la lecture au pool
+        d'arrière-plan. Le fichier path est supprimé une fois la lecture terminée.
+        """
+        source = _open_xls(path) if path.lower().endswith(".xls") else _open_xlsx(path)
+        rows = source.rows
+        try:
+            header = next(rows, [])
+            first_rows = list(itertools.islice(rows, PREVIEW_ROWS))
+        except Exception:
+            source.close()
+            raise
+        estimated_rows = source.estimated_rows
+        if estimated_rows is None:
+            estimated_rows = len(first_rows)
+
+        ingestion = Ingestion(dataset_id, filename, estimated_rows)
+        encoder = StreamingEncoder(header, source.trim_blank)
+        preview = _preview_frame(encoder.header, first_rows)
+        ingestion.columns = list(preview.columns)
+        ingestion.preview = preview.to_dict(orient="records")
+
+        def run():
+            try:
+                encoder.add_rows(first_rows)
+                ingestion.rows_read = encoder.n_rows
+                for chunk in _iter_chunks(rows, chunk_rows):
+                    encoder.add_rows(chunk)
+                    ingestion.rows_read = encoder.n_rows
+                    ingestion.publish()
+                dataset = encoder.finish()
+                df = dataset_store.put(dataset_id, dataset, filename)
+                ingestion.columns = df.column_names
+                ingestion.future.set_result(df)
+            except Exception as e:
+                ingestion.future.set_exception(e)
+            finally:
+                try:
+                    ingestion.publish()
+                except OSError:
+                    pass
+                source.close()
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            if ingestion.status == "ready":
+                # Le jeu est dans le dataset_store : l'entrée (et son future) ne le retient plus
+                # hors du budget mémoire du store ; les lectures en erreur restent consultables
+                with self._lock:
+                    if self._ingestions.get(dataset_id) is ingestion:
+                        del self._ingestions[dataset_id]
+                # Après la mise à disposition du jeu : la base ne retarde pas les requêtes en attente
+                dataset_store.persist(dataset_id, ingestion.future.result(), filename)
+
+        with self._lock:
+            self._ingestions[dataset_id] = ingestion
+            ingestion.publish()
+        _executor.submit(run)
+        return ingestion
+
+
+ingestions = IngestionRegistry()
@@ -0,0 +1,203 @@
+import asyncio
+import contextvars
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, Awaitable, Optional
+
+from services.metrics import metrics
+from services.shared_state import owner_alive, read_record, write_record
+
+# Nombre de constructions d'arbres (tâches de fond et requêtes synchrones) exécutées simultanément
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+
+# Nombre de traitements courts (aperçu d'un import, rendu d'un PDF) exécutés simultanément,
+# dans un pool à part : ils n'attendent jamais la fin d'une construction
+REQUEST_WORKERS = int(os.getenv("REQUEST_WORKERS", "4"))
+
+# Durée de conservation (secondes) des tâches terminées et de leur résultat
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "900"))
+
+# Répertoire des états et résultats des tâches, partagé par les workers (un fichier par tâche)
+JOB_STORE_DIR = os.getenv("JOB_STORE_DIR", os.path.join(tempfile.gettempdir(), "analyseur_jobs"))
+
+# Tâche d'un autre worker tenue pour perdue sans nouvelles depuis ce délai (secondes)
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "3600"))
+
+_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+
+_build_executor = ThreadPoolExecutor(max_workers=max(1, JOB_WORKERS), thread_name_prefix="job")
+_request_executor = ThreadPoolExecutor(max_workers=max(1, REQUEST_WORKERS), thread_name_prefix="request")
+
+
+def _run_coroutine(coro_factory: Callable[[], Awaitable[Any]]) -> Any:
+    # Chaque tâche a sa propre boucle d'événements dans le thread d'exécution
+    return asyncio.run(coro_factory())
+
+
+async def _run_in(executor: ThreadPoolExecutor, coro_factory: Callable[[], Awaitable[Any]]) -> Any:
+    loop = asyncio.get_running_loop()
+    # Le contexte (mesures de la requête en cours) suit le calcul dans le thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor, context.run, _run_coroutine, coro_factory)
+
+
+async def run_blocking(coro_factory: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Exécute un traitement bloquant court (aperçu, PDF) dans le pool des requêtes et attend
+    son résultat sans bloquer la boucle d'événements du serveur.
+    """
+    return await _run_in(_request_executor, coro_factory)
+
+
+async def run_build(coro_factory: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Exécute une construction d'arbre (CPU) dans le pool des constructions, partagé avec
+    les tâches de fond, et attend son résultat sans bloquer la boucle d'événements.
+    """
+    return await _run_in(_build_executor, coro_factory)
+
+
+def run_in_background(func: Callable[..., Any], *args: Any):
+    """
+    Lance func(*args) dans le pool des requêtes sans l'attendre (écritures différées qui
+    n'ont pas à retarder la réponse en cours).
+    """
+    return _request_executor.submit(func, *args)
+
+
+class Job:
+    """
+    Tâche de fond : état, horodatages et résultat (ou erreur).
+    """
+
+    def __init__(self, kind: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "pending"  # pending -> running -> done | error
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+
+    def to_status(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error
+        }
+
+    def to_record(self) -> Dict[str, Any]:
+        return {**self.to_status(), "result": self.result}
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> "Job":
+        job = cls(record["kind"])
+        job.id = record["job_id"]
+        job.status = record["status"]
+        job.created_at = record["created_at"]
+        job.started_at = record["started_at"]
+        job.finished_at = record["finished_at"]
+        job.error = record["error"]
+        job.result = record["result"]
+        if job.finished_at is None and not owner_alive(record, JOB_STALE_SECONDS):
+            # Worker arrêté avant la fin de la tâche
+            job.status = "error"
+            job.error = "Tâche interrompue (arrêt du worker qui l'exécutait)"
+            job.finished_at = record["updated_at"]
+        return job
+
+
+class JobManager:
+    """
+    Registre des tâches de fond. Les tâches terminées sont oubliées après ttl secondes.
+    L'état de chaque tâche (et son résultat une fois terminée) est aussi écrit dans
+    root_dir : un worker qui n'exécute pas la tâche la lit depuis ce répertoire.
+    """
+
+    def __init__(self, ttl: int = JOB_RESULT_TTL, root_dir: str = JOB_STORE_DIR):
+        self.ttl = ttl
+        self.root_dir = root_dir
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.root_dir, f"{job_id}.json")
+
+    def _save(self, job: Job):
+        try:
+            write_record(self._path(job.id), job.to_record())
+        except (OSError, TypeError):
+            # Résultat non enregistrable : la tâche reste lisible depuis ce worker seulement
+            pass
+
+    def submit(self, kind: str, coro_factory: Callable[[], Awaitable[Any]]) -> Job:
+        self.purge_expired()
+        job = Job(kind)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._save(job)
+        _build_executor.submit(self._run, job, coro_factory)
+        return job
+
+    def _run(self, job: Job, coro_factory: Callable[[], Awaitable[Any]]):
+        job.status = "running"
+        job.started_at = time.time()
+        self._save(job)
+        try:
+            with metrics.request_scope() as request:
+                result = _run_coroutine(coro_factory)
+            metrics.add_work(f"job:{job.kind}", request)
+            if isinstance(result, dict) and "error" in result:
+                job.error = str(result["error"])
+                job.status = "error"
+            else:
+                job.status = "done"
+            job.result = result
+        except Exception as e:
+            job.error = str(e)
+            job.status = "error"
+        finally:
+            job.finished_at = time.time()
+            self._save(job)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self.purge_expired()
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None or not _JOB_ID.match(job_id):
+            return job
+        # Tâche lancée par un autre worker
+        record = read_record(self._path(job_id))
+        if record is None:
+            return None
+        job = Job.from_record(record)
+        if job.finished_at is not None and time.time() - job.finished_at > self.ttl:
+            return None
+        return job
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.finished_at is not None and now - job.finished_at > self.ttl
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+                try:
+                    os.remove(self._path(job_id))
+                except OSError:
+                    pass
+
+
+job_manager = JobManager()
@@ -0,0 +1,272 @@
+import bisect
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Any, Callable, Iterator, Optional, Tuple
+
+# Instrumentation (middleware, phases, compteurs) ; METRICS_ENABLED=0 la désactive entièrement
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") not in ("0", "false", "False")
+
+# Bornes (secondes) des histogrammes de durée
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+_PREFIX = "analyseur"
+
+# Compteurs de travail d'une requête exposés (nom interne -> description)
+WORK_COUNTERS = {
+    "nodes_built": "Nœuds de découpage construits",
+    "variables_scored": "Variables explicatives évaluées (une par nœud et par variable)",
+    "rows_scanned": "Lignes parcourues pour construire les tables de contingence",
+}
+
+
+class RequestMetrics:
+    """
+    Mesures d'une requête (ou d'une tâche de fond) : durée cumulée par phase et compteurs
+    de travail. Mises à jour sans verrou (une requête à la fois les modifie), puis reportées
+    dans les compteurs globaux à la fin de la requête.
+    """
+    __slots__ = ("phases", "counters")
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+
+    def server_timing(self) -> str:
+        # En-tête Server-Timing : durées des phases (ms) et compteurs de travail
+        entries = [f"{phase};dur={seconds * 1000:.1f}" for phase, seconds in self.phases.items()]
+        entries.extend(f'{name};desc="{value}"' for name, value in self.counters.items())
+        return ", ".join(entries)
+
+
+_current: contextvars.ContextVar[Optional[RequestMetrics]] = contextvars.ContextVar("request_metrics", default=None)
+
+
+class _Histogram:
+    """
+    Histogramme cumulatif par jeu de labels (format Prometheus).
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.series: Dict[Tuple[Tuple[str, str], ...], List[float]] = {}
+
+    def observe(self, labels: Tuple[Tuple[str, str], ...], value: float):
+        # [compte par intervalle..., +Inf, somme] ; cumul fait à l'export
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class MetricsRegistry:
+    """
+    Métriques du processus : durée des requêtes par route, durée des phases du contrôleur,
+    compteurs de travail par route et jauges lues au moment de l'export (/metrics).
+    Le travail fait dans les processus du pool de construction n'y est pas compté.
+    """
+
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._requests = _Histogram()
+        self._phases = _Histogram()
+        self._statuses: Dict[Tuple[Tuple[str, str], ...], int] = {}
+        self._work: Dict[Tuple[Tuple[str, str], ...], int] = {}
+        self._gauges: List[Tuple[str, str, Callable[[], float]]] = []
+
+    # ------------------------------------------------------------------
+    # Mesures
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def request_scope(self) -> Iterator[RequestMetrics]:
+        """
+        Ouvre les mesures d'une requête pour le contexte courant (et les threads qui le copient).
+        """
+        request = RequestMetrics()
+        token = _current.set(request)
+        try:
+            yield request
+        finally:
+            _current.reset(token)
+
+    @contextmanager
+    def span(self, phase: str) -> Iterator[None]:
+        """
+        Chronomètre une phase : histogramme global de la phase et durée cumulée dans la requête.
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_phase(phase, time.perf_counter() - start)
+
+    def phase_timer(self) -> "PhaseTimer":
+        return PhaseTimer(self)
+
+    def record_phase(self, phase: str, elapsed: float):
+        if not self.enabled:
+            return
+        request = _current.get()
+        if request is not None:
+            request.phases[phase] = request.phases.get(phase, 0.0) + elapsed
+        with self._lock:
+            self._phases.observe((("phase", phase),), elapsed)
+
+    def count(self, name: str, value: int = 1):
+        # Compteur de travail de la requête courante (ignoré hors requête)
+        request = _current.get()
+        if request is not None:
+            request.counters[name] = request.counters.get(name, 0) + value
+
+    def observe_request(self, route: str, method: str, status: int, seconds: float,
+                        request: Optional[RequestMetrics] = None):
+        labels = (("route", route), ("method", method))
+        with self._lock:
+            self._requests.observe(labels, seconds)
+            status_labels = labels + (("status", str(status)),)
+            self._statuses[status_labels] = self._statuses.get(status_labels, 0) + 1
+            if request is not None:
+                self._add_work(route, request)
+
+    def add_work(self, route: str, request: RequestMetrics):
+        # Report des compteurs d'une tâche de fond (hors requête HTTP)
+        with self._lock:
+            self._add_work(route, request)
+
+    def _add_work(self, route: str, request: RequestMetrics):
+        for name, value in request.counters.items():
+            work_labels = (("route", route), ("counter", name))
+            self._work[work_labels] = self._work.get(work_labels, 0) + value
+
+    def gauge(self, name: str, description: str, read: Callable[[], float]):
+        """
+        Jauge lue à chaque export (par exemple la mémoire du dataset_store).
+        """
+        self._gauges.append((name, description, read))
+
+    # ------------------------------------------------------------------
+    # Export
+    # ------------------------------------------------------------------
+
+    def render(self) -> str:
+        """
+        Export au format texte de Prometheus (version 0.0.4).
+        """
+        lines: List[str] = []
+        with self._lock:
+            self._render_histogram(lines, f"{_PREFIX}_http_request_duration_seconds",
+                                   "Durée des requêtes HTTP par route", self._requests)
+            self._render_histogram(lines, f"{_PREFIX}_phase_duration_seconds",
+                                   "Durée des phases du contrôleur", self._phases)
+            lines.append(f"# HELP {_PREFIX}_http_requests_total Requêtes HTTP par route et code de réponse")
+            lines.append(f"# TYPE {_PREFIX}_http_requests_total counter")
+            for labels, value in sorted(self._statuses.items()):
+                lines.append(f"{_PREFIX}_http_requests_total{_labels(labels)} {value}")
+            lines.append(f"# HELP {_PREFIX}_work_total " + "Travail des requêtes par route : " + "; ".join(
+                f"{name} = {description}" for name, description in WORK_COUNTERS.items()))
+            lines.append(f"# TYPE {_PREFIX}_work_total counter")
+            for labels, value in sorted(self._work.items()):
+                lines.append(f"{_PREFIX}_work_total{_labels(labels)} {value}")
+        for name, description, read in self._gauges:
+            try:
+                value = float(read())
+            except Exception:
+                continue
+            lines.append(f"# HELP {_PREFIX}_{name} {description}")
+            lines.append(f"# TYPE {_PREFIX}_{name} gauge")
+            lines.append(f"{_PREFIX}_{name} {value:.15g}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _render_histogram(lines: List[str], name: str, description: str, histogram: _Histogram):
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} histogram")
+        for labels, series in sorted(histogram.series.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, series):
+                cumulative += count
+                bucket_labels = _labels(labels, 'le="%g"' % bound)
+                lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+            cumulative += series[len(histogram.buckets)]
+            bucket_labels = _labels(labels, 'le="+Inf"')
+            lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {series[-1]:.6f}")
+            lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+
+
+class PhaseTimer:
+    """
+    Phases successives d'une fonction : lap(phase) attribue à phase le temps écoulé
+    depuis le lap précédent (ou la création du chronomètre).
+    """
+    __slots__ = ("registry", "start")
+
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+        self.start = time.perf_counter()
+
+    def lap(self, phase: str):
+        now = time.perf_counter()
+        self.registry.record_phase(phase, now - self.start)
+        self.start = now
+
+
+metrics = MetricsRegistry()
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI : durée de chaque requête HTTP jusqu'à la fin de l'envoi de la réponse
+    (réponses en flux comprises), par route (gabarit de chemin, pas le chemin réel) ; ajoute
+    l'en-tête Server-Timing avec la durée des phases et les compteurs de la requête.
+    """
+
+    def __init__(self, app: Any, registry: MetricsRegistry = metrics):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        if scope["type"] != "http" or not self.registry.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = [500]
+        with self.registry.request_scope() as request:
+            async def send_with_timing(message: Dict[str, Any]):
+                if message["type"] == "http.response.start":
+                    status[0] = message["status"]
+                    server_timing = request.server_timing()
+                    if server_timing:
+                        message = dict(message)
+                        message["headers"] = list(message.get("headers", [])) + [
+                            (b"server-timing", server_timing.encode("latin-1", "replace"))
+                        ]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                route = scope.get("route")
+                route_path = getattr(route, "path", None) or "non_routee"
+                self.registry.observe_request(route_path, scope.get("method", ""), status[0],
+                                              time.perf_counter() - start, request)
@@ -0,0 +1,309 @@
+import asyncio
+import multiprocessing
+import os
+import pickle
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Any, Hashable, Optional, Tuple, NamedTuple
+
+import numpy as np
+
+from services.encoding import EncodedColumn, EncodedDataset
+from services.flat_tree import FlatTree, FlatTreeBuilder
+from services.tree_budget import TreeBudget
+
+# Nombre de processus par défaut pour la construction parallèle des arbres (0 ou 1 = séquentiel)
+DEFAULT_TREE_WORKERS = int(os.getenv("TREE_PARALLEL_WORKERS", "0"))
+
+# Effectif à partir duquel un sous-arbre est confié au pool plutôt que construit sur place
+DEFAULT_SUBTREE_MIN_ROWS = int(os.getenv("TREE_SUBTREE_MIN_ROWS", "50000"))
+
+
+class SharedDatasetHandle(NamedTuple):
+    """
+    Description (légère, picklable) d'un jeu encodé publié en mémoire partagée.
+    """
+    name: str  # nom du segment de mémoire partagée
+    n_rows: int
+    columns: Tuple[Tuple[str, int, str, int], ...]  # (colonne, offset, dtype des codes, longueur)
+    rows: Optional[Tuple[int, str, int]]  # (offset, dtype, longueur) des lignes de l'échantillon
+    categories: Tuple[int, int]  # (offset, taille) des dictionnaires picklés
+
+
+def _aligned(offset: int, alignment: int = 64) -> int:
+    return (offset + alignment - 1) // alignment * alignment
+
+
+class SharedDataset:
+    """
+    Copie unique des codes des colonnes utiles (et des lignes de l'échantillon) dans
+    un segment de mémoire partagée. Les processus de calcul s'y attachent sans copie ;
+    seuls les dictionnaires de valeurs sont désérialisés, une fois par processus.
+    """
+
+    def __init__(self, df: EncodedDataset, column_names: List[str], rows: Optional[np.ndarray] = None):
+        categories_blob = pickle.dumps(
+            {name: (df[name].categories, df[name].dtype) for name in column_names},
+            protocol=pickle.HIGHEST_PROTOCOL
+        )
+        layout = []
+        offset = 0
+        for name in column_names:
+            codes = df[name].codes
+            offset = _aligned(offset)
+            layout.append((name, offset, codes.dtype.str, len(codes)))
+            offset += codes.nbytes
+        rows_layout = None
+        if rows is not None:
+            offset = _aligned(offset)
+            rows_layout = (offset, rows.dtype.str, len(rows))
+            offset += rows.nbytes
+        categories_offset = _aligned(offset)
+        size = categories_offset + len(categories_blob)
+
+        self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        buffer = self.shm.buf
+        for name, column_offset, dtype, length in layout:
+            np.ndarray(length, dtype=dtype, buffer=buffer, offset=column_offset)[:] = df[name].codes
+        if rows_layout is not None:
+            np.ndarray(rows_layout[2], dtype=rows_layout[1], buffer=buffer, offset=rows_layout[0])[:] = rows
+        buffer[categories_offset:categories_offset + len(categories_blob)] = categories_blob
+
+        self.handle = SharedDatasetHandle(
+            self.shm.name, len(df), tuple(layout), rows_layout,
+            (categories_offset, len(categories_blob))
+        )
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self) -> "SharedDataset":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# ----------------------------------------------------------------------------
+# Côté processus de calcul
+# ----------------------------------------------------------------------------
+
+# Dernier jeu attaché dans ce processus : (nom du segment, segment, jeu encodé, lignes)
+_attached: Optional[Tuple[str, shared_memory.SharedMemory, EncodedDataset, Optional[np.ndarray]]] = None
+
+
+def _open_shared_memory(name: str) -> shared_memory.SharedMemory:
+    if sys.version_info >= (3, 13):
+        # Seul le processus créateur suit (et détruit) le segment
+        return shared_memory.SharedMemory(name=name, track=False)
+    # Avant 3.13, l'attachement est enregistré auprès du resource_tracker. Les processus du
+    # pool partagent celui du parent, qui garde les noms dans un ensemble : ce double
+    # enregistrement est sans effet, et le unlink du parent le retire. Le désenregistrer ici
+    # retirerait au contraire l'enregistrement du parent lui-même.
+    return shared_memory.SharedMemory(name=name)
+
+
+def attach_dataset(handle: SharedDatasetHandle) -> Tuple[EncodedDataset, Optional[np.ndarray]]:
+    """
+    Reconstruit (sans copie des codes) le jeu encodé décrit par handle.
+    """
+    global _attached
+    if _attached is not None and _attached[0] == handle.name:
+        return _attached[2], _attached[3]
+    if _attached is not None:
+        # Libérer d'abord les vues numpy sur l'ancien segment, puis le fermer
+        previous_shm = _attached[1]
+        _attached = None
+        try:
+            previous_shm.close()
+        except BufferError:
+            pass
+
+    shm = _open_shared_memory(handle.name)
+    buffer = shm.buf
+    categories_offset, categories_size = handle.categories
+    categories = pickle.loads(buffer[categories_offset:categories_offset + categories_size])
+    columns = {}
+    for name, offset, dtype, length in handle.columns:
+        column_categories, column_dtype = categories[name]
+        codes = np.ndarray(length, dtype=dtype, buffer=buffer, offset=offset)
+        columns[name] = EncodedColumn(name, codes, column_categories, column_dtype)
+    rows = None
+    if handle.rows is not None:
+        offset, dtype, length = handle.rows
+        rows = np.ndarray(length, dtype=dtype, buffer=buffer, offset=offset)
+
+    df = EncodedDataset(columns, handle.n_rows)
+    _attached = (handle.name, shm, df, rows)
+    return df, rows
+
+
+def _build_tree_task(handle: SharedDatasetHandle, target_value: Any, target_var: str,
+                     explanatory_vars: List[str], min_population_threshold: Optional[int],
+                     cache_scope: Optional[Hashable] = None,
+                     budget: Optional[TreeBudget] = None) -> FlatTree:
+    from controllers.excel_controller import construct_flat_tree_for_value
+
+    df, rows = attach_dataset(handle)
+    return construct_flat_tree_for_value(
+        df, target_value, target_var, list(explanatory_vars),
+        min_population_threshold, rows, cache_scope=cache_scope, budget=budget
+    )
+
+
+def _build_subtree_task(handle: SharedDatasetHandle, target_value: Any, target_var: str,
+                        row_filter: Tuple[Tuple[str, int], ...], explanatory_vars: List[str],
+                        min_population_threshold: Optional[int],
+                        cache_scope: Optional[Hashable] = None) -> FlatTree:
+    from controllers.excel_controller import _construct_subtree, _rows_for_filter
+    from services import scoring
+
+    df, rows = attach_dataset(handle)
+    # Retrouver les lignes de la branche à partir des (variable, code) choisis depuis la racine
+    branch_rows = _rows_for_filter(df, rows, row_filter)
+    hit_mask = scoring.target_hit_mask(df[target_var], target_value)
+    # Sous-arbre renvoyé à plat (quelques tableaux numpy à transmettre au processus parent)
+    builder = FlatTreeBuilder()
+    _construct_subtree(
+        builder, builder.ROOT, df, branch_rows, hit_mask, list(explanatory_vars),
+        min_population_threshold, tuple(row_filter), cache_scope=cache_scope
+    )
+    return builder.finish()
+
+
+class SubtreeScheduler:
+    """
+    Ordonnanceur des sous-arbres d'un même arbre : les branches d'au moins min_rows
+    lignes sont envoyées au pool, les autres sont construites sur place par l'appelant.
+    Les sous-arbres envoyés sont greffés dans leur branche par gather(), si bien
+    que l'arbre final est identique à celui de la construction séquentielle.
+    Chaque processus a son propre stats_cache (conservé d'une requête à l'autre).
+    """
+
+    def __init__(self, pool: ProcessPoolExecutor, handle: SharedDatasetHandle, target_value: Any,
+                 target_var: str, min_population_threshold: Optional[int], min_rows: int,
+                 cache_scope: Optional[Hashable] = None):
+        self.pool = pool
+        self.handle = handle
+        self.target_value = target_value
+        self.target_var = target_var
+        self.min_population_threshold = min_population_threshold
+        self.min_rows = min_rows
+        self.cache_scope = cache_scope
+        self._pending = []
+
+    def accepts(self, n_rows: int) -> bool:
+        return n_rows >= self.min_rows
+
+    def submit(self, builder: FlatTreeBuilder, element: int, row_filter: Tuple[Tuple[str, int], ...],
+               explanatory_vars: List[str]):
+        future = self.pool.submit(
+            _build_subtree_task, self.handle, self.target_value, self.target_var,
+            row_filter, explanatory_vars, self.min_population_threshold, self.cache_scope
+        )
+        self._pending.append((builder, element, future))
+
+    async def gather(self):
+        pending, self._pending = self._pending, []
+        subtrees = await asyncio.gather(*[asyncio.wrap_future(future) for _, _, future in pending])
+        for (builder, element, _), subtree in zip(pending, subtrees):
+            builder.graft(element, subtree)
+
+
+# ----------------------------------------------------------------------------
+# Pool de processus
+# ----------------------------------------------------------------------------
+
+_pools: Dict[int, ProcessPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def _mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    # forkserver/spawn : pas de fork d'un processus serveur multi-thread
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def get_process_pool(n_workers: int) -> ProcessPoolExecutor:
+    """
+    Pool de processus partagé entre les requêtes (un par nombre de processus demandé).
+    """
+    with _pools_lock:
+        pool = _pools.get(n_workers)
+        if pool is None:
+            pool = ProcessPoolExecutor(max_workers=n_workers, mp_context=_mp_context())
+            _pools[n_workers] = pool
+        return pool
+
+
+def shutdown_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown(wait=True, cancel_futures=True)
+        _pools.clear()
+
+
+def resolve_worker_count(requested: Optional[int]) -> int:
+    """
+    Nombre de processus effectif : la valeur demandée, sinon TREE_PARALLEL_WORKERS,
+    bornée par le nombre de processeurs disponibles.
+    """
+    n_workers = DEFAULT_TREE_WORKERS if requested is None else requested
+    return max(0, min(int(n_workers), os.cpu_count() or 1))
+
+
+async def build_trees_in_pool(df: EncodedDataset, rows: Optional[np.ndarray],
+                              tasks: List[Tuple[str, Any]], explanatory_vars: List[str],
+                              min_population_threshold: Optional[int], n_workers: int,
+                              cache_scopes: Optional[List[Hashable]] = None,
+                              budget: Optional[TreeBudget] = None) -> List[FlatTree]:
+    """
+    Construit un arbre par tâche (variable cible, valeur cible) dans le pool de processus.
+    Le jeu filtré est publié une seule fois en mémoire partagée ; chaque tâche ne
+    transmet que son handle. Les arbres sont renvoyés dans l'ordre des tâches.
+    budget (échéance comprise) s'applique à chaque arbre.
+    """
+    if cache_scopes is None:
+        cache_scopes = [None] * len(tasks)
+    column_names = list(dict.fromkeys(list(explanatory_vars) + [target_var for target_var, _ in tasks]))
+    pool = get_process_pool(n_workers)
+    with SharedDataset(df, column_names, rows) as shared:
+        futures = [
+            pool.submit(_build_tree_task, shared.handle, target_value, target_var,
+                        explanatory_vars, min_population_threshold, cache_scope, budget)
+            for (target_var, target_value), cache_scope in zip(tasks, cache_scopes)
+        ]
+        return await asyncio.gather(*[asyncio.wrap_future(future) for future in futures])
+
+
+async def build_tree_with_subtree_pool(df: EncodedDataset, rows: Optional[np.ndarray], target_var: str,
+                                       target_value: Any, explanatory_vars: List[str],
+                                       min_population_threshold: Optional[int], n_workers: int,
+                                       subtree_min_rows: Optional[int] = None,
+                                       cache_scope: Optional[Hashable] = None) -> FlatTree:
+    """
+    Construit un seul arbre en répartissant ses sous-arbres volumineux sur le pool
+    (utile en mode "together", où il n'y a qu'un arbre). Les nœuds du haut de l'arbre
+    et les petites branches sont construits dans le processus courant pendant ce temps.
+    """
+    from controllers.excel_controller import _construct_subtree
+    from services import scoring
+
+    min_rows = DEFAULT_SUBTREE_MIN_ROWS if subtree_min_rows is None else subtree_min_rows
+    column_names = list(dict.fromkeys(list(explanatory_vars) + [target_var]))
+    pool = get_process_pool(n_workers)
+    with SharedDataset(df, column_names, rows) as shared:
+        scheduler = SubtreeScheduler(
+            pool, shared.handle, target_value, target_var, min_population_threshold, min_rows,
+            cache_scope
+        )
+        builder = FlatTreeBuilder()
+        _construct_subtree(
+            builder, builder.ROOT, df, rows, scoring.target_hit_mask(df[target_var], target_value),
+            list(explanatory_vars), min_population_threshold, scheduler=scheduler, cache_scope=cache_scope
+        )
+        await scheduler.gather()
+    return builder.finish()
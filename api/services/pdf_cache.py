@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Dict, Any, Callable, Optional
+
+from services.jobs import run_in_background
+from services.persistence import persistence
+from services.serialization import dumps
+
+# Répertoire des arbres enregistrés et des PDF déjà rendus (un couple de fichiers par arbre)
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join(tempfile.gettempdir(), "analyseur_pdfs"))
+
+# Taille maximale (Mo) du répertoire ; au-delà, les fichiers les moins récemment utilisés sont supprimés
+PDF_CACHE_MB = int(os.getenv("PDF_CACHE_MB", "256"))
+
+# Délai (secondes) pendant lequel un arbre enregistré mais jamais rendu en PDF est protégé de l'éviction
+PDF_UNRENDERED_TTL = int(os.getenv("PDF_UNRENDERED_TTL", "86400"))
+
+# Attente maximale (secondes) d'un arbre enregistré par un autre worker dont l'écriture est en cours
+PDF_REGISTER_WAIT_SECONDS = float(os.getenv("PDF_REGISTER_WAIT_SECONDS", "2"))
+
+_PDF_ID = re.compile(r"^[0-9a-f]{64}$")
+
+
+class PdfCache:
+    """
+    PDF des arbres rendus à la demande. register calcule l'empreinte SHA-256 de l'arbre
+    (pdf_id) et confie son écriture (disque, base) à l'arrière-plan : en attendant, l'arbre
+    est servi depuis la mémoire. render_path rend le PDF au premier accès et le garde sur
+    disque : deux constructions donnant le même arbre partagent le même fichier.
+    Avec une base configurée (services.persistence), les arbres enregistrés y sont aussi
+    écrits : leur PDF reste disponible après un redémarrage (disque vidé).
+    Un arbre dont le PDF n'a pas encore été rendu n'est pas évincé (pendant PDF_UNRENDERED_TTL).
+    """
+
+    def __init__(self, root_dir: str = PDF_CACHE_DIR, max_bytes: int = PDF_CACHE_MB * 1024 * 1024):
+        self.root_dir = root_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._render_locks: Dict[str, threading.Lock] = {}
+        # Arbres enregistrés dont l'écriture sur disque est en cours : pdf_id -> contenu JSON
+        self._pending: Dict[str, bytes] = {}
+
+    def _path(self, pdf_id: str, extension: str) -> str:
+        return os.path.join(self.root_dir, f"{pdf_id}.{extension}")
+
+    def _write(self, path: str, content: bytes):
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp_", dir=self.root_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def register(self, decision_trees: Dict[str, Any], filename: str) -> str:
+        """
+        pdf_id de l'arbre, calculé en mémoire ; l'écriture se fait hors du chemin de la requête.
+        """
+        content = dumps({"filename": filename, "decision_trees": decision_trees})
+        pdf_id = hashlib.sha256(content).hexdigest()
+        with self._lock:
+            if pdf_id in self._pending:
+                return pdf_id
+            self._pending[pdf_id] = content
+        run_in_background(self._store, pdf_id, filename, content)
+        return pdf_id
+
+    def _store(self, pdf_id: str, filename: str, content: bytes):
+        try:
+            os.makedirs(self.root_dir, exist_ok=True)
+            tree_path = self._path(pdf_id, "json")
+            if os.path.isfile(tree_path):
+                os.utime(tree_path)
+                return
+            self._write(tree_path, content)
+            self._evict(keep=pdf_id)
+            try:
+                persistence.save_tree(pdf_id, filename, content)
+            except Exception:
+                pass  # persistance facultative : l'arbre reste servi depuis le disque
+        except OSError:
+            pass  # disque indisponible : l'arbre sera perdu pour le PDF, pas pour la réponse
+        finally:
+            with self._lock:
+                self._pending.pop(pdf_id, None)
+
+    def _load_tree(self, pdf_id: str, tree_path: str) -> Optional[Dict[str, Any]]:
+        # Arbre enregistré : en mémoire (écriture en cours), sur disque, en base, ou bientôt
+        # sur disque (écriture en cours dans un autre worker)
+        with self._lock:
+            content = self._pending.get(pdf_id)
+        if content is not None:
+            return json.loads(content)
+        deadline = time.monotonic() + PDF_REGISTER_WAIT_SECONDS
+        while not os.path.isfile(tree_path) and not self._restore(pdf_id, tree_path):
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.05)
+        with open(tree_path, "rb") as f:
+            tree = json.load(f)
+        os.utime(tree_path)
+        return tree
+
+    def render_path(self, pdf_id: str, render: Callable[[Dict[str, Any], str], bytes]) -> Optional[str]:
+        """
+        Chemin du PDF de l'arbre pdf_id (rendu par render(decision_trees, filename) s'il
+        n'est pas encore en cache), ou None si l'arbre est inconnu.
+        """
+        if not _PDF_ID.match(pdf_id):
+            return None
+        with self._lock:
+            render_lock = self._render_locks.setdefault(pdf_id, threading.Lock())
+        # Un seul rendu à la fois par arbre : les requêtes simultanées attendent le même fichier
+        with render_lock:
+            try:
+                pdf_path = self._path(pdf_id, "pdf")
+                if os.path.isfile(pdf_path):
+                    os.utime(pdf_path)
+                    return pdf_path
+                tree = self._load_tree(pdf_id, self._path(pdf_id, "json"))
+                if tree is None:
+                    return None
+                os.makedirs(self.root_dir, exist_ok=True)
+                self._write(pdf_path, render(tree["decision_trees"], tree["filename"]))
+                self._evict(keep=pdf_id)
+                return pdf_path
+            finally:
+                with self._lock:
+                    self._render_locks.pop(pdf_id, None)
+
+    def _restore(self, pdf_id: str, tree_path: str) -> bool:
+        # Arbre absent du disque (évincé, ou disque vidé au redémarrage) : relu depuis la base
+        try:
+            content = persistence.load_tree(pdf_id)
+        except Exception:
+            return False
+        if content is None:
+            return False
+        os.makedirs(self.root_dir, exist_ok=True)
+        self._write(tree_path, content)
+        return True
+
+    def _evict(self, keep: str):
+        with self._lock:
+            names = set(os.listdir(self.root_dir))
+            entries = []
+            total = 0
+            now = time.time()
+            for name in names:
+                path = os.path.join(self.root_dir, name)
+                if name.startswith(".tmp_") or not os.path.isfile(path):
+                    continue
+                stat = os.stat(path)
+                total += stat.st_size
+                if name.startswith(keep):
+                    continue
+                pdf_id, extension = os.path.splitext(name)
+                if (extension == ".json" and f"{pdf_id}.pdf" not in names
+                        and now - stat.st_mtime < PDF_UNRENDERED_TTL):
+                    # PDF pas encore demandé : l'arbre reste disponible pour /excel/pdf/{pdf_id}
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+
+
+pdf_cache = PdfCache()
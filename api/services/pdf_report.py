@@ -0,0 +1,262 @@
+import io
+import os
+from typing import Dict, List, Any, Iterator, NamedTuple, Optional, Tuple
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+
+# Profondeur maximale détaillée dans le PDF (0 = pas de limite)
+PDF_MAX_DEPTH = int(os.getenv("PDF_MAX_DEPTH", "0"))
+
+# Nombre maximal de nœuds détaillés par page (0 = pas de limite, par défaut : le PDF est complet) ;
+# au-delà, les sous-arbres suivants de la page sont résumés en annexe
+PDF_MAX_NODES = int(os.getenv("PDF_MAX_NODES", "0"))
+
+# Nombre maximal de lignes de l'annexe des sous-arbres non détaillés
+PDF_MAX_APPENDIX_ROWS = int(os.getenv("PDF_MAX_APPENDIX_ROWS", "1000"))
+
+_PAGE_WIDTH, _PAGE_HEIGHT = A4
+_MARGIN = 36
+_ROW_HEIGHT = 11
+_INDENT = 10
+_MAX_INDENT = 160
+
+# Lignes d'un arbre gardées sur la même page que son titre (pas de titre seul en bas de page)
+_KEEP_WITH_HEADING_ROWS = 3
+
+# Colonnes chiffrées, alignées à droite : cas cibles, effectif de la branche, pourcentage
+_COLUMNS = (("Cas", _PAGE_WIDTH - _MARGIN - 100), ("Effectif", _PAGE_WIDTH - _MARGIN - 45),
+            ("%", _PAGE_WIDTH - _MARGIN))
+_LABEL_RIGHT = _COLUMNS[0][1] - 50
+
+
+class _Style(NamedTuple):
+    font: str
+    size: float
+    color: Any
+
+
+# Styles définis une seule fois pour tous les rendus
+_STYLES = {
+    "title": _Style("Helvetica-Bold", 16, colors.darkblue),
+    "heading": _Style("Helvetica-Bold", 12, colors.darkgreen),
+    "subheading": _Style("Helvetica-Bold", 10, colors.black),
+    "text": _Style("Helvetica", 9, colors.black),
+    "header": _Style("Helvetica-Bold", 7.5, colors.grey),
+    "node": _Style("Helvetica-Bold", 8, colors.darkblue),
+    "branch": _Style("Helvetica", 8, colors.black),
+    "leaf": _Style("Helvetica-Oblique", 7.5, colors.darkgreen),
+    "note": _Style("Helvetica-Oblique", 7.5, colors.grey),
+}
+
+# Hauteur de ligne par style (les titres prennent plus de place)
+_ROW_HEIGHTS = {"title": 26, "heading": 20, "subheading": 16, "text": 13}
+
+
+class _Row(NamedTuple):
+    style: str
+    level: int
+    label: str
+    cells: Tuple[str, ...] = ()
+
+
+class _Truncated(NamedTuple):
+    tree: str
+    path: str
+    hidden_nodes: int
+    total: Optional[int]
+
+
+def _count_nodes(node: Optional[Dict[str, Any]]) -> int:
+    count = 0
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if not current or current.get("type") != "node":
+            continue
+        count += 1
+        stack.extend(branch.get("subtree") for branch in current["branches"].values())
+    return count
+
+
+def _tree_rows(tree: Dict[str, Any], tree_label: str, max_depth: int, max_nodes: int,
+               writer: "_PageWriter", truncated: List[_Truncated]) -> Iterator[_Row]:
+    """
+    Lignes du tableau d'un arbre, en profondeur d'abord (pile explicite : coût linéaire
+    en nombre de nœuds), à écrire au fur et à mesure par writer. Les sous-arbres au-delà
+    de max_depth niveaux, ou une fois max_nodes nœuds affichés sur la page en cours, sont
+    remplacés par une ligne de renvoi et ajoutés à truncated.
+    """
+    # Éléments de la pile : une ligne déjà prête, ou (nœud, retrait, profondeur, chemin, effectif)
+    stack: List[Any] = [(tree, 0, 0, (), None)]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, _Row):
+            yield item
+            continue
+        node, level, depth, path, total = item
+        if node.get("type") != "node":
+            yield _Row("leaf", level, node.get("message", "Fin de branche"))
+            continue
+        if (max_depth and depth >= max_depth) or not writer.has_node_room(max_nodes):
+            hidden = _count_nodes(node)
+            truncated.append(_Truncated(tree_label, " > ".join(path), hidden, total))
+            yield _Row("note", level, f"... {hidden} nœud(s) non détaillé(s), voir l'annexe")
+            continue
+
+        yield _Row("node", level, f"{node['variable']}  (écart-type : {node['variance']})")
+        # Empilées à l'envers pour garder l'ordre des branches ; chaque branche est suivie de son sous-arbre
+        for branch_value, branch in reversed(list(node["branches"].items())):
+            subtree = branch.get("subtree")
+            if subtree:
+                stack.append((subtree, level + 2, depth + 1,
+                              path + (f"{node['variable']} = {branch_value}",), branch.get("total")))
+            stack.append(_Row("branch", level + 1, str(branch_value), (
+                str(branch.get("count", "")), str(branch.get("total", "")), str(branch.get("percentage", ""))
+            )))
+
+
+class _PageWriter:
+    """
+    Écrit les lignes directement sur le canevas, page après page : rien n'est gardé
+    en mémoire en dehors des pages déjà produites (pas de « story » reportlab).
+    """
+
+    def __init__(self, buffer: io.BytesIO, title: str):
+        self.canvas = canvas.Canvas(buffer, pagesize=A4, pageCompression=1)
+        self.canvas.setTitle(title)
+        self.page = 1
+        self.table_header = False
+        self.y = _PAGE_HEIGHT - _MARGIN
+        self.page_nodes = 0  # nœuds écrits sur la page en cours
+        self._style: Optional[_Style] = None
+
+    def _use(self, style: _Style):
+        # Police et couleur ne sont réémises que si elles changent
+        if style is not self._style:
+            self.canvas.setFont(style.font, style.size)
+            self.canvas.setFillColor(style.color)
+            self._style = style
+
+    def _fit(self, text: str, style: _Style, width: float) -> str:
+        if stringWidth(text, style.font, style.size) <= width:
+            return text
+        # Texte trop long : tronqué avec des points de suspension
+        width -= stringWidth("...", style.font, style.size)
+        while text:
+            excess = stringWidth(text, style.font, style.size) - width
+            if excess <= 0:
+                break
+            text = text[:-max(1, int(excess / style.size))]
+        return text + "..."
+
+    def _new_page(self):
+        self._use(_STYLES["note"])
+        self.canvas.drawRightString(_PAGE_WIDTH - _MARGIN, _MARGIN / 2, f"Page {self.page}")
+        self.canvas.showPage()
+        self._style = None
+        self.page += 1
+        self.y = _PAGE_HEIGHT - _MARGIN
+        self.page_nodes = 0
+        if self.table_header:
+            self._draw_table_header()
+
+    def _draw_table_header(self):
+        style = _STYLES["header"]
+        self._use(style)
+        self.canvas.drawString(_MARGIN, self.y - style.size, "Variable / valeur")
+        for name, right in _COLUMNS:
+            self.canvas.drawRightString(right, self.y - style.size, name)
+        self.canvas.setStrokeColor(colors.lightgrey)
+        self.canvas.line(_MARGIN, self.y - _ROW_HEIGHT - 1, _PAGE_WIDTH - _MARGIN, self.y - _ROW_HEIGHT - 1)
+        self.y -= _ROW_HEIGHT + 3
+
+    def has_node_room(self, max_nodes: int) -> bool:
+        # Le prochain nœud ouvre une nouvelle page : il dispose de tout le budget de celle-ci
+        return not max_nodes or self.page_nodes < max_nodes or self.y - _ROW_HEIGHT < _MARGIN
+
+    def keep_together(self, styles: Tuple[str, ...]):
+        """
+        Passe à la page suivante si les lignes de ces styles (un titre et le début de son
+        tableau) ne tiennent pas en bas de la page en cours.
+        """
+        height = sum(_ROW_HEIGHTS.get(style, _ROW_HEIGHT) for style in styles)
+        if self.y - height < _MARGIN and self.y < _PAGE_HEIGHT - _MARGIN:
+            self._new_page()
+
+    def start_table(self):
+        self.table_header = True
+        if self.y - 2 * _ROW_HEIGHT < _MARGIN:
+            self._new_page()
+        else:
+            self._draw_table_header()
+
+    def end_table(self):
+        self.table_header = False
+        self.y -= _ROW_HEIGHT / 2
+
+    def write(self, row: _Row):
+        height = _ROW_HEIGHTS.get(row.style, _ROW_HEIGHT)
+        if self.y - height < _MARGIN:
+            self._new_page()
+        style = _STYLES[row.style]
+        x = _MARGIN + min(row.level * _INDENT, _MAX_INDENT)
+        label_right = _LABEL_RIGHT if row.cells or self.table_header else _PAGE_WIDTH - _MARGIN
+        self._use(style)
+        baseline = self.y - style.size
+        self.canvas.drawString(x, baseline, self._fit(row.label, style, label_right - x))
+        for cell, (_, right) in zip(row.cells, _COLUMNS):
+            self.canvas.drawRightString(right, baseline, cell)
+        self.y -= height
+        self.page_nodes += row.style == "node"
+
+    def finish(self):
+        self._new_page()
+        self.canvas.save()
+
+
+def render_tree_report(decision_trees: Dict[str, Any], filename: str,
+                       max_depth: int = PDF_MAX_DEPTH, max_nodes: int = PDF_MAX_NODES,
+                       max_appendix_rows: int = PDF_MAX_APPENDIX_ROWS) -> bytes:
+    """
+    PDF des arbres de décision : un tableau compact par arbre (une ligne par nœud, par branche
+    et par feuille), écrit page après page. Temps de rendu linéaire en nombre de nœuds ;
+    au-delà de max_depth niveaux ou de max_nodes nœuds sur une page, les sous-arbres sont
+    résumés dans une annexe. Un titre reste sur la même page que les premières lignes de son tableau.
+    """
+    buffer = io.BytesIO()
+    writer = _PageWriter(buffer, f"Arbre de décision - {filename}")
+    writer.write(_Row("title", 0, "ARBRE DE DÉCISION - ANALYSE STATISTIQUE"))
+    writer.write(_Row("text", 0, f"Fichier : {filename}"))
+    writer.write(_Row("text", 0, "Les diagrammes visuels sont générés côté client avec Chart.js"))
+
+    # Titre(s), en-tête du tableau et premières lignes : gardés ensemble
+    table_start = ("header",) + ("branch",) * _KEEP_WITH_HEADING_ROWS
+    truncated: List[_Truncated] = []
+    for target_var, target_trees in decision_trees.items():
+        writer.keep_together(("heading", "subheading") + table_start)
+        writer.write(_Row("heading", 0, f"VARIABLE À EXPLIQUER : {target_var}"))
+        for target_value, tree in target_trees.items():
+            writer.keep_together(("subheading",) + table_start)
+            writer.write(_Row("subheading", 0, f"Valeur cible : {target_value}"))
+            writer.start_table()
+            for row in _tree_rows(tree, f"{target_var} = {target_value}", max_depth, max_nodes, writer, truncated):
+                writer.write(row)
+            writer.end_table()
+
+    if truncated:
+        writer.keep_together(("heading",) + table_start)
+        writer.write(_Row("heading", 0, "ANNEXE : SOUS-ARBRES NON DÉTAILLÉS"))
+        writer.start_table()
+        for item in truncated[:max_appendix_rows]:
+            writer.write(_Row("branch", 0, f"[{item.tree}] {item.path or 'racine'} : {item.hidden_nodes} nœud(s)", (
+                "", "" if item.total is None else str(item.total), ""
+            )))
+        writer.end_table()
+        if len(truncated) > max_appendix_rows:
+            writer.write(_Row("note", 0, f"... et {len(truncated) - max_appendix_rows} autre(s) sous-arbre(s)"))
+
+    writer.finish()
+    return buffer.getvalue()
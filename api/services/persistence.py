@@ -0,0 +1,215 @@
+import datetime
+import io
+import json
+import os
+import zlib
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import database
+from services.encoding import EncodedColumn, EncodedDataset
+from services.serialization import dumps
+
+# Niveau de compression (zlib) des colonnes et des arbres enregistrés en base
+PERSISTENCE_COMPRESSION_LEVEL = int(os.getenv("PERSISTENCE_COMPRESSION_LEVEL", "3"))
+
+
+def _pack_array(values: np.ndarray) -> bytes:
+    # Bloc .npy compressé, sans pickle : seuls les tableaux numériques ou de dates y passent
+    buffer = io.BytesIO()
+    np.save(buffer, np.ascontiguousarray(values), allow_pickle=False)
+    return zlib.compress(buffer.getvalue(), PERSISTENCE_COMPRESSION_LEVEL)
+
+
+def _unpack_array(blob: bytes) -> np.ndarray:
+    return np.load(io.BytesIO(zlib.decompress(blob)), allow_pickle=False)
+
+
+def _tag_value(value: Any) -> List[Any]:
+    # Valeur d'une colonne objet (classeur : textes, nombres, booléens, dates, heures) -> [type, valeur JSON]
+    if value is None:
+        return ["n"]
+    if isinstance(value, (bool, np.bool_)):
+        return ["b", bool(value)]
+    if isinstance(value, (int, np.integer)):
+        return ["i", int(value)]
+    if isinstance(value, (float, np.floating)):
+        return ["f", repr(float(value))]
+    if isinstance(value, str):
+        return ["s", value]
+    if isinstance(value, pd.Timestamp):
+        return ["T", value.isoformat()]
+    if isinstance(value, datetime.datetime):
+        return ["dt", value.isoformat()]
+    if isinstance(value, datetime.date):
+        return ["d", value.isoformat()]
+    if isinstance(value, datetime.time):
+        return ["h", value.isoformat()]
+    if isinstance(value, datetime.timedelta):
+        return ["td", [value.days, value.seconds, value.microseconds]]
+    raise TypeError(f"Valeur non enregistrable en base : {type(value).__name__}")
+
+
+_UNTAG = {
+    "n": lambda payload: None,
+    "b": bool,
+    "i": int,
+    "f": float,
+    "s": str,
+    "T": pd.Timestamp,
+    "dt": datetime.datetime.fromisoformat,
+    "d": datetime.date.fromisoformat,
+    "h": datetime.time.fromisoformat,
+    "td": lambda payload: datetime.timedelta(*payload),
+}
+
+
+def _pack_categories(categories: np.ndarray) -> bytes:
+    """
+    Valeurs distinctes d'une colonne : bloc .npy pour les types numériques et les dates,
+    liste JSON de valeurs typées pour les colonnes objet (jamais de pickle : la base peut
+    être partagée, une relecture ne doit pas pouvoir exécuter de code).
+    """
+    if categories.dtype != object:
+        return _pack_array(categories)
+    return zlib.compress(dumps([_tag_value(value) for value in categories.tolist()]), PERSISTENCE_COMPRESSION_LEVEL)
+
+
+def _unpack_categories(blob: bytes) -> np.ndarray:
+    content = zlib.decompress(blob)
+    if content.startswith(b"\x93NUMPY"):
+        return np.load(io.BytesIO(content), allow_pickle=False)
+    values = [_UNTAG[tagged[0]](*tagged[1:]) for tagged in json.loads(content)]
+    categories = np.empty(len(values), dtype=object)
+    categories[:] = values
+    return categories
+
+
+class DatasetPersistence:
+    """
+    Persistance en base (voir database.DATABASE_URL) des jeux encodés et des arbres enregistrés
+    pour le rendu PDF : le dataset_store et le pdf_cache s'y rechargent après un redémarrage
+    (disque local vidé). Un jeu est écrit colonne par colonne, en une seule insertion groupée :
+    codes entiers en blocs .npy compressés, valeurs distinctes en .npy ou en JSON typé (sans
+    pickle), sans passer par les lignes.
+    Sans DATABASE_URL, toutes les opérations sont sans effet (et SQLAlchemy n'est pas importé).
+    """
+
+    @property
+    def enabled(self) -> bool:
+        return database.database_enabled()
+
+    # ------------------------------------------------------------------
+    # Jeux de données
+    # ------------------------------------------------------------------
+
+    def save_dataset(self, dataset_id: str, df: EncodedDataset, filename: Optional[str] = None):
+        if not self.enabled:
+            return
+        from sqlalchemy import insert, select
+        from sqlalchemy.exc import IntegrityError
+        from models.file import File, FileColumn
+
+        try:
+            with database.session_scope() as session:
+                if session.scalar(select(File.id).where(File.dataset_id == dataset_id)) is not None:
+                    return
+                file = File(dataset_id=dataset_id, filename=filename or dataset_id, n_rows=len(df))
+                session.add(file)
+                session.flush()
+                session.execute(insert(FileColumn), [
+                    {
+                        "file_id": file.id,
+                        "position": position,
+                        "name": dumps(column_name).decode("utf-8"),
+                        "dtype": column.dtype,
+                        "codes": _pack_array(column.codes),
+                        "categories": _pack_categories(column.categories)
+                    }
+                    for position, (column_name, column) in enumerate(df.columns.items())
+                ])
+        except IntegrityError:
+            # Même jeu enregistré entre-temps par un autre worker
+            pass
+
+    def load_dataset(self, dataset_id: str) -> Optional[Tuple[EncodedDataset, str]]:
+        """
+        (jeu encodé, nom du fichier) enregistré sous dataset_id, ou None.
+        """
+        if not self.enabled:
+            return None
+        from sqlalchemy import select
+        from models.file import File, FileColumn
+
+        with database.session_scope() as session:
+            file = session.scalar(select(File).where(File.dataset_id == dataset_id))
+            if file is None:
+                return None
+            columns = {}
+            rows = session.execute(
+                select(FileColumn.name, FileColumn.dtype, FileColumn.codes, FileColumn.categories)
+                .where(FileColumn.file_id == file.id)
+                .order_by(FileColumn.position)
+            )
+            for name, dtype, codes, categories in rows:
+                column_name = json.loads(name)
+                columns[column_name] = EncodedColumn(column_name, _unpack_array(codes), _unpack_categories(categories), dtype)
+            return EncodedDataset(columns, file.n_rows), file.filename
+
+    def dataset_ids(self, filename: str) -> List[str]:
+        # Jeux importés sous ce nom de fichier, du plus ancien au plus récent
+        if not self.enabled:
+            return []
+        from sqlalchemy import select
+        from models.file import File
+
+        with database.session_scope() as session:
+            return list(session.scalars(
+                select(File.dataset_id).where(File.filename == filename).order_by(File.id)
+            ))
+
+    def delete_dataset(self, dataset_id: str):
+        if not self.enabled:
+            return
+        from sqlalchemy import delete, select
+        from models.file import File, FileColumn
+
+        with database.session_scope() as session:
+            file_id = session.scalar(select(File.id).where(File.dataset_id == dataset_id))
+            if file_id is not None:
+                session.execute(delete(FileColumn).where(FileColumn.file_id == file_id))
+                session.execute(delete(File).where(File.id == file_id))
+
+    # ------------------------------------------------------------------
+    # Arbres (contenu enregistré par le pdf_cache)
+    # ------------------------------------------------------------------
+
+    def save_tree(self, tree_id: str, filename: str, content: bytes):
+        if not self.enabled:
+            return
+        from sqlalchemy import select
+        from sqlalchemy.exc import IntegrityError
+        from models.file import DecisionTree
+
+        try:
+            with database.session_scope() as session:
+                if session.scalar(select(DecisionTree.tree_id).where(DecisionTree.tree_id == tree_id)) is None:
+                    session.add(DecisionTree(tree_id=tree_id, filename=filename,
+                                             content=zlib.compress(content, PERSISTENCE_COMPRESSION_LEVEL)))
+        except IntegrityError:
+            pass
+
+    def load_tree(self, tree_id: str) -> Optional[bytes]:
+        if not self.enabled:
+            return None
+        from sqlalchemy import select
+        from models.file import DecisionTree
+
+        with database.session_scope() as session:
+            content = session.scalar(select(DecisionTree.content).where(DecisionTree.tree_id == tree_id))
+        return None if content is None else zlib.decompress(content)
+
+
+persistence = DatasetPersistence()
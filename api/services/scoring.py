@@ -0,0 +1,90 @@
+import numpy as np
+from typing import Dict, List, Any, NamedTuple, Optional, Tuple
+
+from services.encoding import BLOCK_ROWS, EncodedColumn, first_appearance
+
+
+class ContingencyTable(NamedTuple):
+    """
+    Table de contingence d'une variable explicative face à une valeur cible.
+    Les valeurs sont dans l'ordre de première apparition (comme Series.unique()).
+    """
+    codes: np.ndarray   # codes des valeurs distinctes présentes
+    values: np.ndarray  # valeurs distinctes non nulles de la variable explicative
+    totals: np.ndarray  # effectif total de chaque valeur
+    hits: np.ndarray    # effectif de chaque valeur ayant la valeur cible
+
+
+def target_hit_mask(target: EncodedColumn, target_value: Any,
+                    rows: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Masque booléen des lignes dont la variable cible vaut target_value (NaN exclus).
+    """
+    return target.mask_for_codes(target.equal_codes(target_value), rows)
+
+
+def build_contingency_table(column: EncodedColumn, hit_mask: np.ndarray,
+                            rows: Optional[np.ndarray] = None) -> ContingencyTable:
+    """
+    Calcule en une seule passe (bincount sur les codes) les effectifs totaux et les
+    effectifs cibles de chaque valeur de la variable explicative.
+    """
+    codes = column.codes if rows is None else column.codes[rows]
+    n_values = len(column.categories)
+    n_slots = 2 * (n_values + 1)
+    counts = np.zeros(n_slots, dtype=np.int64)
+    for start in range(0, len(codes), BLOCK_ROWS):
+        # Clé (code + 1) * 2 + cas cible : les valeurs manquantes (code -1) tombent dans les cases 0 et 1
+        keys = codes[start:start + BLOCK_ROWS].astype(np.intp)
+        keys += 1
+        keys *= 2
+        keys += hit_mask[start:start + BLOCK_ROWS]
+        counts += np.bincount(keys, minlength=n_slots)
+    counts = counts.reshape(n_values + 1, 2)[1:]
+    totals = counts.sum(axis=1)
+    hits = counts[:, 1]
+
+    # Valeurs présentes dans l'ordre de première apparition dans ces lignes
+    order = first_appearance(codes)
+    return ContingencyTable(order, column.categories[order], totals[order], hits[order])
+
+
+def percentage_std(table: ContingencyTable) -> float:
+    """
+    Écart-type des pourcentages de cas cibles par valeur explicative.
+    Renvoie 0.0 s'il n'y a aucun cas cible ou moins de deux valeurs.
+    """
+    if table.hits.sum() == 0:
+        return 0.0
+    if len(table.totals) <= 1:
+        return 0.0
+    percentages = table.hits / table.totals * 100
+    return float(np.std(percentages))
+
+
+def branch_rows(table: ContingencyTable) -> List[Tuple[int, str, int, int, float]]:
+    """
+    Branches de la table, dans son ordre : (code, valeur en texte, cas cibles,
+    effectif total, pourcentage de cas cibles arrondi à 2 décimales).
+    """
+    return [
+        (code, str(value), int(hit), int(total), round((hit / total) * 100, 2))
+        for code, value, total, hit in zip(table.codes.tolist(), table.values,
+                                           table.totals.tolist(), table.hits.tolist())
+    ]
+
+
+def branch_statistics(table: ContingencyTable) -> Dict[str, Dict[str, Any]]:
+    """
+    Construit le dictionnaire des branches (comptages et pourcentages) à partir
+    de la table de contingence.
+    """
+    branches = {}
+    for _, value, hit, total, percentage in branch_rows(table):
+        branches[value] = {
+            "count": hit,       # cas cibles
+            "total": total,     # effectif total de la branche
+            "percentage": percentage,
+            "subtree": None  # Sera rempli récursivement
+        }
+    return branches
@@ -0,0 +1,109 @@
+import datetime
+import json
+import math
+from typing import Dict, List, Any
+
+import numpy as np
+import pandas as pd
+from fastapi.responses import JSONResponse
+
+from services.metrics import metrics
+
+try:
+    import orjson
+except ImportError:  # repli sur le module json standard
+    orjson = None
+
+
+def json_value(value: Any, native: bool = False) -> Any:
+    """
+    Valeur JSON native : None pour une valeur manquante (ou non finie), int/float pour
+    un nombre (numpy ou Python), texte pour tout le reste (booléens et dates compris).
+    native : booléens gardés tels quels et dates au format ISO, comme jsonable_encoder
+    (lignes d'un tableau, voir frame_records).
+    """
+    if value is None or pd.isna(value):
+        return None
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value) if native else str(value)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        return float(value) if math.isfinite(value) else None
+    if native:
+        if isinstance(value, (datetime.date, datetime.time)):
+            return value.isoformat()
+        if isinstance(value, datetime.timedelta):
+            return value.total_seconds()
+    return str(value)
+
+
+def to_json_list(values: Any, native: bool = False) -> List[Any]:
+    """
+    Convertit en bloc un tableau numpy (ou une série / une liste) en liste JSON native,
+    avec la même sémantique que json_value appliquée à chaque élément. Les colonnes
+    numériques et textuelles sont converties par un seul tolist() ; seules les autres
+    (dates, colonnes mixtes) passent par la conversion élément par élément.
+    """
+    if isinstance(values, pd.Series):
+        values = values.to_numpy()
+    values = np.asarray(values) if not isinstance(values, np.ndarray) else values
+    kind = values.dtype.kind
+
+    if kind in "iu":
+        return values.tolist()
+    if kind == "f":
+        converted = values.tolist()
+        for i in np.flatnonzero(~np.isfinite(values)).tolist():
+            converted[i] = None
+        return converted
+    if kind == "b":
+        return values.tolist() if native else np.where(values, "True", "False").tolist()
+    if kind in "OSU" and pd.api.types.infer_dtype(values, skipna=True) in ("string", "empty"):
+        converted = values.tolist()
+        if kind == "O":
+            for i in np.flatnonzero(pd.isna(values)).tolist():
+                converted[i] = None
+        return converted
+    # Dates, durées, colonnes mixtes : les valeurs pandas (Timestamp...) gardent leur texte habituel
+    # (ou leur forme ISO en mode native)
+    return [json_value(value, native) for value in pd.Series(values, dtype=values.dtype)]
+
+
+def frame_records(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Équivalent JSON natif de jsonable_encoder(frame.to_dict(orient="records")), converti
+    colonne par colonne (valeurs manquantes à None).
+    """
+    names = [str(name) for name in frame.columns]
+    columns = [to_json_list(frame.iloc[:, i], native=True) for i in range(frame.shape[1])]
+    return [dict(zip(names, row)) for row in zip(*columns)] if columns else [{} for _ in range(len(frame))]
+
+
+def _json_default(value: Any) -> Any:
+    # Repli du module json standard pour les objets numpy restants
+    if isinstance(value, np.ndarray):
+        return to_json_list(value)
+    if isinstance(value, np.generic):
+        return json_value(value)
+    raise TypeError(f"Type non sérialisable en JSON : {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+                      default=_json_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Réponse JSON déjà sérialisée (orjson si disponible). Renvoyée directement par une route,
+    elle évite le second parcours du résultat par jsonable_encoder de FastAPI : le contenu
+    doit donc déjà être composé de types JSON natifs (voir to_json_list).
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        with metrics.span("json_encoding"):
+            return dumps(content)
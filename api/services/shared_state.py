@@ -0,0 +1,63 @@
+import json
+import os
+import socket
+import tempfile
+import time
+from typing import Dict, Any, Optional
+
+# Identité du processus courant, enregistrée avec les états partagés entre workers
+_HOSTNAME = socket.gethostname()
+
+
+def write_atomic(path: str, content: bytes):
+    """
+    Écrit content dans path d'un seul coup (fichier temporaire puis os.replace) :
+    un autre processus lit l'ancienne ou la nouvelle version, jamais un fichier partiel.
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp_", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def write_record(path: str, record: Dict[str, Any]):
+    """
+    Enregistre record (JSON) en y ajoutant le processus propriétaire et l'heure d'écriture.
+    """
+    from services.serialization import dumps  # numpy et pandas : pas à l'import du module
+
+    write_atomic(path, dumps({**record, "owner": {"host": _HOSTNAME, "pid": os.getpid()},
+                              "updated_at": time.time()}))
+
+
+def read_record(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "rb") as f:
+            return json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def owner_alive(record: Dict[str, Any], stale_seconds: float) -> bool:
+    """
+    Le processus qui a écrit record travaille-t-il encore ? Faux si ce processus (sur la
+    même machine) n'existe plus, ou sans nouvelle écriture depuis stale_seconds.
+    """
+    if time.time() - record.get("updated_at", 0) > stale_seconds:
+        return False
+    owner = record.get("owner") or {}
+    if owner.get("host") != _HOSTNAME or owner.get("pid") == os.getpid():
+        return True
+    try:
+        os.kill(owner["pid"], 0)
+    except ProcessLookupError:
+        return False
+    except (OSError, KeyError, TypeError):
+        pass
+    return True
@@ -0,0 +1,93 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Hashable, Optional, Tuple
+
+from services.scoring import ContingencyTable
+
+# Taille maximale (Mo) du cache des tables de contingence ; au-delà, les moins récemment utilisées sont oubliées
+STATS_CACHE_MB = int(os.getenv("STATS_CACHE_MB", "64"))
+
+# Surcoût approximatif d'une entrée (clé, tuple, objets numpy) en plus des tableaux eux-mêmes
+_ENTRY_OVERHEAD_BYTES = 512
+
+
+def node_key(scope: Hashable, row_filter: Tuple[Tuple[str, int], ...]) -> Hashable:
+    """
+    Clé d'un nœud : le périmètre de l'arbre (jeu, échantillon, cible) et l'ensemble des
+    (variable, code) qui définissent ses lignes. L'ordre des choix depuis la racine
+    n'intervient pas : deux chemins menant aux mêmes lignes partagent leurs tables.
+    """
+    return scope, frozenset(row_filter)
+
+
+def _table_nbytes(table: ContingencyTable) -> int:
+    values_bytes = table.values.nbytes
+    if table.values.dtype == object:
+        values_bytes += sum(len(str(value)) + 49 for value in table.values.tolist())
+    return table.codes.nbytes + table.totals.nbytes + table.hits.nbytes + values_bytes + _ENTRY_OVERHEAD_BYTES
+
+
+class StatsCache:
+    """
+    Mémo des tables de contingence par (nœud, variable explicative), partagé entre les
+    requêtes : reconstruire un arbre après avoir changé le seuil d'effectif ou la liste
+    des variables réutilise les tables déjà calculées. Éviction LRU bornée à max_bytes.
+    """
+
+    def __init__(self, max_bytes: int = STATS_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._tables: "OrderedDict[Hashable, Tuple[ContingencyTable, int]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[ContingencyTable]:
+        with self._lock:
+            entry = self._tables.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._tables.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, table: ContingencyTable):
+        for array in table:
+            # Les tables sont partagées entre requêtes : lecture seule
+            array.flags.writeable = False
+        size = _table_nbytes(table)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._tables.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._tables[key] = (table, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._tables.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
+            self._bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._tables),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None
+            }
+
+
+stats_cache = StatsCache()
@@ -0,0 +1,64 @@
+import os
+import time
+from typing import Dict, List, Any, Optional
+
+# Budgets par défaut d'une construction d'arbre (0 = pas de limite), remplacés par ceux de la requête
+TREE_MAX_DEPTH = int(os.getenv("TREE_MAX_DEPTH", "0"))  # niveaux de nœuds de découpage
+TREE_MAX_NODES = int(os.getenv("TREE_MAX_NODES", "0"))  # nœuds de découpage par arbre
+TREE_MAX_SECONDS = float(os.getenv("TREE_MAX_SECONDS", "0"))  # temps de calcul de la requête
+
+# Préfixe des feuilles posées là où un budget a interrompu la construction
+TRUNCATION_PREFIX = "[LIMITE]"
+
+
+class TreeBudget:
+    """
+    Budgets d'une construction : profondeur et nombre de nœuds de découpage par arbre,
+    échéance (horloge murale, partagée par tous les arbres de la requête et valable
+    dans les processus du pool). Léger et picklable.
+    max_nodes est compté arbre par arbre, sans compteur commun : une forêt de K arbres
+    (une valeur cible chacun) peut compter jusqu'à K * max_nodes nœuds. Pour borner le
+    coût total d'une requête, utiliser max_seconds.
+    """
+    __slots__ = ("max_depth", "max_nodes", "max_seconds", "deadline")
+
+    def __init__(self, max_depth: int = 0, max_nodes: int = 0, max_seconds: float = 0):
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.max_seconds = max_seconds
+        self.deadline = time.time() + max_seconds if max_seconds > 0 else None
+
+    @classmethod
+    def from_request(cls, max_depth: Optional[int] = None, max_nodes: Optional[int] = None,
+                     max_seconds: Optional[float] = None) -> "TreeBudget":
+        max_depth = TREE_MAX_DEPTH if max_depth is None else max_depth
+        max_nodes = TREE_MAX_NODES if max_nodes is None else max_nodes
+        max_seconds = TREE_MAX_SECONDS if max_seconds is None else max_seconds
+        return cls(max(0, int(max_depth or 0)), max(0, int(max_nodes or 0)), max(0.0, float(max_seconds or 0)))
+
+    @property
+    def limited(self) -> bool:
+        return bool(self.max_depth or self.max_nodes or self.deadline is not None)
+
+    def stop_message(self, depth: int, n_nodes: int) -> Optional[str]:
+        """
+        Message de la feuille de troncature si le nœud à la profondeur depth ne peut pas
+        être développé (n_nodes nœuds déjà construits dans l'arbre), sinon None.
+        """
+        if self.deadline is not None and time.time() >= self.deadline:
+            return f"{TRUNCATION_PREFIX} Construction interrompue - Temps de calcul maximal atteint"
+        if self.max_nodes and n_nodes >= self.max_nodes:
+            return f"{TRUNCATION_PREFIX} Construction interrompue - Nombre maximal de nœuds atteint ({self.max_nodes})"
+        if self.max_depth and depth >= self.max_depth:
+            return f"{TRUNCATION_PREFIX} Construction interrompue - Profondeur maximale atteinte ({self.max_depth})"
+        return None
+
+    def to_dict(self, truncations: List[str]) -> Dict[str, Any]:
+        # Résumé renvoyé avec les arbres : limites appliquées (None = aucune) et causes des troncatures
+        return {
+            "max_depth": self.max_depth or None,
+            "max_nodes": self.max_nodes or None,
+            "max_seconds": self.max_seconds or None,
+            "truncated": bool(truncations),
+            "truncations": sorted(set(truncations))
+        }
@@ -0,0 +1,51 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Hashable, Optional, Tuple
+
+from services.flat_tree import FlatTree
+
+# Nombre d'arbres complets conservés (un par configuration : jeu, échantillon, cible, variables)
+TREE_CACHE_ENTRIES = int(os.getenv("TREE_CACHE_ENTRIES", "32"))
+
+
+class TreeCache:
+    """
+    Dernier arbre construit pour chaque configuration, avec le seuil d'effectif utilisé.
+    Un changement de seuil est alors servi en élaguant cet arbre ou en ne développant
+    que les branches qu'il avait arrêtées. Éviction LRU au-delà de max_entries arbres.
+    Les arbres sont conservés à plat (quelques tableaux numpy par arbre, voir services.flat_tree).
+    """
+
+    def __init__(self, max_entries: int = TREE_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._trees: "OrderedDict[Hashable, Tuple[FlatTree, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(cache_scope: Hashable, explanatory_vars: List[str]) -> Hashable:
+        # L'ordre des variables compte : il départage les variables d'écart-type égal
+        return cache_scope, tuple(explanatory_vars)
+
+    def get(self, key: Hashable) -> Optional[Tuple[FlatTree, int]]:
+        with self._lock:
+            entry = self._trees.get(key)
+            if entry is not None:
+                self._trees.move_to_end(key)
+            return entry
+
+    def put(self, key: Hashable, tree: FlatTree, threshold: int):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._trees[key] = (tree, threshold)
+            self._trees.move_to_end(key)
+            while len(self._trees) > self.max_entries:
+                self._trees.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._trees.clear()
+
+
+tree_cache = TreeCache()
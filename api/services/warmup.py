@@ -0,0 +1,104 @@
+import importlib
+import os
+import threading
+import time
+from types import ModuleType
+from typing import Dict, Any, Optional
+
+# Préchauffage en arrière-plan au démarrage du serveur (0 = premier appel à froid)
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") not in ("0", "false", "False")
+
+
+class LazyModule:
+    """
+    Module importé au premier accès à l'un de ses attributs : le serveur répond à /health
+    sans attendre pandas, numpy ni le contrôleur. L'import reste protégé par le verrou
+    d'import de Python (deux threads n'exécutent jamais deux fois le module).
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[ModuleType] = None
+
+    def __getattr__(self, attribute: str) -> Any:
+        module = self._module
+        if module is None:
+            module = self._module = importlib.import_module(self._name)
+        return getattr(module, attribute)
+
+
+def _warm_pandas():
+    # Premiers appels coûteux (chargement différé des extensions de pandas) : typage des
+    # cellules comme read_excel, encodage d'une colonne et sérialisation JSON
+    import pandas as pd
+
+    from services.encoding import encode_dataframe
+    from services.ingestion import _parse_like_read_excel
+    from services.serialization import dumps, frame_records
+
+    frame = _parse_like_read_excel([["a", "b"], [1, "x"], [2.5, None]])
+    encode_dataframe(frame)
+    dumps(frame_records(pd.DataFrame({"a": [1, 2], "b": ["x", None]})))
+
+
+# Étapes du préchauffage, dans l'ordre (le rendu PDF et la base restent chargés au premier usage)
+_STEPS = (
+    ("controller", lambda: importlib.import_module("controllers.excel_controller")),
+    ("openpyxl", lambda: importlib.import_module("openpyxl")),
+    ("pandas", _warm_pandas),
+)
+
+
+class Warmup:
+    """
+    Préchauffage : imports lourds et premiers appels faits une fois, dans un thread,
+    pendant que le serveur répond déjà à /health. /ready en rend compte.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._started = False
+        self._done = threading.Event()
+        self.steps: Dict[str, float] = {}
+        self.error: Optional[str] = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, daemon=True, name="warmup")
+                self._thread.start()
+
+    def run(self):
+        """
+        Exécute le préchauffage dans le thread courant (utilisable directement, par exemple
+        depuis un hook de démarrage de gunicorn) ; les appels suivants en attendent la fin.
+        """
+        with self._lock:
+            started, self._started = self._started, True
+        if started:
+            self._done.wait()
+            return
+        try:
+            for name, step in _STEPS:
+                start = time.perf_counter()
+                step()
+                self.steps[name] = round(time.perf_counter() - start, 4)
+        except Exception as e:
+            # Un préchauffage raté n'empêche pas de servir : le premier appel refera l'import
+            self.error = str(e)
+        finally:
+            self._done.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set()
+
+    def status(self) -> Dict[str, Any]:
+        return {"ready": self.ready, "steps": dict(self.steps), "error": self.error}
+
+
+warmup = Warmup()
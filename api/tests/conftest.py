@@ -0,0 +1,16 @@
+import os
+import sys
+import tempfile
+
+# Les tests se lancent depuis le dossier api/ (python -m pytest) : modules importés comme par uvicorn
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if API_DIR not in sys.path:
+    sys.path.insert(0, API_DIR)
+
+# Répertoires de travail isolés, fixés avant le premier import des services ; pas de base de données
+_WORK_DIR = tempfile.mkdtemp(prefix="api_tests_")
+os.environ["DATASET_STORE_DIR"] = os.path.join(_WORK_DIR, "store")
+os.environ["PDF_CACHE_DIR"] = os.path.join(_WORK_DIR, "pdfs")
+os.environ["JOB_STORE_DIR"] = os.path.join(_WORK_DIR, "jobs")
+os.environ.setdefault("DATABASE_URL", "")
+os.environ.setdefault("WARMUP_ON_STARTUP", "0")
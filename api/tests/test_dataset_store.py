@@ -0,0 +1,47 @@
+import numpy as np
+
+from benchmarks.synthetic import make_accident_frame
+from services.dataset_store import DatasetStore
+from services.encoding import encode_dataframe
+
+
+def _dataset(seed: int):
+    return encode_dataframe(make_accident_frame(20_000, 4, 3, seed=seed))
+
+
+def test_least_recently_used_datasets_are_unloaded(tmp_path):
+    datasets = {name: _dataset(seed) for seed, name in enumerate(["a", "b", "c"])}
+    # Budget pour deux jeux : le troisième chargé décharge le moins récemment utilisé
+    store = DatasetStore(root_dir=str(tmp_path), budget_bytes=int(datasets["a"].nbytes * 2.5))
+    store.put("a", datasets["a"])
+    loaded_b = store.put("b", datasets["b"])
+    assert store.stats()["loaded_datasets"] == 2
+
+    loaded_a = store.get("a")
+    store.put("c", datasets["c"])
+    stats = store.stats()
+    assert stats["loaded_datasets"] == 2
+    assert stats["loaded_bytes"] <= stats["budget_bytes"]
+
+    # "a" (utilisé récemment) est resté en mémoire, "b" a été déchargé puis est relu du disque
+    assert store.get("a") is loaded_a
+    reloaded = store.get("b")
+    assert reloaded is not loaded_b
+    for name in datasets["b"].column_names:
+        assert np.array_equal(reloaded[name].codes, datasets["b"][name].codes)
+
+
+def test_reloaded_dataset_is_memory_mapped(tmp_path):
+    original = _dataset(0)
+    DatasetStore(root_dir=str(tmp_path)).put("jeu", original, "jeu.xlsx")
+
+    # Autre instance (autre worker) sur le même répertoire : relecture depuis le disque
+    reloaded = DatasetStore(root_dir=str(tmp_path)).get("jeu")
+    assert reloaded is not None and len(reloaded) == len(original)
+    for name in original.column_names:
+        codes = reloaded[name].codes
+        assert isinstance(codes.base, np.memmap)
+        assert not codes.flags.writeable
+        assert np.array_equal(codes, original[name].codes)
+        assert reloaded[name].categories.tolist() == original[name].categories.tolist()
+    assert DatasetStore(root_dir=str(tmp_path)).get("inconnu") is None
@@ -0,0 +1,70 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import make_accident_frame
+from services.bitmap_index import BitmapIndex
+from services.column_index import ColumnIndex
+from services.encoding import EncodedColumn, encode_dataframe
+
+
+@pytest.mark.parametrize("series", [
+    pd.Series(["Lyon", None, "Paris", "Lyon", np.nan, "Nice"], dtype=object),
+    pd.Series([1.5, np.nan, 2.0, 1.5, np.nan]),
+    pd.Series([1, "1", 2.5, None, "texte", datetime.time(8, 30), 1], dtype=object),
+    pd.Series([True, False, True]),
+    pd.Series([], dtype=object),
+], ids=["texte", "flottants", "mixte", "booleens", "vide"])
+def test_encoded_column_round_trip(series):
+    column = EncodedColumn.from_series(series, "colonne")
+    decoded = column.to_series()
+
+    assert len(column) == len(series)
+    assert (column.codes < 0).tolist() == series.isna().tolist()
+    assert decoded.dtype == series.dtype
+    assert decoded.equals(series.rename("colonne"))
+    # 1 et "1" restent deux valeurs distinctes
+    assert len(column.categories) == series.dropna().map(lambda value: (type(value), value)).nunique()
+
+
+def test_encoded_dates_keep_their_values():
+    series = pd.to_datetime(pd.Series(["2020-01-01", None, "2021-06-15 08:30:00", "2020-01-01"]), format="ISO8601")
+    column = EncodedColumn.from_series(series, "date")
+    assert column.codes.tolist() == [0, -1, 1, 0]
+    assert pd.to_datetime(column.to_series()).equals(series.rename("date"))
+
+
+def test_bitmap_index_matches_mask_filtering():
+    df = encode_dataframe(make_accident_frame(70_000, 3, 5, dtypes=["str", "int", "mixed"]))
+    index = BitmapIndex.build(df)
+    filters = {"var0": ["var0_mod1", "var0_mod3"], "var1": [0.0, 2.0, 4.0], "annee": [2016, 2020]}
+
+    expected = np.ones(len(df), dtype=bool)
+    codes = []
+    for column_name, values in filters.items():
+        column = df[column_name]
+        column_codes = column.isin_codes(values)
+        expected &= column.mask_for_codes(column_codes)
+        codes.append((column_name, column_codes))
+
+    assert np.array_equal(index.to_mask(index.select(codes)), expected)
+    assert np.array_equal(index.to_rows(index.select(codes[:1])), np.flatnonzero(df["var0"].mask_for_codes(codes[0][1])))
+    assert not index.to_mask(index.select([("var0", np.empty(0, dtype=np.intp))])).any()
+    assert index.select([]) is None
+
+
+def test_column_index_lookup_by_prefix_and_top():
+    series = pd.Series(["Lyon"] * 5 + ["lille"] * 3 + ["Paris"] * 7 + ["Lens"] + [None] * 2, dtype=object)
+    stats = ColumnIndex.build(encode_dataframe(pd.DataFrame({"commune": series})))["commune"]
+
+    assert stats.null_count == 2
+    assert stats.lookup() == {"values": ["Lyon", "lille", "Paris", "Lens"], "counts": [5, 3, 7, 1], "matching": 4}
+    # Préfixe sans tenir compte de la casse, par ordre alphabétique
+    assert stats.lookup(search="L")["values"] == ["Lens", "lille", "Lyon"]
+    assert stats.lookup(search="li") == {"values": ["lille"], "counts": [3], "matching": 1}
+    # Les plus fréquentes, avec ou sans préfixe
+    assert stats.lookup(top=2) == {"values": ["Paris", "Lyon"], "counts": [7, 5], "matching": 4}
+    assert stats.lookup(search="l", top=2) == {"values": ["Lyon", "lille"], "counts": [5, 3], "matching": 3}
+    assert stats.lookup(search="z")["values"] == []
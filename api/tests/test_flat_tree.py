@@ -0,0 +1,34 @@
+import json
+
+from benchmarks.synthetic import make_accident_frame
+from benchmarks.tree_memory import baseline_construct_tree
+from controllers import excel_controller
+from services.encoding import encode_dataframe
+from services.flat_tree import FlatTree, nested_trees
+
+EXPLANATORY = ["var0", "var1", "var2"]
+
+
+def test_construct_tree_for_value_keeps_historical_signature():
+    frame = make_accident_frame(3000, 3, 3)
+    expected = baseline_construct_tree(frame, "Tué", "gravite", EXPLANATORY, ["racine"], 100)
+
+    # Appel positionnel d'origine : DataFrame pandas, current_path puis seuil, arbre imbriqué
+    tree = excel_controller.construct_tree_for_value(frame, "Tué", "gravite", EXPLANATORY, ["racine"], 100)
+
+    assert isinstance(tree, dict)
+    assert tree["path"][0] == "racine"
+    assert json.dumps(tree, sort_keys=True) == json.dumps(expected, sort_keys=True)
+
+
+def test_nested_and_compact_forms_round_trip():
+    df = encode_dataframe(make_accident_frame(4000, 4, 3, dtypes=["str", "int", "bool", "mixed"]))
+    tree = excel_controller.construct_flat_tree_for_value(df, "Tué", "gravite", ["var0", "var1", "var2", "var3"], 30)
+    nested = tree.to_nested()
+    compact = json.loads(json.dumps(tree.to_compact()))
+
+    assert json.dumps(FlatTree.from_compact(compact).to_nested()) == json.dumps(nested)
+    assert json.dumps(FlatTree.from_nested(nested).to_nested()) == json.dumps(nested)
+    assert nested_trees({"gravite": {"Tué": compact}}) == {"gravite": {"Tué": nested}}
+    # Arbre imbriqué déjà sous sa forme historique : rendu tel quel
+    assert nested_trees({"gravite": {"Tué": nested}})["gravite"]["Tué"] is nested
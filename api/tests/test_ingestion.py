@@ -0,0 +1,73 @@
+import datetime
+import shutil
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pytest
+
+from services.encoding import encode_dataframe
+from services.ingestion import ingestions
+
+HEADER = ["commune", "classe", "commune", "taux", "remarque", "mixte", "grave", "date", "", "code"]
+
+
+def _row(i: int):
+    # Doublons d'en-tête, colonne vide, cellules vides, nombres et textes mêlés, dates
+    return [f"ville{i % 3}", i % 4, 1.5 * (i % 2), i if i % 9 else None, "note" if i % 5 else None,
+            i if i % 2 else f"s{i}", i % 3 == 0, datetime.datetime(2020, 1, 1 + i % 5), None, str(i % 4)]
+
+
+def _reference(path: str):
+    # Lecture d'origine : read_excel, valeurs non finies remplacées par None, puis encodage
+    return encode_dataframe(pd.read_excel(path).replace([np.nan, np.inf, -np.inf], None))
+
+
+def _assert_streamed_like_read_excel(tmp_path, path: str, name: str):
+    streamed_path = str(tmp_path / f"lecture-{name}")
+    shutil.copy(path, streamed_path)
+    # Petits blocs : la lecture se fait en plusieurs passes
+    ingestion = ingestions.start(f"ingestion-{name}", name, streamed_path, chunk_rows=7)
+    streamed = ingestion.future.result(timeout=30)
+    expected = _reference(path)
+
+    assert streamed.column_names == expected.column_names
+    assert len(streamed) == len(expected)
+    for column_name in expected.column_names:
+        assert np.array_equal(streamed[column_name].codes, expected[column_name].codes), column_name
+        assert streamed[column_name].dtype == expected[column_name].dtype, column_name
+        assert list(map(repr, streamed[column_name].categories)) == \
+            list(map(repr, expected[column_name].categories)), column_name
+    assert ingestion.preview == pd.read_excel(path).replace([np.nan, np.inf, -np.inf], None).head(5).to_dict(orient="records")
+    assert ingestion.to_status()["status"] == "ready"
+
+
+def test_streamed_xlsx_matches_read_excel(tmp_path):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(HEADER)
+    for i in range(60):
+        sheet.append([None] * len(HEADER) if i in (20, 21) else _row(i))
+    path = str(tmp_path / "accidents.xlsx")
+    workbook.save(path)
+    _assert_streamed_like_read_excel(tmp_path, path, "accidents.xlsx")
+
+
+def test_streamed_xls_matches_read_excel(tmp_path):
+    xlwt = pytest.importorskip("xlwt")
+    workbook = xlwt.Workbook()
+    sheet = workbook.add_sheet("accidents")
+    date_style = xlwt.easyxf(num_format_str="YYYY-MM-DD")
+    for j, name in enumerate(HEADER):
+        sheet.write(0, j, name)
+    for i in range(1, 61):
+        if i in (20, 21):
+            continue
+        for j, value in enumerate(_row(i)):
+            if isinstance(value, datetime.datetime):
+                sheet.write(i, j, value, date_style)
+            elif value is not None:
+                sheet.write(i, j, value)
+    path = str(tmp_path / "accidents.xls")
+    workbook.save(path)
+    _assert_streamed_like_read_excel(tmp_path, path, "accidents.xls")
@@ -0,0 +1,64 @@
+import json
+import re
+
+from fastapi.testclient import TestClient
+
+import main
+from benchmarks.synthetic import make_accident_frame
+from services.dataset_store import dataset_store
+from services.encoding import encode_dataframe
+
+DATASET_ID = "metrics-dataset"
+
+
+def _samples(text: str):
+    # Échantillons du format texte de Prometheus : {(nom, étiquettes): valeur}
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            match = re.fullmatch(r"([a-z_]+)(\{.*\})? (\S+)", line)
+            assert match, line
+            samples[(match.group(1), match.group(2) or "")] = float(match.group(3))
+    return samples
+
+
+def test_metrics_export_requests_phases_work_and_gauges():
+    dataset_store.put(DATASET_ID, encode_dataframe(make_accident_frame(3000, 3, 3)), "metrics.xlsx")
+    with TestClient(main.app) as client:
+        build = client.post("/excel/build-decision-tree", data={
+            "filename": DATASET_ID, "variables_explicatives": "var0,var1,var2", "variable_a_expliquer": "gravite",
+            "selected_data": json.dumps({"gravite": ["Tué"]}), "min_population_threshold": "20",
+        })
+        assert "error" not in build.json()
+        assert "Server-Timing" in build.headers
+        response = client.get("/metrics")
+
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    samples = _samples(response.text)
+    route = 'route="/excel/build-decision-tree",method="POST"'
+    assert samples[("analyseur_http_request_duration_seconds_count", "{%s}" % route)] >= 1
+    assert samples[("analyseur_http_request_duration_seconds_bucket", '{%s,le="+Inf"}' % route)] >= 1
+    assert samples[("analyseur_http_requests_total", '{%s,status="200"}' % route)] >= 1
+    assert any(name == "analyseur_phase_duration_seconds_count" for name, _ in samples)
+    assert samples[("analyseur_work_total", '{%s,counter="nodes_built"}' % route.split(",")[0])] >= 1
+    assert samples[("analyseur_dataset_store_loaded_datasets", "")] >= 1
+    # Histogrammes cumulatifs : chaque seuil compte au moins autant que le précédent
+    buckets = [value for (name, labels), value in samples.items()
+               if name == "analyseur_http_request_duration_seconds_bucket" and route in labels]
+    assert buckets == sorted(buckets)
+
+
+def test_lifespan_warms_up_then_releases_pools_and_database(monkeypatch):
+    import database
+    from services import parallel
+
+    calls = []
+    monkeypatch.setattr(main, "WARMUP_ON_STARTUP", True)
+    monkeypatch.setattr(main.warmup, "start", lambda: calls.append("warmup"))
+    monkeypatch.setattr(parallel, "shutdown_pools", lambda: calls.append("pools"))
+    monkeypatch.setattr(database, "dispose_engine", lambda: calls.append("database"))
+
+    with TestClient(main.app) as client:
+        assert calls == ["warmup"]
+        assert client.get("/health").json() == {"status": "healthy"}
+    assert calls == ["warmup", "pools", "database"]
@@ -0,0 +1,56 @@
+import asyncio
+import json
+
+import pytest
+
+from benchmarks.synthetic import make_accident_frame
+from controllers import excel_controller
+from services import parallel
+from services.dataset_store import dataset_store
+from services.encoding import encode_dataframe
+from services.stats_cache import stats_cache
+from services.tree_cache import tree_cache
+
+DATASET_ID = "parallel-subtrees"
+EXPLANATORY = ["var0", "var1", "var2", "var3"]
+
+
+@pytest.fixture(scope="module")
+def dataset_id():
+    dataset_store.put(DATASET_ID, encode_dataframe(make_accident_frame(4000, 4, 3)), "paralleles.xlsx")
+    yield DATASET_ID
+    parallel.shutdown_pools()
+
+
+def _build(dataset_id: str, treatment_mode: str, parallel_workers: int, subtree_min_rows: int = None):
+    # Caches vidés : chaque construction part de zéro
+    tree_cache.clear()
+    stats_cache.clear()
+    result = asyncio.run(excel_controller.build_decision_tree(
+        dataset_id, EXPLANATORY, ["gravite"], {"gravite": ["Tué"]}, 20, treatment_mode,
+        parallel_workers, subtree_min_rows
+    ))
+    assert "error" not in result
+    return result
+
+
+@pytest.mark.parametrize("treatment_mode", ["independent", "together"])
+def test_parallel_subtrees_match_serial_build(dataset_id, treatment_mode, monkeypatch):
+    serial = _build(dataset_id, treatment_mode, parallel_workers=0)
+
+    # Deux processus même sur une machine à un seul processeur, et sous-arbres envoyés au pool
+    # dès 50 lignes : l'expansion parallèle est forcée
+    monkeypatch.setattr(parallel.os, "cpu_count", lambda: 2)
+    submitted = []
+    submit = parallel.SubtreeScheduler.submit
+
+    def counting_submit(self, *args, **kwargs):
+        submitted.append(args[1])
+        return submit(self, *args, **kwargs)
+
+    monkeypatch.setattr(parallel.SubtreeScheduler, "submit", counting_submit)
+    expanded = _build(dataset_id, treatment_mode, parallel_workers=2, subtree_min_rows=50)
+
+    assert submitted
+    assert json.dumps(expanded["decision_trees"]) == json.dumps(serial["decision_trees"])
+    assert expanded["filtered_sample_size"] == serial["filtered_sample_size"]
@@ -0,0 +1,66 @@
+import os
+import threading
+
+from services import pdf_cache as pdf_cache_module
+from services.pdf_cache import PdfCache
+
+TREES = {"gravite": {"Tué": {"var0": {"a": {"count": 10, "percentage": 50.0}}}}}
+
+
+def _render(calls):
+    def render(decision_trees, filename):
+        calls.append((decision_trees, filename))
+        return b"%PDF-" + filename.encode()
+    return render
+
+
+def test_register_returns_before_the_write_and_serves_from_memory(tmp_path, monkeypatch):
+    release = threading.Event()
+    stored = threading.Event()
+    cache = PdfCache(root_dir=str(tmp_path))
+    store = cache._store
+
+    def slow_store(*args):
+        release.wait(5)
+        store(*args)
+        stored.set()
+
+    monkeypatch.setattr(cache, "_store", slow_store)
+    pdf_id = cache.register(TREES, "base.xlsx")
+    assert not os.listdir(tmp_path)
+
+    calls = []
+    assert cache.render_path(pdf_id, _render(calls)) is not None
+    assert calls == [(TREES, "base.xlsx")]
+
+    release.set()
+    assert stored.wait(5)
+    assert os.path.isfile(os.path.join(tmp_path, f"{pdf_id}.json"))
+
+
+def test_same_tree_shares_one_pdf(tmp_path):
+    cache = PdfCache(root_dir=str(tmp_path))
+    calls = []
+    first = cache.register(TREES, "base.xlsx")
+    second = cache.register(TREES, "base.xlsx")
+    assert first == second
+    assert cache.render_path(first, _render(calls)) == cache.render_path(second, _render(calls))
+    assert len(calls) == 1
+    assert cache.register(TREES, "autre.xlsx") != first
+
+
+def test_eviction_keeps_trees_whose_pdf_was_not_rendered(tmp_path, monkeypatch):
+    # Écritures faites sur place et aucune attente d'un autre worker : ordre déterministe
+    monkeypatch.setattr(pdf_cache_module, "run_in_background", lambda func, *args: func(*args))
+    monkeypatch.setattr(pdf_cache_module, "PDF_REGISTER_WAIT_SECONDS", 0)
+    # Taille maximale nulle : tout fichier évinçable est supprimé dès l'écriture suivante
+    cache = PdfCache(root_dir=str(tmp_path), max_bytes=0)
+    rendered = cache.register(TREES, "rendu.xlsx")
+    assert cache.render_path(rendered, _render([])) is not None
+    unrendered = cache.register(TREES, "pas-rendu.xlsx")
+    cache.register(TREES, "dernier.xlsx")
+
+    calls = []
+    assert cache.render_path(unrendered, _render(calls)) is not None
+    assert calls == [(TREES, "pas-rendu.xlsx")]
+    assert cache.render_path(rendered, _render([])) is None
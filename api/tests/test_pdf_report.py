@@ -0,0 +1,48 @@
+import base64
+import re
+import zlib
+
+from services.pdf_report import render_tree_report
+
+
+def _tree(depth: int, cardinality: int = 3, variable: int = 0):
+    if depth == 0:
+        return {"type": "leaf", "message": "Plus de variables explicatives disponibles"}
+    return {
+        "type": "node", "variable": f"var{variable}", "variance": 1.0, "path": [],
+        "branches": {
+            f"mod{j}": {"count": 1, "total": 10, "percentage": 10.0,
+                        "subtree": _tree(depth - 1, cardinality, variable + 1)}
+            for j in range(cardinality)
+        }
+    }
+
+
+def _pages(pdf: bytes):
+    # Contenu texte de chaque page (flux ASCII85 + Flate écrits par reportlab)
+    pages = []
+    for data in re.findall(rb"stream\r?\n(.*?)endstream", pdf, re.S):
+        pages.append(zlib.decompress(base64.a85decode(data.strip().removesuffix(b"~>"))))
+    return pages
+
+
+def test_max_nodes_applies_per_page():
+    trees = {"gravite": {f"valeur{i}": _tree(3) for i in range(6)}}
+
+    complete = _pages(render_tree_report(trees, "base.xlsx", max_nodes=0))
+    assert sum(page.count(b"cart-type") for page in complete) == 6 * 13
+    assert max(page.count(b"cart-type") for page in complete) > 5
+
+    limited = _pages(render_tree_report(trees, "base.xlsx", max_nodes=5))
+    assert all(page.count(b"cart-type") <= 5 for page in limited)
+    assert any(b"ANNEXE" in page for page in limited)
+
+
+def test_target_heading_stays_with_its_first_rows():
+    # Nombres d'arbres variés : les titres tombent à toutes les hauteurs de page
+    for n_trees in range(20, 60, 3):
+        trees = {"gravite": {f"valeur{i}": _tree(1) for i in range(n_trees)}}
+        for page in _pages(render_tree_report(trees, "base.xlsx")):
+            heading = page.rfind(b"(Valeur cible")
+            if heading >= 0:
+                assert page.count(b"(mod", heading) >= 2, n_trees
@@ -0,0 +1,82 @@
+import datetime
+import json
+import zlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import database
+from benchmarks.synthetic import make_accident_frame
+from controllers import excel_controller
+from services import pdf_cache as pdf_cache_module
+from services.dataset_store import DatasetStore
+from services.encoding import encode_dataframe
+from services.pdf_cache import PdfCache
+
+DATASET_ID = "persisted-dataset"
+EXPLANATORY = ["var0", "var1", "var2", "var3", "saisie"]
+
+
+@pytest.fixture
+def sqlite_database(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DATABASE_URL", f"sqlite:///{tmp_path / 'excel.db'}")
+    yield
+    database.dispose_engine()
+
+
+def _frame() -> pd.DataFrame:
+    frame = make_accident_frame(2000, 4, 3, dtypes=["str", "int", "date", "mixed"])
+    # Colonne objet saisie à la main : tous les types qu'un classeur peut donner
+    values = np.empty(6, dtype=object)
+    values[:] = ["texte", 7, 2.5, True, datetime.datetime(2020, 5, 17, 8, 30), datetime.time(14, 45)]
+    frame["saisie"] = values[np.arange(len(frame)) % len(values)]
+    return frame
+
+
+def test_dataset_and_tree_rehydrate_from_database(sqlite_database, tmp_path, monkeypatch):
+    original = encode_dataframe(_frame())
+    importing = DatasetStore(root_dir=str(tmp_path / "worker-a"))
+    importing.put(DATASET_ID, original, "base.xlsx")
+    importing.persist(DATASET_ID, original, "base.xlsx")
+
+    # Écriture de l'arbre faite sur place : elle est en base dès le retour de register
+    monkeypatch.setattr(pdf_cache_module, "run_in_background", lambda func, *args: func(*args))
+    tree = excel_controller.construct_tree_for_value(original, "Tué", "gravite", EXPLANATORY, [], 20)
+    pdf_id = PdfCache(root_dir=str(tmp_path / "pdf-a")).register({"gravite": {"Tué": tree}}, "base.xlsx")
+
+    # Nouveau processus, disque vide : seule la base reste
+    restarted = DatasetStore(root_dir=str(tmp_path / "worker-b"))
+    rehydrated = restarted.get(DATASET_ID)
+    assert rehydrated is not None
+    assert rehydrated.column_names == original.column_names
+    assert len(rehydrated) == len(original)
+    for name in original.column_names:
+        assert np.array_equal(rehydrated[name].codes, original[name].codes)
+        assert rehydrated[name].categories.tolist() == original[name].categories.tolist()
+        assert [type(value) for value in rehydrated[name].categories.tolist()] == \
+            [type(value) for value in original[name].categories.tolist()]
+        assert rehydrated[name].dtype == original[name].dtype
+    assert restarted.column_index(DATASET_ID) is not None
+
+    rendered = []
+    render = lambda trees, filename: rendered.append((trees, filename)) or b"%PDF-"
+    assert PdfCache(root_dir=str(tmp_path / "pdf-b")).render_path(pdf_id, render) is not None
+    assert rendered[0][1] == "base.xlsx"
+    assert json.dumps(rendered[0][0]) == json.dumps({"gravite": {"Tué": tree}})
+
+
+def test_category_blobs_are_not_pickled(sqlite_database, tmp_path):
+    from sqlalchemy import select
+    from models.file import FileColumn
+
+    DatasetStore(root_dir=str(tmp_path / "worker")).persist(DATASET_ID, encode_dataframe(_frame()), "base.xlsx")
+    with database.session_scope() as session:
+        blobs = session.execute(select(FileColumn.codes, FileColumn.categories)).all()
+    assert blobs
+    for codes, categories in blobs:
+        for blob in (codes, categories):
+            content = zlib.decompress(blob)
+            # Ni pickle (protocole 2+ : b"\x80") ni tableau .npy d'objets
+            assert not content.startswith(b"\x80")
+            assert b"'descr': '|O'" not in content
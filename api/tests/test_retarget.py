@@ -0,0 +1,77 @@
+import asyncio
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import make_accident_frame
+from controllers import excel_controller
+from services.dataset_store import dataset_store
+from services.encoding import encode_dataframe
+from services.stats_cache import stats_cache
+from services.tree_cache import tree_cache
+
+EXPLANATORY = ["mixte", "commune", "route"]
+
+
+def _mixed_frame(n_rows: int = 3000) -> pd.DataFrame:
+    # Colonne mixte dont deux valeurs distinctes ont le même texte (1 et "1", 2 et "2"),
+    # avec des taux de cas cibles différents pour que leurs sous-arbres diffèrent
+    rng = np.random.default_rng(1)
+    mixed = np.array([1, "1", 2, "2"], dtype=object)[rng.integers(0, 4, n_rows)]
+    is_text = np.array([isinstance(value, str) for value in mixed])
+    return pd.DataFrame({
+        "mixte": mixed,
+        "commune": rng.choice(["Lyon", "Paris", "Nice"], n_rows),
+        "route": rng.choice(["A", "N"], n_rows),
+        "gravite": np.where(rng.random(n_rows) < np.where(is_text, 0.6, 0.2), "Tué", "Indemne")
+    })
+
+
+def _same_tree(left, right) -> bool:
+    return json.dumps(left.to_compact()) == json.dumps(right.to_compact())
+
+
+@pytest.mark.parametrize("old_threshold,new_threshold", [(2000, 50), (50, 400), (0, 200)])
+def test_retarget_matches_fresh_build_on_mixed_column(old_threshold, new_threshold):
+    df = encode_dataframe(_mixed_frame())
+    assert sorted(map(repr, df["mixte"].categories.tolist())) == ["'1'", "'2'", "1", "2"]
+
+    cached = excel_controller.construct_flat_tree_for_value(df, "Tué", "gravite", EXPLANATORY, old_threshold)
+    retargeted = excel_controller.retarget_tree(df, cached, "Tué", "gravite", EXPLANATORY, new_threshold)
+    fresh = excel_controller.construct_flat_tree_for_value(df, "Tué", "gravite", EXPLANATORY, new_threshold)
+
+    assert _same_tree(retargeted, fresh)
+
+
+@pytest.mark.parametrize("old_threshold,new_threshold", [(800, 30), (30, 800), (200, 200)])
+def test_retarget_matches_fresh_build_on_a_sample(old_threshold, new_threshold):
+    df = encode_dataframe(make_accident_frame(6000, 4, 3, dtypes=["str", "int", "date", "bool"]))
+    # Échantillon : une ligne sur trois
+    rows = np.arange(0, len(df), 3)
+    variables = ["var0", "var1", "var2", "var3"]
+
+    cached = excel_controller.construct_flat_tree_for_value(df, "Tué", "gravite", variables, old_threshold, rows)
+    retargeted = excel_controller.retarget_tree(df, cached, "Tué", "gravite", variables, new_threshold, rows)
+    fresh = excel_controller.construct_flat_tree_for_value(df, "Tué", "gravite", variables, new_threshold, rows)
+
+    assert _same_tree(retargeted, fresh)
+
+
+def test_threshold_change_served_from_tree_cache_matches_fresh_build():
+    dataset_store.put("retarget-mixed", encode_dataframe(_mixed_frame()), "mixte.xlsx")
+
+    def build(threshold: int):
+        return asyncio.run(excel_controller.build_decision_tree(
+            "retarget-mixed", EXPLANATORY, ["gravite"], {"gravite": ["Tué"]}, threshold
+        ))["decision_trees"]
+
+    tree_cache.clear()
+    stats_cache.clear()
+    build(2000)
+    from_cache = build(50)
+
+    tree_cache.clear()
+    stats_cache.clear()
+    assert json.dumps(from_cache) == json.dumps(build(50))
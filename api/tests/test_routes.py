@@ -0,0 +1,77 @@
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from benchmarks.synthetic import make_accident_frame
+from main import app
+from services.dataset_store import dataset_store
+from services.encoding import encode_dataframe
+
+DATASET_ID = "routes-dataset"
+BUILD_FORM = {
+    "filename": DATASET_ID,
+    "variables_explicatives": "var0,var1,var2",
+    "variable_a_expliquer": "gravite",
+    "selected_data": json.dumps({"gravite": ["Tué"]}),
+    "min_population_threshold": "50",
+}
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    return dataset_store.put(DATASET_ID, encode_dataframe(make_accident_frame(150_000, 3, 3)), "routes.xlsx")
+
+
+def test_job_submit_poll_and_result(dataset):
+    with TestClient(app) as client:
+        submitted = client.post("/excel/build-decision-tree/jobs", data=BUILD_FORM).json()
+        assert submitted["status"] in ("pending", "running", "done")
+
+        for _ in range(500):
+            status = client.get(f"/excel/jobs/{submitted['job_id']}").json()
+            if status["status"] in ("done", "error"):
+                break
+            time.sleep(0.02)
+        assert status["status"] == "done", status
+        assert status["finished_at"] >= status["started_at"] >= status["created_at"]
+
+        result = client.get(f"/excel/jobs/{submitted['job_id']}/result").json()
+        direct = client.post("/excel/build-decision-tree", data=BUILD_FORM).json()
+        assert result["decision_trees"] == direct["decision_trees"]
+        assert result["pdf_id"] == direct["pdf_id"]
+
+        assert "error" in client.get("/excel/jobs/inconnu").json()
+        assert "error" in client.get("/excel/jobs/inconnu/result").json()
+
+
+def test_selected_data_pages_and_ndjson_stream_match_the_selection(dataset):
+    column = dataset["gravite"]
+    expected = column.decode(column.mask_for_codes(column.isin_codes(["Tué", "Indemne"])).nonzero()[0]).tolist()
+
+    with TestClient(app) as client:
+        # Pages successives (plus petites qu'un bloc de lignes) jusqu'à next_cursor = None
+        values, cursor, n_pages = [], None, 0
+        while True:
+            form = {"filename": DATASET_ID, "column_name": "gravite",
+                    "selected_values": json.dumps(["Tué", "Indemne"]), "limit": "40000"}
+            if cursor is not None:
+                form["cursor"] = str(cursor)
+            page = client.post("/excel/selected-data", data=form).json()
+            assert page["count"] == len(page["values"]) <= 40000
+            values.extend(page["values"])
+            n_pages += 1
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert n_pages > 1
+        assert values == expected
+
+        response = client.post("/excel/selected-data/stream", data={
+            "filename": DATASET_ID, "selected_data": json.dumps({"gravite": ["Tué", "Indemne"], "absente": ["x"]})
+        })
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert {line["column"] for line in lines} == {"gravite"}
+        assert [value for line in lines for value in line["values"]] == expected
@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+from benchmarks.synthetic import make_accident_frame
+from benchmarks.tree_memory import baseline_branch_percentages, baseline_percentage_variance
+from controllers import excel_controller
+from services.dataset_store import dataset_store
+from services.encoding import encode_dataframe
+from services.stats_cache import stats_cache
+from services.tree_cache import tree_cache
+
+DATASET_ID = "scoring-stats-cache"
+EXPLANATORY = ["var0", "var1", "var2", "var3"]
+
+
+@pytest.mark.parametrize("target_value", ["Tué", "Indemne", "absente"])
+def test_contingency_statistics_match_pandas_masks(target_value):
+    # Texte, entiers (flottants avec NaN, comme read_excel), booléens et texte/nombres mêlés
+    frame = make_accident_frame(5000, 4, 4, dtypes=["str", "int", "bool", "mixed"])
+    df = encode_dataframe(frame)
+
+    for variable in EXPLANATORY:
+        assert excel_controller.calculate_branch_percentages(df, variable, "gravite", target_value) == \
+            baseline_branch_percentages(frame, variable, "gravite", target_value)
+        assert excel_controller.calculate_percentage_variance(df, variable, "gravite", target_value) == \
+            pytest.approx(baseline_percentage_variance(frame, variable, "gravite", target_value), abs=1e-9)
+
+
+def _build(min_population_threshold: int, variables=EXPLANATORY):
+    result = asyncio.run(excel_controller.build_decision_tree(
+        DATASET_ID, list(variables), ["gravite"], {"gravite": ["Tué"]}, min_population_threshold
+    ))
+    assert "error" not in result
+    return result
+
+
+def test_stats_cache_serves_repeated_builds():
+    dataset_store.put(DATASET_ID, encode_dataframe(make_accident_frame(4000, 4, 3)), "scoring.xlsx")
+    stats_cache.clear()
+    tree_cache.clear()
+    first = _build(50)
+    after_first = stats_cache.stats()
+    assert after_first["entries"] > 0 and after_first["hits"] == 0
+
+    # Même construction, arbre pas gardé en cache : toutes les tables viennent du cache
+    tree_cache.clear()
+    second = _build(50)
+    after_second = stats_cache.stats()
+    assert second["decision_trees"] == first["decision_trees"]
+    assert after_second["misses"] == after_first["misses"]
+    assert after_second["hits"] > 0
+
+    # Sous-ensemble des variables : les nœuds communs réutilisent les tables déjà calculées
+    tree_cache.clear()
+    _build(50, EXPLANATORY[:3])
+    assert stats_cache.stats()["hits"] > after_second["hits"]
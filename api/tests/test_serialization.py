@@ -0,0 +1,65 @@
+import io
+import json
+
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+
+from main import app
+from services.serialization import dumps, frame_records, to_json_list
+
+
+def _sample_frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        "actif": [True, False, True, True, False, True],
+        "date": pd.to_datetime(["2020-01-01 00:00:00", "2020-06-15 08:30:00", None, "2021-03-02 00:00:00",
+                                "2021-12-31 23:59:59", "2022-01-01 00:00:00"]),
+        "taux": [1.5, np.nan, 2.0, np.inf, 3.25, 0.0],
+        "effectif": [1, 2, 3, 4, 5, 6],
+        "commune": ["Lyon", None, "Paris", "Nice", "Lyon", "Brest"],
+        "gravite": ["Tué", "Indemne", "Tué", "Blessé", "Indemne", "Tué"]
+    })
+
+
+def _baseline_records(frame: pd.DataFrame):
+    # Aperçu d'origine : to_dict puis jsonable_encoder de FastAPI ; les valeurs manquantes
+    # ou non finies (que la réponse JSON refusait) deviennent null
+    records = jsonable_encoder(frame.head(5).to_dict(orient="records"))
+    return [
+        {name: None if (value is None or value == "NaT" or (isinstance(value, float) and not np.isfinite(value)))
+         else value for name, value in record.items()}
+        for record in records
+    ]
+
+
+def test_frame_records_matches_baseline_encoding():
+    frame = _sample_frame()
+    assert json.loads(dumps(frame_records(frame.head(5)))) == _baseline_records(frame)
+
+
+def test_to_json_list_keeps_text_for_lists():
+    # Listes de valeurs (aperçu de la cible, valeurs distinctes) : booléens et dates en texte
+    frame = _sample_frame()
+    assert to_json_list(frame["actif"].head(2)) == ["True", "False"]
+    assert to_json_list(frame["date"].head(3)) == ["2020-01-01 00:00:00", "2020-06-15 08:30:00", None]
+    assert to_json_list(frame["taux"].head(4)) == [1.5, None, 2.0, None]
+
+
+def test_select_columns_x_preview_matches_baseline():
+    frame = _sample_frame()
+    buffer = io.BytesIO()
+    frame.to_excel(buffer, index=False)
+    explanatory = ["actif", "date", "taux", "effectif", "commune"]
+
+    with TestClient(app) as client:
+        preview = client.post("/excel/preview", files={"file": ("apercu.xlsx", buffer.getvalue())}).json()
+        result = client.post("/excel/select-columns", data={
+            "filename": preview["dataset_id"],
+            "variables_explicatives": ",".join(explanatory),
+            "variable_a_expliquer": "gravite",
+            "selected_data": json.dumps({"gravite": ["Tué"]})
+        }).json()
+
+    expected = _baseline_records(pd.read_excel(io.BytesIO(buffer.getvalue()))[explanatory])
+    assert result["results"][0]["X_preview"] == expected
@@ -0,0 +1,86 @@
+import asyncio
+import json
+import time
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import make_accident_frame
+from controllers import excel_controller
+from services.dataset_store import dataset_store
+from services.encoding import encode_dataframe
+from services.tree_budget import TRUNCATION_PREFIX, TreeBudget
+from services.tree_cache import tree_cache
+
+DATASET_ID = "tree-budget"
+EXPLANATORY = ["var0", "var1", "var2", "var3"]
+
+
+@pytest.fixture(scope="module")
+def df():
+    return encode_dataframe(make_accident_frame(8000, 4, 3))
+
+
+def _build(df, budget: TreeBudget):
+    return excel_controller.construct_flat_tree_for_value(df, "Tué", "gravite", EXPLANATORY, 20, budget=budget)
+
+
+def _depths(tree):
+    depths = np.zeros(len(tree), dtype=int)
+    for element in range(1, len(tree)):
+        depths[element] = depths[tree.parent[element]] + tree.is_node(tree.parent[element])
+    return depths
+
+
+def _truncations(tree):
+    return {message for message in tree.messages if message.startswith(TRUNCATION_PREFIX)}
+
+
+def test_unlimited_budget_builds_the_full_tree(df):
+    full = excel_controller.construct_flat_tree_for_value(df, "Tué", "gravite", EXPLANATORY, 20)
+    assert json.dumps(_build(df, TreeBudget()).to_compact()) == json.dumps(full.to_compact())
+    assert not _truncations(full)
+
+
+def test_max_depth_limits_node_levels(df):
+    tree = _build(df, TreeBudget(max_depth=2))
+    depths = _depths(tree)
+    nodes = [element for element in range(len(tree)) if tree.is_node(element)]
+    assert max(depths[nodes]) == 1
+    assert _truncations(tree) == {f"{TRUNCATION_PREFIX} Construction interrompue - Profondeur maximale atteinte (2)"}
+
+
+def test_max_nodes_limits_split_nodes_per_tree(df):
+    tree = _build(df, TreeBudget(max_nodes=5))
+    assert sum(tree.is_node(element) for element in range(len(tree))) == 5
+    assert _truncations(tree) == {f"{TRUNCATION_PREFIX} Construction interrompue - Nombre maximal de nœuds atteint (5)"}
+
+
+def test_max_seconds_stops_at_the_deadline(df):
+    budget = TreeBudget(max_seconds=0.001)
+    time.sleep(0.01)
+    tree = _build(df, budget)
+    assert not tree.is_node(0)
+    assert tree.leaf_message(0) == f"{TRUNCATION_PREFIX} Construction interrompue - Temps de calcul maximal atteint"
+
+
+def test_budget_summary_is_returned_with_the_trees(df):
+    dataset_store.put(DATASET_ID, df, "budget.xlsx")
+    tree_cache.clear()
+    result = asyncio.run(excel_controller.build_decision_tree(
+        DATASET_ID, EXPLANATORY, ["gravite"], {"gravite": ["Tué", "Indemne"]}, 20, max_nodes=3
+    ))
+    assert result["budget"]["max_nodes"] == 3
+    assert result["budget"]["truncated"]
+    # Limite par arbre : chacune des deux valeurs cibles a ses trois nœuds
+    for tree in result["decision_trees"]["gravite"].values():
+        assert sum(1 for _ in _nested_nodes(tree)) == 3
+
+
+def _nested_nodes(tree):
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if node and node.get("type") == "node":
+            yield node
+            stack.extend(branch.get("subtree") for branch in node["branches"].values())
@@ -0,0 +1,60 @@
+import io
+import time
+
+import pandas as pd
+from fastapi.testclient import TestClient
+
+from main import app
+
+
+def _workbook(values) -> bytes:
+    buffer = io.BytesIO()
+    pd.DataFrame({"commune": values, "gravite": ["Tué", "Indemne", "Tué"]}).to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+def _upload(client: TestClient, name: str, content: bytes):
+    response = client.post("/excel/preview", files={"file": (name, content)})
+    assert response.status_code == 200
+    return response.json()
+
+
+def _wait_ready(client: TestClient, dataset_id: str):
+    # Lecture en arrière-plan : attendre que le jeu soit enregistré
+    for _ in range(200):
+        if client.get("/excel/preview/status", params={"filename": dataset_id}).json().get("status") == "ready":
+            return
+        time.sleep(0.02)
+    raise AssertionError("lecture non terminée")
+
+
+def test_same_name_uploads_resolve_to_their_own_dataset():
+    with TestClient(app) as client:
+        first = _upload(client, "homonyme.xlsx", _workbook(["Lyon", "Paris", "Nice"]))
+        second = _upload(client, "homonyme.xlsx", _workbook(["Brest", "Lille", "Metz"]))
+        assert first["dataset_id"] != second["dataset_id"]
+
+        for upload, expected in ((first, ["Lyon", "Nice", "Paris"]), (second, ["Brest", "Lille", "Metz"])):
+            values = client.post("/excel/get-column-values", data={
+                "filename": upload["dataset_id"], "column_name": "commune"
+            }).json()
+            assert sorted(values["unique_values"]) == expected
+
+        # Le nom seul ne désigne plus un import unique : refus plutôt qu'un choix silencieux
+        ambiguous = client.post("/excel/get-column-values", data={
+            "filename": "homonyme.xlsx", "column_name": "commune"
+        })
+        assert ambiguous.status_code == 409
+
+
+def test_same_content_reupload_is_reused_and_keeps_its_name():
+    content = _workbook(["Caen", "Dijon", "Tours"])
+    with TestClient(app) as client:
+        first = _upload(client, "unique.xlsx", content)
+        _wait_ready(client, first["dataset_id"])
+        again = _upload(client, "unique.xlsx", content)
+        assert again["dataset_id"] == first["dataset_id"]
+        assert again["status"] == "ready"
+
+        status = client.get("/excel/preview/status", params={"filename": "unique.xlsx"}).json()
+        assert status == {"dataset_id": first["dataset_id"], "status": "ready"}
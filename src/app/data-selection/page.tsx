@@ -6,7 +6,7 @@ import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card"
 import { ArrowLeft, Home } from "lucide-react"
 import { useEffect, useState } from "react"
 import StepProgress from "@/components/ui/step-progress"
-import { apiFetch } from "@/lib/api"
+import { apiFetch, datasetKey } from "@/lib/api"
 
 interface RemainingData {
   filename: string
@@ -20,6 +20,7 @@ interface RemainingData {
 export default function DataSelection() {
   const router = useRouter()
   const [remainingData, setRemainingData] = useState<RemainingData | null>(null)
+  const [dataset, setDataset] = useState<{ filename?: string; dataset_id?: string }>({})
   const [selectedData, setSelectedData] = useState<{ [columnName: string]: any[] }>({})
   const [loading, setLoading] = useState(true)
   const [searchTerm, setSearchTerm] = useState('')
@@ -33,6 +34,7 @@ export default function DataSelection() {
         const data = JSON.parse(storedData)
         if (data.remainingData) {
           setRemainingData(data.remainingData)
+          setDataset({ filename: data.filename, dataset_id: data.dataset_id })
           setSelectedData(data.selectedRemainingData || {})
         } else {
           // Si pas de données restantes, rediriger vers la page des variables
@@ -81,7 +83,7 @@ export default function DataSelection() {
 
     try {
       const formData = new FormData()
-      formData.append("filename", remainingData.filename)
+      formData.append("filename", datasetKey(dataset) || remainingData.filename)
       formData.append("variables_explicatives", remainingData.variables_explicatives.join(','))
       formData.append("variable_a_expliquer", remainingData.variables_a_expliquer.join(','))
       formData.append("selected_data", JSON.stringify(selectedData))
@@ -181,7 +183,7 @@ export default function DataSelection() {
         {/* Informations du fichier */}
         <Card className="mb-6 shadow-lg">
           <CardHeader>
-            <CardTitle className="text-2xl">📁 Fichier : {remainingData.filename}</CardTitle>
+            <CardTitle className="text-2xl">📁 Fichier : {dataset.filename || remainingData.filename}</CardTitle>
           </CardHeader>
           <CardContent>
             <div className="grid grid-cols-1 md:grid-cols-2 gap-4">
@@ -7,7 +7,7 @@ import { useEffect, useState } from "react"
 import StepProgress from "@/components/ui/step-progress"
 import DecisionTree from "@/components/ui/decision-tree"
 import QuickEditModal from "@/components/ui/quick-edit-modal"
-import { apiFetch } from "@/lib/api"
+import { apiFetch, datasetKey } from "@/lib/api"
 
 interface DecisionTreeData {
   filename: string
@@ -92,7 +92,7 @@ export default function DecisionTreePage() {
     try {
       // Préparer les données pour l'API
       const formData = new FormData()
-      formData.append("filename", filename)
+      formData.append("filename", datasetKey(data))
       formData.append("variables_explicatives", analysisResult.variables_explicatives.join(','))
       formData.append("variable_a_expliquer", analysisResult.variables_a_expliquer.join(','))
       formData.append("min_population_threshold", minPopulationThreshold.toString())
@@ -133,7 +133,8 @@ export default function DecisionTreePage() {
         throw new Error(result.error)
       }
 
-      setDecisionTreeData(result)
+      // Nom du fichier pour l'affichage (la requête a envoyé le dataset_id)
+      setDecisionTreeData({ ...result, filename })
       
       // Mettre à jour le mode original après construction
       setOriginalTreatmentMode(treatmentMode as 'independent' | 'together')
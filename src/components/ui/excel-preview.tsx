@@ -6,10 +6,11 @@ import { Button } from "@/components/ui/button"
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card"
 import { useRouter } from "next/navigation"
 import { ChevronDown, ChevronRight, Home } from "lucide-react"
-import { apiFetch, API_BASE_URL } from "@/lib/api"
+import { apiFetch, API_BASE_URL, datasetKey } from "@/lib/api"
 
 interface PreviewData {
   filename: string
+  dataset_id?: string
   rows: number
   columns: string[]
   preview: Record<string, any>[]
@@ -353,7 +354,7 @@ export default function ExcelPreview({ onStepChange }: ExcelPreviewProps) {
       if (!columnValues[columnName]) {
         try {
           const formData = new FormData()
-          formData.append("filename", previewData.filename)
+          formData.append("filename", datasetKey(previewData))
           formData.append("column_name", columnName)
 
           const response = await apiFetch("/excel/get-column-values", {
@@ -406,7 +407,7 @@ export default function ExcelPreview({ onStepChange }: ExcelPreviewProps) {
         try {
 
           const formData = new FormData()
-          formData.append("filename", previewData?.filename || '') // Use optional chaining
+          formData.append("filename", datasetKey(previewData))
           formData.append("column_name", columnName)
 
           const response = await apiFetch("/excel/get-column-values", {
@@ -571,7 +572,7 @@ export default function ExcelPreview({ onStepChange }: ExcelPreviewProps) {
 
         // Premier appel : obtenir les colonnes restantes
       const formData = new FormData()
-      formData.append("filename", previewData.filename)
+      formData.append("filename", datasetKey(previewData))
       formData.append("variables_explicatives", explanatoryVariables.join(','))
       formData.append("variable_a_expliquer", variablesToExplain.join(','))
 
@@ -609,7 +610,7 @@ export default function ExcelPreview({ onStepChange }: ExcelPreviewProps) {
         localStorage.setItem('remainingData', JSON.stringify(finalSelectedData))
 
         const formData = new FormData()
-        formData.append("filename", previewData.filename)
+        formData.append("filename", datasetKey(previewData))
         formData.append("variables_explicatives", remainingData!.variables_explicatives.join(','))
         formData.append("variable_a_expliquer", remainingData!.variables_a_expliquer.join(','))
         formData.append("selected_data", JSON.stringify(finalSelectedData))
@@ -636,6 +637,7 @@ export default function ExcelPreview({ onStepChange }: ExcelPreviewProps) {
         columnSelection: columnSelection,
           // Ne pas stocker previewData (trop volumineux)
           filename: previewData.filename,
+          dataset_id: previewData.dataset_id,
           rows: previewData.rows,
           columns: previewData.columns,
           remainingData: remainingData,
@@ -5,7 +5,7 @@ import { Button } from "@/components/ui/button"
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card"
 import { X, Check, Loader2 } from "lucide-react"
 import { useRouter } from "next/navigation"
-import { apiFetch } from "@/lib/api"
+import { apiFetch, datasetKey } from "@/lib/api"
 
 interface QuickEditModalProps {
   editType: 'toExplain' | 'explanatory' | 'sample'
@@ -72,7 +72,7 @@ export default function QuickEditModal({ editType, returnToPage, onClose }: Quic
       setLoadingValues(prev => ({ ...prev, [variable]: true }))
       try {
         const formData = new FormData()
-        formData.append("filename", previewData.filename)
+        formData.append("filename", datasetKey(previewData))
         formData.append("column_name", variable)
 
         const response = await apiFetch("/excel/get-column-values", {
@@ -170,7 +170,7 @@ export default function QuickEditModal({ editType, returnToPage, onClose }: Quic
       setLoadingValues(prev => ({ ...prev, [columnName]: true }))
       try {
         const formData = new FormData()
-        formData.append("filename", previewData.filename)
+        formData.append("filename", datasetKey(previewData))
         formData.append("column_name", columnName)
 
         const response = await apiFetch("/excel/get-column-values", {
@@ -209,7 +209,7 @@ export default function QuickEditModal({ editType, returnToPage, onClose }: Quic
       }
 
       const formData = new FormData()
-      formData.append("filename", data.filename)
+      formData.append("filename", datasetKey(data))
 
       if (editType === 'toExplain') {
         formData.append("variables_explicatives", analysisResult.variables_explicatives.join(','))
@@ -677,7 +677,7 @@ export default function QuickEditModal({ editType, returnToPage, onClose }: Quic
                                       setLoadingValues(prev => ({ ...prev, [columnName]: true }))
                                       try {
                                         const formData = new FormData()
-                                        formData.append("filename", previewData.filename)
+                                        formData.append("filename", datasetKey(previewData))
                                         formData.append("column_name", columnName)
 
                                         const response = await fetch("http://localhost:8000/excel/get-column-values", {
@@ -13,3 +13,9 @@ export async function apiFetch(inputPath: string, init?: RequestInit): Promise<R
 }
 
 
+// Identifiant du jeu de données à envoyer dans le champ "filename" des routes /excel :
+// le dataset_id renvoyé par /excel/preview (deux classeurs de même nom restent distincts),
+// à défaut le nom du fichier.
+export function datasetKey(data: { dataset_id?: string; filename?: string } | null | undefined): string {
+  return data?.dataset_id || data?.filename || "";
+}